@@ -45,7 +45,7 @@ def run(squeries,metadata,parallel):
 
     sdlog.info("SDADDDSA-306","Copy dataset attrs..")
     po=sdpipelineprocessing.ProcessingObject(add_dataset_attrs,datasets_attrs)
-    metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+    metadata=sdpipelineprocessing.run_pipeline(metadata,po,deferred=True)
 
     return metadata
 
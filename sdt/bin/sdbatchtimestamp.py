@@ -34,7 +34,7 @@ def run(squeries,metadata,parallel):
     sdlog.info("SYNDABTI-306","Set missing timestamp..")
 
     po=sdpipelineprocessing.ProcessingObject(add_dataset_timestamp,datasets_timestamps)
-    metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+    metadata=sdpipelineprocessing.run_pipeline(metadata,po,deferred=True)
 
     return metadata
 
@@ -23,6 +23,7 @@ import sddb
 import sdremoteparam_light
 import sdtools
 import sdproxy_ra
+import sdparamindex
 from sdtypes import Request,Item
 from sdexception import SDException
 from sqlite3 import IntegrityError
@@ -33,6 +34,8 @@ def run(host=None,reload=False,project=None):
     if host is None:
         host=sdindex.get_default_index()
 
+    sdparamindex.invalidate() # 'param' table is about to change
+
     if reload:
         sdsqlutils.truncate_table('param')
 
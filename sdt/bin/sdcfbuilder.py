@@ -36,6 +36,7 @@ def create_configuration_file_sample(path):
     config.add_section('daemon')
     config.set('daemon', 'user', '')
     config.set('daemon', 'group', '')
+    config.set('daemon', 'stats_interval', '5')
 
     config.add_section('module')
     config.set('module', 'download', 'true')
@@ -53,6 +54,13 @@ def create_configuration_file_sample(path):
     config.set('core', 'default_path', '')
     config.set('core', 'data_path', '')
     config.set('core', 'db_path', '')
+    config.set('core', 'db_journal_mode', '')
+    config.set('core', 'db_synchronous', '')
+    config.set('core', 'db_cache_size', '-65536')
+    config.set('core', 'db_mmap_size', '268435456')
+    config.set('core', 'db_temp_store', 'memory')
+    config.set('core', 'pipeline_processes', '1')
+    config.set('core', 'lowmem_storage', 'json')
     config.set('core', 'sandbox_path', '')
 
     config.add_section('interface')
@@ -66,12 +74,17 @@ def create_configuration_file_sample(path):
     config.set('behaviour', 'ignorecase', 'true')
     config.set('behaviour', 'nearest', 'false')
     config.set('behaviour', 'nearest_mode', 'geolocation')
+    config.set('behaviour', 'nearest_rtt_probe', 'icmp')
+    config.set('behaviour', 'nearest_rtt_cache_ttl', '86400')
     config.set('behaviour', 'lfae_mode', 'abort')
     config.set('behaviour', 'incorrect_checksum_action', 'remove')
 
     config.add_section('index')
     config.set('index', 'indexes', 'esgf-data.dkrz.de')
     config.set('index', 'default_index', 'esgf-data.dkrz.de')
+    config.set('index', 'max_parallel_page_per_index', '4')
+    config.set('index', 'search_api_cache_ttl', '3600')
+    config.set('index', 'search_api_cache_max_size', '500')
 
     config.add_section('locale')
     config.set('locale', 'country', '')
@@ -85,6 +98,11 @@ def create_configuration_file_sample(path):
     config.set('download', 'gridftp_opt', '')
     config.set('download', 'incremental_mode_for_datasets', 'false')
     config.set('download', 'continue_on_cert_errors', 'false')
+    config.set('download', 'post_download_checksum', 'false')
+    config.set('download', 'http_engine', 'wget')
+    config.set('download', 'stall_min_rate', '1')
+    config.set('download', 'stall_timeout', '600')
+    config.set('download', 'adaptive_concurrency', 'false')
 
     config.add_section('post_processing')
     config.set('post_processing', 'host', 'localhost')
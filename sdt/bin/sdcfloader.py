@@ -37,6 +37,7 @@ default_options={'max_parallel_download':'8',
                  'get_only_latest_version':'true',
                  'user':'',
                  'group':'',
+                 'stats_interval':'5',
                  'hpss':'0',
                  'download':'true',
                  'post_processing':'false',
@@ -44,6 +45,13 @@ default_options={'max_parallel_download':'8',
                  'data_path':'',
                  'sandbox_path':'',
                  'db_path':'',
+                 'db_journal_mode':'',
+                 'db_synchronous':'',
+                 'db_cache_size':'-65536',
+                 'db_mmap_size':'268435456',
+                 'db_temp_store':'memory',
+                 'pipeline_processes':'1',
+                 'lowmem_storage':'json',
                  'default_path':'',
                  'selection_path':'',
                  'security_dir_mode':'tmpuid',
@@ -61,13 +69,23 @@ default_options={'max_parallel_download':'8',
                  'lfae_mode':'abort',
                  'indexes':'esgf-node.ipsl.fr,esgf-data.dkrz.de,esgf-index1.ceda.ac.uk',
                  'default_index':'esgf-node.ipsl.fr',
+                 'max_parallel_page_per_index':'4',
+                 'search_api_cache_ttl':'3600',
+                 'search_api_cache_max_size':'500',
                  'nearest':'false',
                  'nearest_mode':'geolocation',
+                 'nearest_rtt_probe':'icmp',
+                 'nearest_rtt_cache_ttl':'86400',
                  'openid':'https://esgf-node.ipsl.fr/esgf-idp/openid/foo',
                  'password':'foobar',
                  'incorrect_checksum_action':'remove',
                  'incremental_mode_for_datasets':'false',
-                 'continue_on_cert_errors':'false'}
+                 'continue_on_cert_errors':'false',
+                 'post_download_checksum':'false',
+                 'stall_min_rate':'1',
+                 'stall_timeout':'600',
+                 'adaptive_concurrency':'false',
+                 'http_engine':'wget'}
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
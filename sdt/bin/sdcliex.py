@@ -32,7 +32,8 @@ def certificate():
 def check():
     buf="""  synda check dataset_version
   synda check file_variable CMIP5 atmos orog
-  synda check selection"""
+  synda check selection
+  synda check status_counters"""
     return buf
 
 def config():
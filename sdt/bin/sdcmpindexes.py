@@ -26,6 +26,8 @@ import sdindex
 import sdrun
 import sdprint
 import sdproxy_mt
+import sdconst
+import sdsearchapicache
 
 output_dir='/tmp/sdcmpindexes'
 
@@ -37,6 +39,8 @@ if __name__ == '__main__':
     if not os.path.isdir(output_dir):
         os.mkdir(output_dir) 
 
+    sdsearchapicache.set_mode(sdconst.SEARCH_API_CACHE_MODE_OFF) # compare live responses
+
     queries=sdpipeline.build_queries(path=args.selection_file)
 
     for index_host in sdindex.index_host_list:
@@ -23,6 +23,11 @@ def add_playback_record_options(parser,hidden=False):
     grp.add_argument('-p','--playback',help=playback_help,metavar='FILE')
     grp.add_argument('-r','--record',help=record_help,metavar='FILE')
 
+def add_search_api_cache_options(parser):
+    grp=parser.add_mutually_exclusive_group(required=False)
+    grp.add_argument('--no_cache',dest='search_api_cache_mode',action='store_const',const=sdconst.SEARCH_API_CACHE_MODE_OFF,help='Do not use search-API response cache')
+    grp.add_argument('--refresh',dest='search_api_cache_mode',action='store_const',const=sdconst.SEARCH_API_CACHE_MODE_REFRESH,help='Ignore cached search-API responses (and replace them)')
+
 def add_type_grp(parser):
     type_grp=parser.add_mutually_exclusive_group(required=False)
     type_grp.add_argument('-a','--aggregation',dest='type_',action='store_const',const=sdconst.SA_TYPE_AGGREGATION)
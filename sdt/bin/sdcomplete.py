@@ -39,19 +39,26 @@ def run(files):
     return files
 
 def complete(files):
+
+    # retrieve local status for all files (and datasets) of the chunk at once
+    files_status=sdfiledao.get_files_status([f['file_functional_id'] for f in files if f["type"]==sdconst.SA_TYPE_FILE])
+    datasets_status=sddatasetdao.get_datasets_status([f['dataset_functional_id'] for f in files if f["type"]==sdconst.SA_TYPE_DATASET])
+
     for f in files:
 
         # the if/else block below is because this module can be used to process different metadata type (File and Dataset).
         if f["type"]==sdconst.SA_TYPE_FILE:
-            transfer=sdfiledao.get_file(f['file_functional_id'])
+            transfer=files_status.get(f['file_functional_id'])
 
             if transfer<>None:
-                f['status']=transfer.status
+                (status,priority)=transfer
+
+                f['status']=status
 
                 if sdpostpipelineutils.exists_attached_parameter(f,'priority'): # this is to allow setting priority using selection parameter (i.e. default priority can be overrided using selection parameter). It is usefull here for example when user wants to change priority (YES, a search-API request is needed in this case!).
                     f['priority']=sdpostpipelineutils.get_attached_parameter(f,'priority')
                 else:
-                    f['priority']=transfer.priority
+                    f['priority']=priority
             else:
                 f['status']=sdconst.TRANSFER_STATUS_NEW
 
@@ -61,10 +68,8 @@ def complete(files):
                     f['priority']=sdconst.DEFAULT_PRIORITY
 
         elif f["type"]==sdconst.SA_TYPE_DATASET:
-            dataset=sddatasetdao.get_dataset(dataset_functional_id=f['dataset_functional_id'])
-
-            if dataset<>None:
-                f['status']=dataset.status
+            if f['dataset_functional_id'] in datasets_status:
+                f['status']=datasets_status[f['dataset_functional_id']]
             else:
                 f['status']=sdconst.DATASET_STATUS_NEW
         else:
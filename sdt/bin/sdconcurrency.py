@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the adaptive per data node concurrency controller.
+
+Notes
+    - each data node limit is evaluated every 'evaluation_period' seconds
+      (AIMD: additive increase, multiplicative decrease)
+        - limit is decreased by half if the transfer error rate or the
+          first byte latency is too high
+        - limit is decreased by one if the last increase didn't improve the
+          data node aggregate throughput (the data node is saturated), and
+          then kept unchanged during 'hold_periods' periods
+        - limit is increased by one if all slots are used
+        - limit is kept unchanged if not all slots are used (not enough
+          waiting transfers to measure the data node capacity)
+    - 'max_parallel_download_per_datanode' is the upper bound of the limit
+      ('max_parallel_download' is still enforced by 'sdtask')
+    - throughput and latency are measured by 'sdtelemetry'
+    - only errors caused by the data node (network errors, timeouts, 5xx) are
+      used to compute the error rate (e.g. killed transfers and 404 errors
+      are not), and nothing is accounted once the daemon is stopping
+    - learned limits are stored in the 'generic_cache' table ('concurrency'
+      realm), so they are kept between daemon restarts
+"""
+
+import re
+import time
+import json
+import argparse
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sddb
+import sddao
+import sdtelemetry
+
+class DataNodeState():
+
+    def __init__(self,data_node,limit,throughput=None,min_latency=None):
+        self.data_node=data_node
+        self.limit=limit
+        self.throughput=throughput     # bytes per second (measured during the previous period)
+        self.min_latency=min_latency   # seconds (lowest first byte latency seen, used as baseline)
+        self.increased=False           # True if limit was increased at the end of the previous period
+        self.hold=0                    # number of periods during which the limit must not be increased
+
+        self.reset(time.time())
+
+    def reset(self,now):
+        """Start a new evaluation period."""
+        self.date=now
+        self.bytes=sdtelemetry.datanode_bytes.get(self.data_node,0)
+        self.done=0
+        self.errors=0
+        self.latencies=[]
+
+def transfer_ended(tr,rtr):
+    """Account transfer result.
+
+    Args:
+        rtr: sdtelemetry.RunningTransfer object (may be None)
+    """
+    if not enabled or quit==1:
+        return # when stopping, running transfers are killed (this says nothing about the data node)
+
+    state=get_state(tr.data_node)
+
+    if tr.status==sdconst.TRANSFER_STATUS_DONE:
+        state.done+=1
+    elif is_data_node_error(tr):
+        state.errors+=1
+
+    if rtr is not None and rtr.first_byte_delay is not None:
+        state.latencies.append(rtr.first_byte_delay)
+
+def is_data_node_error(tr):
+    """Returns True if the transfer failed because of the data node (e.g. overloaded)."""
+    status=getattr(tr,'sdget_status',None)
+
+    if status in (21,25):
+        return True # timeout
+    elif status==1:
+        # wget or network error, except client errors (e.g. 404), which are file specific
+        return client_error_regex.search(tr.sdget_error_msg or '') is None
+    else:
+        return False # killed (watchdog, shutdown), local error, permission error..
+
+def get_limit(data_node):
+    """Returns how many transfers can run concurrently for this data node."""
+    if not enabled:
+        return max_datanode_count
+
+    return get_state(data_node).limit
+
+def get_limits():
+    """Returns data_node => limit dict, or None if the controller is disabled."""
+    if not enabled:
+        return None
+
+    return dict((dn,state.limit) for (dn,state) in states.iteritems())
+
+def update(running_count,conn=sddb.conn):
+    """Evaluate data nodes whose period has elapsed.
+
+    Args:
+        running_count (dict): data_node => running transfers count
+    """
+    if not enabled:
+        return
+
+    now=time.time()
+
+    modified=False
+    for (data_node,state) in states.iteritems():
+        if now-state.date<evaluation_period:
+            continue
+
+        if evaluate(data_node,state,now,running_count.get(data_node,0)):
+            modified=True
+
+        state.reset(now)
+
+    if modified:
+        store(conn)
+
+def evaluate(data_node,state,now,running):
+    """Returns True if the state must be stored."""
+    throughput=(sdtelemetry.datanode_bytes.get(data_node,0)-state.bytes)/(now-state.date)
+    finished=state.done+state.errors
+    latency=sum(state.latencies)/len(state.latencies) if len(state.latencies)>0 else None
+
+    if latency is not None and (state.min_latency is None or latency<state.min_latency):
+        state.min_latency=latency
+
+    increased=state.increased
+    state.increased=False
+    state.hold=max(state.hold-1,0)
+
+    if finished>=min_finished_transfers and float(state.errors)/finished>max_error_rate:
+        set_limit(data_node,state,state.limit/2,'error rate %i/%i'%(state.errors,finished))
+    elif latency is not None and latency>latency_factor*max(state.min_latency,sdtelemetry.get_sample_interval()):
+        set_limit(data_node,state,state.limit/2,'latency %.1fs'%latency)
+    elif running<state.limit:
+        return False # not enough waiting transfers to measure the data node capacity (keep the last measured throughput)
+    elif increased and state.throughput is not None and throughput<state.throughput*(1+min_gain):
+        set_limit(data_node,state,state.limit-1,'no throughput gain')
+        state.hold=hold_periods
+    elif state.hold==0 and state.limit<max_datanode_count:
+        set_limit(data_node,state,state.limit+1,'all slots used')
+        state.increased=True
+
+    state.throughput=throughput
+
+    return True
+
+def set_limit(data_node,state,limit,reason):
+    limit=min(max(limit,1),max_datanode_count)
+
+    if limit!=state.limit:
+        sdlog.info("SDCONCUR-001","Data node concurrency limit changed (data_node=%s,limit=%i=>%i,reason=%s)"%(data_node,state.limit,limit,reason))
+        state.limit=limit
+
+def get_state(data_node):
+    state=states.get(data_node)
+    if state is None:
+        state=DataNodeState(data_node,min(initial_limit,max_datanode_count))
+        states[data_node]=state
+    return state
+
+def load(conn=sddb.conn):
+    """Load learned limits (called at daemon startup)."""
+    if not enabled:
+        return
+
+    for (data_node,value) in sddao.get_generic_cache_values(realm,conn=conn).iteritems():
+        try:
+            entry=json.loads(value)
+            state=DataNodeState(data_node,min(max(int(entry['limit']),1),max_datanode_count),entry['throughput'],entry['min_latency'])
+        except (ValueError,KeyError,TypeError),e:
+            sdlog.warning("SDCONCUR-002","Incorrect concurrency limit ignored (data_node=%s,%s)"%(data_node,str(e)))
+            continue
+
+        states[data_node]=state
+
+    sdlog.info("SDCONCUR-003","Concurrency limits loaded (%i data node(s))"%len(states))
+
+def store(conn=sddb.conn):
+    for (data_node,state) in states.iteritems():
+        value=json.dumps({'limit':state.limit,'throughput':state.throughput,'min_latency':state.min_latency,'date':time.time()})
+        sddao.set_generic_cache_value(realm,data_node,value,commit=False,conn=conn)
+    conn.commit()
+
+def reset(conn=sddb.conn):
+    """Forget learned limits."""
+    conn.execute("delete from generic_cache where realm=?",(realm,))
+    conn.commit()
+
+# init.
+
+realm='concurrency'
+
+client_error_regex=re.compile(r'(ERROR|HTTP error) 4\d\d\b') # HTTP 4xx status in error message ('ERROR 404: Not Found' (wget), 'HTTP error 404 Not Found' ('native' engine))
+
+enabled=sdconfig.config.getboolean('download','adaptive_concurrency')
+max_datanode_count=sdconfig.config.getint('download','max_parallel_download_per_datanode')
+
+initial_limit=2
+evaluation_period=60        # seconds
+min_finished_transfers=3    # error rate is only used when at least this number of transfers ended during the period
+max_error_rate=0.5
+latency_factor=3            # first byte latency above this factor of the baseline means the data node is overloaded
+min_gain=0.05               # minimum throughput improvement expected from an additional transfer
+hold_periods=10
+
+states={} # data_node => DataNodeState
+
+quit=0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r','--reset',action='store_true',help='Forget learned limits')
+    args = parser.parse_args()
+
+    if args.reset:
+        reset()
+    else:
+        for (data_node,value) in sorted(sddao.get_generic_cache_values(realm).iteritems()):
+            entry=json.loads(value)
+            print '%s %i'%(data_node,entry['limit'])
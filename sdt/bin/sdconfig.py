@@ -189,6 +189,7 @@ stacktrace_log_file="/tmp/sdt_stacktrace_%s.log"%str(uuid.uuid4())
 
 daemon_pid_file="%s/daemon.pid"%tmp_folder
 ihm_pid_file="%s/ihm.pid"%tmp_folder
+stats_file="%s/daemon_stats.prom"%tmp_folder
 
 #check_path(bin_folder)
 
@@ -245,6 +246,9 @@ progress=config.getboolean('interface','progress')
 download=config.getboolean('module','download')
 metadata_server_type=config.get('core','metadata_server_type')
 url_max_buffer_size=config.get('download', 'url_max_buffer_size')
+max_parallel_page_per_index=config.getint('index','max_parallel_page_per_index')
+pipeline_processes=config.getint('core','pipeline_processes')
+lowmem_storage=config.get('core','lowmem_storage') # json | columnar (disk storage layout used in lowmem mode, see sdmts)
 
 default_folder=get_path('default_path',default_folder_default_path)
 selection_folder=get_path('selection_path',default_selection_folder)
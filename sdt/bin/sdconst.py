@@ -161,6 +161,10 @@ DEFAULT_PRIORITY=1000
 SEARCH_API_OUTPUT_FORMAT_JSON='json'
 SEARCH_API_OUTPUT_FORMAT_XML='xml'
 #
+SEARCH_API_CACHE_MODE_ON='on'           # read and write cache
+SEARCH_API_CACHE_MODE_REFRESH='refresh' # write cache only (i.e. cached entries are replaced)
+SEARCH_API_CACHE_MODE_OFF='off'         # cache not used
+#
 ACTION_ADD='add'
 ACTION_DELETE='delete'
 ACTION_PEXEC='pexec'
@@ -222,6 +226,3 @@ SECURITY_DIR_MIXED='mixed'
 
 #Synda release parameters
 SYNDA_VERSION = '3.10'
-
-# miscellaneous
-GET_FILES_CACHING = True   # change to False to disable caching logic in sdfiledao.get_files.
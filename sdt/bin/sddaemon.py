@@ -62,6 +62,8 @@ def main_loop():
 
     sdlog.info('SDDAEMON-001',"Daemon starting ...")
 
+    sdtaskscheduler.restart_interrupted_syscalls() # signal handlers have been installed by DaemonContext
+
     try:
         sdtaskscheduler.event_loop()
     except SDException, e:
@@ -162,6 +164,18 @@ def terminate(signum, frame):
     import sdtaskscheduler # must be here because of double-fork (i.e. we can't move import at the top of this file, because the first import must occur in 'main_loop' func).
     sdtaskscheduler.terminate(signum, frame)
 
+def wakeup(signum, frame):
+    import sdtaskscheduler # must be here because of double-fork (see 'terminate' func)
+    sdtaskscheduler.wakeup(signum, frame)
+
+def reload_configuration(signum, frame):
+    import sdtaskscheduler # must be here because of double-fork (see 'terminate' func)
+    sdtaskscheduler.reload_configuration(signum, frame)
+
+def resync(signum, frame):
+    import sdtaskscheduler # must be here because of double-fork (see 'terminate' func)
+    sdtaskscheduler.resync(signum, frame)
+
 def unprivileged_user_mode():
     # retrieve numeric uid/gid
     uid=pwd.getpwnam(user).pw_uid
@@ -207,7 +221,7 @@ pidfile=daemon.pidfile.PIDLockFile(sdconfig.daemon_pid_file)
 log_stdout=open("{}/{}".format(sdconfig.log_folder, sdconst.LOGFILE_CONSUMER), "a+")
 log_stderr=open("{}/{}".format(sdconfig.log_folder, sdconst.LOGFILE_CONSUMER), "a+")
 context=daemon.DaemonContext(working_directory=sdconfig.tmp_folder, pidfile=pidfile,stdout=log_stdout,stderr=log_stderr)
-context.signal_map={ signal.SIGTERM: terminate, }
+context.signal_map={ signal.SIGTERM: terminate, signal.SIGUSR1: wakeup, signal.SIGUSR2: resync, signal.SIGHUP: reload_configuration, }
 
 # retrieve unprivileged user from configuration file if any
 user=sdconfig.config.get('daemon','user')
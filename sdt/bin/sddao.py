@@ -10,6 +10,7 @@
 
 """Contains SQL simple queries."""
 
+import copy
 import sdapp
 import sdconst
 from sdexception import SDException,NoTransferWaitingException,FileNotFoundException
@@ -157,6 +158,24 @@ def store_dataset_export_event(d,conn=sddb.conn):
     conn.commit()
     c.close()
 
+# --- generic_cache table --- #
+
+def get_generic_cache_values(realm,conn=sddb.conn):
+    """Returns realm values as a name=>value dict."""
+    c=conn.cursor()
+    c.execute("select name,value from generic_cache where realm=?",(realm,))
+    values=dict((rs[0],rs[1]) for rs in c.fetchall())
+    c.close()
+    return values
+
+def set_generic_cache_value(realm,name,value,commit=True,conn=sddb.conn):
+    c=conn.cursor()
+    c.execute("insert or replace into generic_cache (realm,name,value) values (?,?,?)",(realm,name,value))
+    c.close()
+
+    if commit:
+        conn.commit()
+
 # --- multi tables --- # 
 
 def get_file(file_functional_id=None):
@@ -173,6 +192,25 @@ def get_file(file_functional_id=None):
 
     return f
 
+def get_waiting_transfers(file_ids):
+    """Retrieve many 'waiting' transfers at once.
+
+    Returns
+        dict (file_id => File)
+
+    Note
+        Transfers which are not 'waiting' anymore are not returned.
+    """
+    transfers=sdfiledao.get_files_by_id(file_ids,status=sdconst.TRANSFER_STATUS_WAITING)
+
+    # retrieve the datasets
+    datasets=sddatasetdao.get_datasets_by_id([t.dataset_id for t in transfers.values()])
+    for t in transfers.values():
+        d=datasets.get(t.dataset_id)
+        t.dataset=copy.copy(d) if d is not None else None # each transfer has its own dataset object (as when retrieved one by one)
+
+    return transfers
+
 def get_one_waiting_transfer( datanode=None ):
     if datanode is None:
         li=sdfiledao.get_files( limit=1, status=sdconst.TRANSFER_STATUS_WAITING )
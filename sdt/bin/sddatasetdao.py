@@ -97,6 +97,45 @@ def exists_dataset(path=None,conn=sddb.conn):
     else:
         return False
 
+def get_datasets_status(dataset_functional_ids,conn=sddb.conn):
+    """Retrieve status of many datasets at once.
+
+    Returns
+        dict (dataset_functional_id => status) (datasets not found are not included)
+    """
+    datasets={}
+
+    dataset_functional_ids=list(set(dataset_functional_ids))
+
+    c = conn.cursor()
+
+    for rs in sdsqlutils.select_in(c,"select dataset_functional_id,status from dataset where dataset_functional_id in (%s)",dataset_functional_ids):
+        datasets[rs[0]]=rs[1]
+
+    c.close()
+
+    return datasets
+
+def get_datasets_by_id(dataset_ids,conn=sddb.conn):
+    """Retrieve many datasets at once.
+
+    Returns
+        dict (dataset_id => Dataset)
+    """
+    datasets={}
+
+    dataset_ids=list(set(dataset_ids))
+
+    c = conn.cursor()
+
+    for rs in sdsqlutils.select_in(c,"select * from dataset where dataset_id in (%s)",dataset_ids):
+        d=sdsqlutils.get_object_from_resultset(rs,Dataset)
+        datasets[d.dataset_id]=d
+
+    c.close()
+
+    return datasets
+
 def get_datasets(limit=None,conn=sddb.conn,**search_constraints): # don't change arguments order here
     """
     Note
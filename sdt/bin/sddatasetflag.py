@@ -48,10 +48,11 @@ def switch_off_latest_flag_for_all_other_versions(latest_dataset_version,dataset
                 l__d.latest=False
                 sddatasetdao.update_dataset(l__d,False,sddb.conn)
 
-def update_latest_flag(d,force_latest=False):
+def update_latest_flag(d,force_latest=False,commit=True):
     """
     Args:
         force_latest: If 'true', force 'latest' to 'true' no matter what the compute_latest_flag() method say)
+        commit: If 'false', modifications are committed by the caller
 
     Notes
      - warning: this method update the dataset in database (and in some cases, also all other different versions of this datasets)
@@ -75,7 +76,9 @@ def update_latest_flag(d,force_latest=False):
         pass
 
     sddatasetdao.update_dataset(d,False,sddb.conn) # MOD_B
-    sddb.conn.commit() # commit all datasets modifications together (MOD_A (if any) and MOD_B)
+
+    if commit:
+        sddb.conn.commit() # commit all datasets modifications together (MOD_A (if any) and MOD_B)
 
 def compute_latest_flag(dataset_versions,d):
     """
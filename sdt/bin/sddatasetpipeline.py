@@ -27,10 +27,20 @@ from sdexception import SDException
 
 def run(**kw):
     files=kw.get('files')
+    files=run_stateless(files)
+    files=run_stateful(files)
+    return files
+
+def run_stateless(files):
+    """Run stages which only depend on the input files (no database access)."""
     check_type(files)
     files=sdremoveaggregation.run(files)
     files=sdprepare_dataset_attr.run(files)
     files=sdlocalpath.run(files,mode='dataset')
+    return files
+
+def run_stateful(files):
+    """Run stages which use the database (must be run in the synda process)."""
     files=sdcomplete.run(files)
     files=sdstatusfilter.run(files)
     return files
@@ -9,9 +9,19 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This script contains database I/O routines."""
+"""This script contains database I/O routines.
+
+Notes
+    - the database is opened on first use (see 'LazyConnection'), so
+      commands which don't use it (e.g. 'synda -h') don't pay for it
+    - tables, indexes and triggers creation, and database version check, are
+      only done when the schema stamp stored in the database ('user_version'
+      pragma) doesn't match the current one (i.e. once after each upgrade)
+"""
 
 import os
+import time
+import zlib
 import argparse
 import sqlite3
 import atexit
@@ -21,9 +31,34 @@ import sdconfig
 import sddbobj
 import sddbversion
 import sdtools
+import sdtelemetry
+from sdexception import SDException
+
+class LazyConnection(object):
+    """Connection proxy which opens the database on first use.
+
+    Note
+        DAO funcs get the connection as a default argument value (i.e. at
+        import time), so this object is created before the database is opened.
+    """
+
+    def __getattr__(self,name):
+        return getattr(get_conn(),name)
+
+    def commit(self):
+        start=time.time()
+        get_conn().commit()
+        sdtelemetry.commit_durations.add(time.time()-start)
+
+def get_conn():
+    """Returns the read-write connection (opened on first call)."""
+    if _conn is None:
+        connect()
+
+    return _conn
 
 def connect():
-    global conn
+    global _conn
 
     # set timeout
     #
@@ -61,20 +96,128 @@ def connect():
     #  (If you want autocommit mode, then set isolation_level to None)
 
     # open connection
-    conn=sqlite3.connect(sdconfig.db_file,timeout)
-    conn.row_factory=sqlite3.Row # this is for "by name" colums indexing
+    _conn=sqlite3.connect(sdconfig.db_file,timeout)
+    _conn.row_factory=sqlite3.Row # this is for "by name" colums indexing
+
+    set_journal_mode(_conn)
+    set_pragmas(_conn)
+
+    if get_schema_stamp(_conn)!=schema_stamp:
+        bootstrap(_conn)
+
+def bootstrap(conn):
+    """Create DB objects and upgrade the database schema if needed."""
 
     # create DB object
     sddbobj.create_tables(conn)
     sddbobj.create_indexes(conn)
+    sddbobj.create_triggers(conn)
+
+    sddbversion.check_version(conn) # this call upgrade the database schema if database version does not match binary version
+
+    conn.execute("PRAGMA user_version=%d"%schema_stamp)
+    conn.commit()
+
+    sdlog.info("SDDATABA-013","Database schema checked (stamp=%d)"%schema_stamp)
+
+def get_schema_stamp(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def compute_schema_stamp():
+    """Returns a value which changes each time binary version or schema revision changes."""
+    return zlib.crc32('%s:%d'%(sdapp.version,sddbobj.schema_revision)) & 0x7fffffff # 'user_version' is a signed 32 bits integer
+
+def connect_ro():
+    """Open a read-only connection.
+
+    Notes
+        - this connection is used by commands which only display information
+          (e.g. 'synda queue', 'synda list'), so they never take the write lock.
+        - in WAL journal mode, readers are not blocked by the daemon writes (and
+          do not block them).
+        - read-only mode is enforced using 'query_only' pragma (the 'mode=ro'
+          URI can't be used here as python2 sqlite3 module doesn't support URI).
+    """
+    ro_conn=sqlite3.connect(sdconfig.db_file,120)
+    ro_conn.row_factory=sqlite3.Row
+    ro_conn.isolation_level=None # autocommit (no transaction is needed for reading)
+
+    set_pragmas(ro_conn)
+    ro_conn.execute("PRAGMA query_only=1")
+
+    return ro_conn
+
+def get_ro_conn():
+    """Returns the read-only connection (opened on first call)."""
+    global _ro_conn
+
+    if _ro_conn is None:
+        _ro_conn=connect_ro()
+
+    return _ro_conn
+
+def set_journal_mode(conn):
+    """Set database journal mode.
+
+    Note
+        journal mode is persistent (i.e. stored in the database file), so it
+        is only changed when it doesn't match the configured value (and kept
+        unchanged if no value is configured).
+    """
+    if journal_mode=='':
+        return
+
+    current_journal_mode=conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+    if current_journal_mode.lower()!=journal_mode:
+        try:
+            new_journal_mode=conn.execute("PRAGMA journal_mode=%s"%journal_mode).fetchone()[0]
+
+            # sqlite returns the journal mode in effect, which is the old one if the change was refused
+            if new_journal_mode.lower()==journal_mode:
+                sdlog.info("SDDATABA-006","Journal mode changed (old=%s,new=%s)"%(current_journal_mode,new_journal_mode))
+            else:
+                sdlog.warning("SDDATABA-014","Journal mode cannot be changed, keep current value (current=%s,configured=%s)"%(new_journal_mode,journal_mode))
+        except sqlite3.OperationalError,e:
+            # this happens if another process is using the database (journal
+            # mode can only be changed when no other connection is open)
+
+            sdlog.info("SDDATABA-007","Journal mode cannot be changed now, keep current value (current=%s,configured=%s,reason=%s)"%(current_journal_mode,journal_mode,str(e)))
+
+def set_pragmas(conn):
+    """Set per-connection tuning parameters."""
+    conn.execute("PRAGMA synchronous=%s"%get_synchronous(conn))
+    conn.execute("PRAGMA cache_size=%d"%cache_size)
+    conn.execute("PRAGMA mmap_size=%d"%mmap_size)
+    conn.execute("PRAGMA temp_store=%s"%temp_store)
+
+def get_synchronous(conn):
+    """Returns 'synchronous' pragma value.
+
+    Note
+        if no value is configured, "normal" is used in WAL journal mode and
+        "full" otherwise ("normal" may corrupt the database on power failure
+        in rollback journal mode).
+    """
+    if synchronous!='':
+        return synchronous
+
+    if conn.execute("PRAGMA journal_mode").fetchone()[0].lower()=='wal':
+        return 'normal'
+    else:
+        return 'full'
 
 def disconnect():
-    global conn
+    global _conn,_ro_conn
+
+    if _ro_conn is not None:
+        _ro_conn.close()
+        _ro_conn=None
 
     if is_connected():
-        conn.close()
+        _conn.close()
 
-    conn=None
+    _conn=None
 
     # hack
     #
@@ -96,7 +239,7 @@ def disconnect():
                 sdlog.info("SDDATABA-004","Missing privilege to modify file permissions ('%s')"%sdconfig.db_file)
 
 def is_connected():
-    if (conn==None):
+    if (_conn==None):
         return False
     else:
         return True
@@ -139,23 +282,122 @@ def load_table_in_memory(tablename,indexname):
 
     sdlog.info("SDDATABA-002","table loaded")
 
+def benchmark(rows,duration,dbfile):
+    """Measure reader/writer contention with each journal mode.
+
+    A writer thread updates files status in small transactions (as the daemon
+    does) while the main thread runs 'synda queue' query in loop (using
+    another connection). Synthetic data is used (the synda database is not
+    used).
+    """
+    import time
+    import threading
+    import random
+
+    def percentile(li,p):
+        li=sorted(li)
+        return li[min(len(li)-1,int(len(li)*p))] if len(li)>0 else 0
+
+    for mode in ('delete','wal'):
+        for suffix in ('','-wal','-shm','-journal'):
+            if os.path.exists(dbfile+suffix):
+                os.remove(dbfile+suffix)
+
+        setup_conn=sqlite3.connect(dbfile)
+        setup_conn.execute("PRAGMA journal_mode=%s"%mode)
+        setup_conn.execute("create table file (file_id INTEGER PRIMARY KEY, status TEXT, size INT, priority INT)")
+        setup_conn.executemany("insert into file (status,size,priority) values (?,?,?)",(('waiting',random.randint(1,10**9),1000) for i in xrange(rows)))
+        setup_conn.execute("create index idx_file_1 on file (status)")
+        setup_conn.commit()
+        setup_conn.close()
+
+        stop=threading.Event()
+        write_latencies=[]
+        write_errors=[0]
+
+        def writer():
+            w_conn=sqlite3.connect(dbfile,5)
+            set_pragmas(w_conn)
+            while not stop.is_set():
+                start=time.time()
+                try:
+                    ids=[(random.randint(1,rows),) for i in range(50)]
+                    w_conn.executemany("update file set status='done' where file_id=?",ids)
+                    w_conn.commit()
+                    write_latencies.append(time.time()-start)
+                except sqlite3.OperationalError:
+                    w_conn.rollback()
+                    write_errors[0]+=1
+                time.sleep(0.01)
+            w_conn.close()
+
+        r_conn=sqlite3.connect(dbfile,5)
+        set_pragmas(r_conn)
+
+        th=threading.Thread(target=writer)
+        th.start()
+
+        read_latencies=[]
+        read_errors=0
+        end=time.time()+duration
+        while time.time()<end:
+            start=time.time()
+            try:
+                r_conn.execute("select status,count(*),sum(size) from file group by status").fetchall()
+                read_latencies.append(time.time()-start)
+            except sqlite3.OperationalError:
+                read_errors+=1
+
+        stop.set()
+        th.join()
+        r_conn.close()
+
+        print "%-6s reads: %5d (p50=%.1fms,p99=%.1fms,max=%.1fms,errors=%d)  writes: %5d (p50=%.1fms,p99=%.1fms,max=%.1fms,errors=%d)"%(mode,
+                len(read_latencies),percentile(read_latencies,0.5)*1000,percentile(read_latencies,0.99)*1000,max(read_latencies or [0])*1000,read_errors,
+                len(write_latencies),percentile(write_latencies,0.5)*1000,percentile(write_latencies,0.99)*1000,max(write_latencies or [0])*1000,write_errors[0])
+
+    for suffix in ('','-wal','-shm','-journal'):
+        if os.path.exists(dbfile+suffix):
+            os.remove(dbfile+suffix)
+
 # module init
 
-conn=None
+conn=LazyConnection()
+_conn=None
+_ro_conn=None
 _in_memory_conn=None
 
-connect()
-sddbversion.check_version(conn) # this call upgrade the database schema if database version does not match binary version
+journal_mode=sdconfig.config.get('core','db_journal_mode').lower()
+synchronous=sdconfig.config.get('core','db_synchronous').lower()
+cache_size=sdconfig.config.getint('core','db_cache_size')
+mmap_size=sdconfig.config.getint('core','db_mmap_size')
+temp_store=sdconfig.config.get('core','db_temp_store').lower()
+
+if journal_mode not in ('','wal','delete','truncate','persist'):
+    raise SDException("SDDATABA-010","Incorrect value for 'db_journal_mode' parameter (%s)"%journal_mode)
+if synchronous not in ('','off','normal','full'):
+    raise SDException("SDDATABA-011","Incorrect value for 'db_synchronous' parameter (%s)"%synchronous)
+if temp_store not in ('default','file','memory'):
+    raise SDException("SDDATABA-012","Incorrect value for 'db_temp_store' parameter (%s)"%temp_store)
+
+schema_stamp=compute_schema_stamp()
+
 atexit.register(disconnect)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
+    parser.add_argument('-b','--benchmark',action='store_true',help='Measure reader/writer contention with each journal mode (synthetic data)')
+    parser.add_argument('-d','--duration',type=int,default=10,help='Benchmark duration for each journal mode (in seconds)')
+    parser.add_argument('-r','--rows',type=int,default=200000,help='Number of rows used by the benchmark')
     args = parser.parse_args()
 
-    c = conn.cursor()
-    c.execute("select url from file")
-    rs=c.fetchone()
-    if rs!=None:
-        print type(rs[0])
-        print rs[0]
-    c.close()
+    if args.benchmark:
+        benchmark(args.rows,args.duration,os.path.join(sdconfig.tmp_folder,'sddb_benchmark.db'))
+    else:
+        c = conn.cursor()
+        c.execute("select url from file")
+        rs=c.fetchone()
+        if rs!=None:
+            print type(rs[0])
+            print rs[0]
+        c.close()
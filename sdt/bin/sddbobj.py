@@ -36,11 +36,24 @@ def create_tables(conn):
             - timestamp column contains is the ESGF timestamp attribute (aka "last update")
         - 'generic_cache' table
             - 'realm' column is a group of keys/values (e.g. rtt, geo, etc..)
+            - (realm,name) is unique, so values are set using 'insert or replace'
         - 'history' table
             - 'selection_file' column is not used (it was initially added in
               case 'selection_filename' column would not be sufficient for
               incremental mode. It may be removed by 2018, once we are sure
               we don't need it).
+        - 'dataset_status_count' and 'variable_status_count' tables
+            - number of files for each status, by dataset and by (dataset,variable)
+            - maintained by triggers on the 'file' table (see 'create_triggers'), so they are
+              always consistent with the 'file' table, whatever the process which modifies it
+            - NULL variable is stored as empty string (so it can be part of the primary key)
+            - can be rebuilt from the 'file' table (see 'rebuild_status_counters')
+        - 'file_id_generation' table
+            - one row, incremented by a trigger each time the file having the
+              greatest file_id is deleted (i.e. when file_id of deleted rows
+              may be reused by the next inserted files, as 'file_id' is not
+              AUTOINCREMENT)
+            - used by the daemon to find new transfers using their file_id (see 'sdwaitingqueue')
         - other tables
             - a dataset is a set of one or more variables
             - 'file_without_dataset' table contains orphan files (dataset doesn't exist for those files)
@@ -64,6 +77,16 @@ def create_tables(conn):
 
     conn.execute("create table if not exists generic_cache (realm TEXT, name TEXT, value TEXT)")
 
+    status_counters_exist=table_exists(conn,'dataset_status_count')
+    conn.execute("create table if not exists dataset_status_count (dataset_id INT NOT NULL, status TEXT NOT NULL, count INT NOT NULL, PRIMARY KEY (dataset_id,status))")
+    conn.execute("create table if not exists variable_status_count (dataset_id INT NOT NULL, variable TEXT NOT NULL, status TEXT NOT NULL, count INT NOT NULL, PRIMARY KEY (dataset_id,variable,status))")
+    if not status_counters_exist:
+        # tables have just been added to an existing database
+        rebuild_status_counters(conn,commit=False)
+
+    conn.execute("create table if not exists file_id_generation (generation INT NOT NULL)")
+    conn.execute("insert into file_id_generation (generation) select 0 where not exists (select 1 from file_id_generation)")
+
     conn.commit()
 
 def create_indexes(conn):
@@ -94,3 +117,55 @@ def create_indexes(conn):
     conn.execute("create        index if not exists idx_event_2 on event (status)")
     conn.execute("create        index if not exists idx_event_3 on event (crea_date)")
     conn.execute("create        index if not exists idx_file_13 on file (data_node)")
+    conn.execute("create        index if not exists idx_file_14 on file (status,data_node,priority)")
+    conn.execute("create unique index if not exists idx_generic_cache_1 on generic_cache (realm,name)")
+
+def create_triggers(conn):
+    """Create triggers which maintain the 'dataset_status_count', 'variable_status_count' and 'file_id_generation' tables."""
+
+    increment="""
+        insert or ignore into dataset_status_count (dataset_id,status,count) values (new.dataset_id,ifnull(new.status,''),0);
+        update dataset_status_count set count=count+1 where dataset_id=new.dataset_id and status=ifnull(new.status,'');
+        insert or ignore into variable_status_count (dataset_id,variable,status,count) values (new.dataset_id,ifnull(new.variable,''),ifnull(new.status,''),0);
+        update variable_status_count set count=count+1 where dataset_id=new.dataset_id and variable=ifnull(new.variable,'') and status=ifnull(new.status,'');
+    """
+    decrement="""
+        update dataset_status_count set count=count-1 where dataset_id=old.dataset_id and status=ifnull(old.status,'');
+        update variable_status_count set count=count-1 where dataset_id=old.dataset_id and variable=ifnull(old.variable,'') and status=ifnull(old.status,'');
+    """
+
+    # note: when dataset_id is NULL (orphan file), 'insert or ignore' does nothing (NOT NULL constraint) and 'update' matches no row
+
+    conn.execute("create trigger if not exists trg_file_status_count_1 after insert on file begin %s end"%increment)
+    conn.execute("create trigger if not exists trg_file_status_count_2 after delete on file begin %s end"%decrement)
+    conn.execute("""create trigger if not exists trg_file_status_count_3 after update of status,dataset_id,variable on file
+                    when old.status is not new.status or old.dataset_id is not new.dataset_id or old.variable is not new.variable
+                    begin %s %s end"""%(decrement,increment))
+
+    # file_id can only be reused once all rows with a greater or equal file_id
+    # have been deleted, so it's enough to detect the deletion of the last row
+    conn.execute("""create trigger if not exists trg_file_id_generation_1 after delete on file
+                    when old.file_id > ifnull((select max(file_id) from file),0)
+                    begin update file_id_generation set generation=generation+1; end""")
+    conn.commit()
+
+def rebuild_status_counters(conn,commit=True):
+    """Re-compute 'dataset_status_count' and 'variable_status_count' tables from the 'file' table."""
+    conn.execute("delete from dataset_status_count")
+    conn.execute("delete from variable_status_count")
+    conn.execute("insert into dataset_status_count (dataset_id,status,count) select dataset_id,ifnull(status,''),count(*) from file where dataset_id is not null group by dataset_id,ifnull(status,'')")
+    conn.execute("insert into variable_status_count (dataset_id,variable,status,count) select dataset_id,ifnull(variable,''),ifnull(status,''),count(*) from file where dataset_id is not null group by dataset_id,ifnull(variable,''),ifnull(status,'')")
+
+    if commit:
+        conn.commit()
+
+def table_exists(conn,tablename):
+    c=conn.cursor()
+    c.execute("select 1 from sqlite_master where type='table' and name=?",(tablename,))
+    rs=c.fetchone()
+    c.close()
+    return rs is not None
+
+# init.
+
+schema_revision=2 # increment this each time tables, indexes or triggers above are modified (so they are re-created in existing databases, see 'sddb.bootstrap')
@@ -85,5 +85,10 @@ def check():
     list files having more than one variable
   selection
     check if selection files parameters are valid
+  status_counters
+    rebuild files status counters (used to detect dataset and variable
+    completion) from the file table, and report inconsistencies found
+    (this check only uses the local database, search parameters and
+    search-API options are ignored)
 """
     return buf
@@ -26,6 +26,7 @@ import sdexception
 import sdlogon
 import sdconfig
 import sdtime
+import sddb
 import sdfiledao
 import sdevent
 import sdutils
@@ -33,6 +34,7 @@ import sdtools
 import sdget
 import sdtrace
 import sdnexturl
+import sdwatchdog
 import sdworkerutils
 
 class Download():
@@ -40,6 +42,10 @@ class Download():
 
     @classmethod
     def run(cls,tr):
+        if getattr(tr,'start_delay',0)>0:
+            time.sleep(tr.start_delay) # not to be too agressive with datanodes (see 'get_start_delay')
+            tr.start_date=sdtime.now()
+
         cls.start_transfer_script(tr)
 
         # unset metrics fields if transfer did not complete successfully
@@ -47,25 +53,40 @@ class Download():
             tr.duration=None
             tr.rate=None
 
+    @classmethod
+    def download(cls,tr,checksum_type):
+        """Transfer the file (this method is overridden in other download managers).
+
+        Returns
+            (sdget_status,killed,sdget_error_msg,local_checksum) tuple
+        """
+        return sdget.download(tr.url,
+                              tr.get_full_local_path(),
+                              debug=False,
+                              http_client=sdconst.HTTP_CLIENT_WGET,
+                              timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,
+                              verbosity=0,
+                              buffered=True,
+                              hpss=hpss,
+                              checksum_type=checksum_type)
+
     @classmethod
     def start_transfer_script(cls,tr):
 
         sdlog.info("JFPDMDEF-001","Will download url=%s"%(tr.url,))
+        tr.local_checksum=None
         if sdconfig.fake_download:
             tr.status=sdconst.TRANSFER_STATUS_DONE
             tr.error_msg=""
             tr.sdget_error_msg=""
             return
 
+        # checksum is computed while downloading, unless post-download checksum is explicitly asked
+        checksum_type=tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5 # fallback to 'md5' (arbitrary)
+        streaming_checksum_type=checksum_type if (tr.checksum is not None and not post_download_checksum) else None
+
         # main
-        (tr.sdget_status,killed,tr.sdget_error_msg)=sdget.download(tr.url,
-                                                                   tr.get_full_local_path(),
-                                                                   debug=False,
-                                                                   http_client=sdconst.HTTP_CLIENT_WGET,
-                                                                   timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,
-                                                                   verbosity=0,
-                                                                   buffered=True,
-                                                                   hpss=hpss)
+        (tr.sdget_status,killed,tr.sdget_error_msg,tr.local_checksum)=cls.download(tr,streaming_checksum_type)
 
 
         # check
@@ -88,9 +109,10 @@ class Download():
             if remote_checksum!=None:
                 # remote checksum exists
 
-                # compute local checksum
-                checksum_type=tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5 # fallback to 'md5' (arbitrary)
-                local_checksum=sdutils.compute_checksum(tr.get_full_local_path(),checksum_type)
+                # compute local checksum (only if not already computed during the download)
+                if tr.local_checksum is None:
+                    tr.local_checksum=sdutils.compute_checksum(tr.get_full_local_path(),checksum_type)
+                local_checksum=tr.local_checksum
 
                 # compare local and remote checksum
                 if remote_checksum==local_checksum:
@@ -136,7 +158,21 @@ class Download():
                     sdlog.error("SDDMDEFA-528","Error occurs during file suppression (%s,%s)"%(tr.get_full_local_path(),str(e)))
 
             # Set status
-            if killed:
+            if killed and sdwatchdog.must_retry(tr.get_full_local_path()):
+
+                # transfer has been cancelled by the watchdog because it was
+                # stalled (e.g. data node temporarily overloaded): it is
+                # retried a few times (see 'sdwatchdog.max_stall_retries')
+                # before being handled as any other killed transfer
+
+                tr.status=sdconst.TRANSFER_STATUS_WAITING
+                tr.priority -= 1
+                tr.error_msg="Transfer stalled, marked for retry"
+
+                sdlog.warning("SDDMDEFA-191","%s (file_id=%d,url=%s,local_path=%s)"%(tr.error_msg,tr.file_id,tr.url,tr.local_path))
+
+                return
+            elif killed:
 
                 # OLD WAY
                 #tr.status=sdconst.TRANSFER_STATUS_WAITING
@@ -196,59 +232,109 @@ class Download():
                 tr.priority -= 1
                 tr.error_msg='Error occurs during download.'
 
-def end_of_transfer(tr):
+def end_of_transfers(transfers):
+    """Save the result of many transfers in the database.
+
+    Note
+        everything (files, events and datasets status) is saved in one
+        transaction, so to keep the database write lock as short as possible
+        (interactive 'synda' commands use the same database).
+    """
 
     # log
-    if tr.status==sdconst.TRANSFER_STATUS_DONE:
-        sdlog.info("SDDMDEFA-101","Transfer done (%s)"%str(tr))
-    elif tr.status==sdconst.TRANSFER_STATUS_WAITING:
-        # Transfer have been marked for retry
-        #
-        # This may happen for example
-        #  - during shutdown immediate, where all running transfers are killed, or when wget are 'stalled' and killed by watchdog
-        #  - as a consequence of sdnexturl
-        
-        sdlog.info("SDDMDEFA-108","Transfer marked for retry (error_msg='%s',url=%s,file_id=%d"%(tr.error_msg,tr.url,tr.file_id))
-    else:
-        sdlog.info("SDDMDEFA-102","Transfer failed (%s)"%str(tr))
-
-    # update file
-    sdfiledao.update_file(tr)
-
-    # IMPORTANT: code below must run AFTER the file status has been saved in DB
-
-    if tr.status==sdconst.TRANSFER_STATUS_DONE:
-        sdevent.file_complete_event(tr) # trigger 'file complete' event
-
-    # TODO: maybe do some rollback here in case fatal exception occurs in 'file_complete_event'
-    #       (else, we have a file marked as 'done' with the corresponding event un-triggered)
+    for tr in transfers:
+        if tr.status==sdconst.TRANSFER_STATUS_DONE:
+            sdlog.info("SDDMDEFA-101","Transfer done (%s)"%str(tr))
+            sdlog.debug("SDDMDEFA-103","Local checksum (file_id=%d,local_checksum=%s)"%(tr.file_id,tr.local_checksum))
+        elif tr.status==sdconst.TRANSFER_STATUS_WAITING:
+            # Transfer have been marked for retry
+            #
+            # This may happen for example
+            #  - during shutdown immediate, where all running transfers are killed, or when wget are 'stalled' and killed by watchdog
+            #  - as a consequence of sdnexturl
+            
+            sdlog.info("SDDMDEFA-108","Transfer marked for retry (error_msg='%s',url=%s,file_id=%d"%(tr.error_msg,tr.url,tr.file_id))
+        else:
+            sdlog.info("SDDMDEFA-102","Transfer failed (%s)"%str(tr))
 
-    # check for fatal error
-    if tr.sdget_status==4:
-        sdlog.info("SDDMDEFA-147","Stopping daemon as sdget.download() returned fatal error.")
-        raise sdexception.FatalException()
+    try:
+        # update files
+        sdfiledao.update_files(transfers,commit=False)
 
-def start_transfer_thread(tr):
-    th=sdworkerutils.WorkerThread(tr,eot_queue,Download)
-    th.setDaemon(True) # if main thread quits, we kill running threads (note though that forked child processes are NOT killed and continue running after that !)
-    th.start()
+        # IMPORTANT: code below must run AFTER the files status have been updated
+        # (in the same transaction, so a file can't be marked as 'done' with
+        # the corresponding event un-triggered)
 
-def transfers_end():
-    for i in range(8): # arbitrary
+        sdevent.files_complete_event([tr for tr in transfers if tr.status==sdconst.TRANSFER_STATUS_DONE],commit=False) # trigger 'file complete' event
+
+        sddb.conn.commit()
+    except:
+        sddb.conn.rollback()
+        raise
+
+    sdlog.debug("SDDMDEFA-110","End of transfer processed (count=%d)"%len(transfers))
+
+    # check for fatal error
+    for tr in transfers:
+        if tr.sdget_status==4:
+            sdlog.info("SDDMDEFA-147","Stopping daemon as sdget.download() returned fatal error.")
+            raise sdexception.FatalException()
+
+def process_eot_queue(queue):
+    """Process end of transfer instructions from the queue, by batch.
+
+    Returns
+        list of transfers which have been processed
+
+    Notes
+        - if the batch can't be saved, transfers are put back in the queue
+          (so they are not lost, and will be processed in the next loop)
+        - if a fatal error is raised once the batch has been saved, processed
+          transfers are attached to the exception ('transfers' attribute), so
+          the caller can still account them
+    """
+    transfers=[]
+
+    while len(transfers)<eot_batch_size:
         try:
-            task=eot_queue.get_nowait() # raises Empty when empty
-            end_of_transfer(task)
-            eot_queue.task_done()
+            transfers.append(queue.get_nowait()) # raises Empty when empty
         except Queue.Empty, e:
-            pass
-        except sdexception.FatalException, e:
+            break
+
+    if len(transfers)>0:
+        try:
+            end_of_transfers(transfers)
+        except sdexception.FatalException,e:
+            for tr in transfers:
+                queue.task_done()
+            e.transfers=transfers
             raise
         except:
+            for tr in transfers:
+                queue.put(tr)
+                queue.task_done()
+            raise
 
-            # debug
-            #sdtrace.log_exception(stderr=True)
+        for tr in transfers:
+            queue.task_done()
 
-            raise
+    # remaining items will be processed in the next loop, without waiting
+    if not queue.empty():
+        sdworkerutils.wakeup.set()
+
+    return transfers
+
+def start_transfer_thread(tr):
+    th=sdworkerutils.WorkerThread(tr,eot_queue,Download)
+    th.setDaemon(True) # if main thread quits, we kill running threads (note though that forked child processes are NOT killed and continue running after that !)
+    th.start()
+
+def transfers_end():
+    """
+    Returns
+        list of transfers which have been processed
+    """
+    return process_eot_queue(eot_queue)
 
 def transfers_begin(transfers):
 
@@ -259,9 +345,19 @@ def transfers_begin(transfers):
         sdlog.error("SDDMDEFA-502","Exception occured while retrieving certificate (%s)"%str(e))
         raise
 
+    # the delay between transfers start is spent in the transfer thread, so
+    # the scheduler is not blocked, and transfers of different data nodes
+    # start without delay
     for tr in transfers:
+        tr.start_delay=get_start_delay(tr.data_node)
         start_transfer_thread(tr)
-        time.sleep(1) # this sleep is not to be too agressive with datanodes
+
+def get_start_delay(data_node):
+    """Returns how long the transfer must wait before starting, so that transfers of the same data node start at least 'start_interval' seconds apart."""
+    now=time.time()
+    start=max(now,next_start_dates.get(data_node,0))
+    next_start_dates[data_node]=start+start_interval
+    return start-now
 
 def can_leave():
     return eot_queue.empty()
@@ -273,4 +369,8 @@ def fatal_exception():
 
 hpss=sdconfig.config.getboolean('download','hpss') # hpss & parse_output hack
 eot_queue=Queue.Queue() # eot means "End Of Task"
+eot_batch_size=500 # maximum number of end of transfer instructions saved in one transaction
+start_interval=1 # seconds (minimum delay between two transfers start on the same data node)
+next_start_dates={} # data_node => date from which the next transfer can start
 incorrect_checksum_action=sdconfig.config.get('behaviour','incorrect_checksum_action')
+post_download_checksum=sdconfig.config.getboolean('download','post_download_checksum')
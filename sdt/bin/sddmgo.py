@@ -35,6 +35,11 @@ from globusonline.transfer import api_client
 from globusonline.transfer.api_client import x509_proxy
 
 def transfers_end():
+    """
+    Returns
+        list of transfers which have been processed
+    """
+    transfers=[]
 
     _, _, access_token = api_client.goauth.get_access_token(username=globus_username, password=globus_password)
     api = api_client.TransferAPIClient(username=globus_username, goauth=access_token)
@@ -142,8 +147,11 @@ def transfers_end():
 
         # Remove the tasks from the lists of active tasks
         if status == "SUCCEEDED" or status == "FAILED":
+            transfers.extend([item['tr'] for item in globus_tasks[task_id]['items']])
             globus_tasks.pop(task_id, None)
 
+    return transfers
+
 def transfers_begin(transfers):
 
     # Activate the destination endpoint
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This script contains download management funcs (native HTTP implementation).
+
+Notes
+    - sddmhttp means 'SynDa Download Manager HTTP'
+    - HTTP transfers are done in-process (see 'sdget_httplib'), using keep-alive
+      connections shared by all transfers of the same data node.
+    - Non-HTTP transfers (e.g. gridftp) and post-transfer processing are
+      delegated to the default download manager.
+"""
+
+import time
+import Queue
+import sdapp
+import sdlog
+import sdconst
+import sdlogon
+import sdconfig
+import sdutils
+import sdget_httplib
+import sdwatchdog
+import sddmdefault
+import sdworkerutils
+
+class Download(sddmdefault.Download):
+    exception_occurs=False # this flag is used to stop the event loop if exception occurs in thread
+
+    @classmethod
+    def download(cls,tr,checksum_type):
+
+        if sdutils.get_transfer_protocol(tr.url)!=sdconst.TRANSFER_PROTOCOL_HTTP:
+            return sddmdefault.Download.download(tr,checksum_type)
+
+        cancellation=sdget_httplib.Cancellation()
+        sdwatchdog.register(id(cancellation),tr.get_full_local_path(),cancellation.cancel) # stalled transfer detection
+        try:
+            (status,error_msg,local_checksum)=sdget_httplib.download_file(tr.url,
+                                                                          tr.get_full_local_path(),
+                                                                          timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,
+                                                                          checksum_type=checksum_type,
+                                                                          cancellation=cancellation)
+        finally:
+            sdwatchdog.unregister(id(cancellation))
+
+        killed=cancellation.cancelled # handled as a killed wget (see TAG4JK4JJJ4454)
+
+        return (status,killed,error_msg,local_checksum)
+
+def start_transfer_thread(tr):
+    th=sdworkerutils.WorkerThread(tr,eot_queue,Download)
+    th.setDaemon(True)
+    th.start()
+
+def transfers_end():
+    """
+    Returns
+        list of transfers which have been processed
+    """
+    return sddmdefault.process_eot_queue(eot_queue)
+
+def transfers_begin(transfers):
+
+    # renew certificate if needed
+    try:
+        sdlogon.renew_certificate(sdconfig.openid,sdconfig.password,force_renew_certificate=False)
+    except Exception,e:
+        sdlog.error("SDDMHTTP-502","Exception occured while retrieving certificate (%s)"%str(e))
+        raise
+
+    # note that unlike in 'sddmdefault', we don't sleep between transfers
+    # start, as connections to the data node are reused (i.e. no new
+    # connection is opened for each transfer)
+    for tr in transfers:
+        start_transfer_thread(tr)
+
+def can_leave():
+    return eot_queue.empty()
+
+def fatal_exception():
+    return Download.exception_occurs
+
+# module init.
+
+eot_queue=Queue.Queue() # eot means "End Of Task"
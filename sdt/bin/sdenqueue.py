@@ -71,7 +71,8 @@ def run(metadata,timestamp_right_boundary=None):
 
         sdlog.info("SDENQUEU-103","Insert files and datasets..")
 
-        po=sdpipelineprocessing.ProcessingObject(add_files)
+        datasets={} # dataset_functional_id => (dataset_id,local_path) cache (each dataset is retrieved/updated only once per run)
+        po=sdpipelineprocessing.ProcessingObject(add_files,datasets)
         metadata=sdpipelineprocessing.run_pipeline(metadata,po)
 
         sdlog.info("SDENQUEU-104","Fill timestamp..")
@@ -80,6 +81,8 @@ def run(metadata,timestamp_right_boundary=None):
 
         sddb.conn.commit() # final commit (we do all insertion/update in one transaction).
 
+        sdutils.notify_daemon() # so that the daemon starts the new transfers without delay
+
         if sdconfig.progress:
             sdprogress.ProgressThread.stop() # spinner stop
 
@@ -126,25 +129,49 @@ def keep_recent_datasets(datasets):
 
     return li
 
-def add_files(files):
+def add_files(files,datasets):
+    transfers=[]
+
     for f in files:
-        add_file(File(**f))
+        transfers.append(prepare_file(File(**f),datasets))
+
+    sdfiledao.add_files(transfers,commit=False) # insert the whole chunk at once
+
+    sdlog.info("SDENQUEU-005","%i transfer(s) created"%len(transfers))
+
     return [] # nothing to return (end of processing)
 
-def add_file(f):
-    sdlog.info("SDENQUEU-003","Create transfer (local_path=%s,url=%s)"%(f.get_full_local_path(),f.url))
+def prepare_file(f,datasets):
+    sdlog.debug_throttled("SDENQUEU-003","Create transfer (local_path=%s,url=%s)"%(f.get_full_local_path(),f.url))
 
-    f.dataset_id=add_dataset(f)
+    f.dataset_id=add_dataset(f,datasets)
     f.status=sdconst.TRANSFER_STATUS_WAITING
     f.crea_date=sdtime.now()
 
-    sdfiledao.add_file(f,commit=False)
+    return f
 
-def add_dataset(f):
+def add_dataset(f,datasets):
     """
     Returns:
         dataset_id
     """
+
+    if f.dataset_functional_id in datasets:
+        # dataset already created or updated during this run
+
+        (dataset_id,local_path)=datasets[f.dataset_functional_id]
+
+        if local_path!=f.dataset_local_path:
+            raise SDException("SDENQUEU-008","Incorrect local path format (existing_format=%s,new_format=%s)"%(local_path,f.dataset_local_path))
+
+        return dataset_id
+
+    dataset_id=add_dataset_(f)
+    datasets[f.dataset_functional_id]=(dataset_id,f.dataset_local_path)
+
+    return dataset_id
+
+def add_dataset_(f):
     d=sddatasetdao.get_dataset(dataset_functional_id=f.dataset_functional_id)
     if d is not None:
 
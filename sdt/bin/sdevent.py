@@ -23,6 +23,7 @@ import sddao
 import sdconst
 import sdtime
 import sdlog
+import sddb
 from sdtools import print_stderr
 from sdtypes import Event
 
@@ -52,28 +53,55 @@ def file_complete_event(tr):
         but a dataset can be marked as complete even if it contains only a subset of variables included in this dataset
         (but still all variables that have been discovered for this dataset must be complete)
     """
-    sdlog.log("SYDEVENT-001","'file_complete_event' triggered (%s)"%tr.file_functional_id,event_triggered_log_level)
-
-    if sdconfig.is_event_enabled(sdconst.EVENT_FILE_COMPLETE,tr.project):
-        event=Event(name=sdconst.EVENT_FILE_COMPLETE)
-        event.project=tr.project
-        event.model=tr.model
-        event.dataset_pattern=tr.dataset.local_path
-        event.variable=tr.variable
-        event.filename_pattern=tr.filename
-        event.crea_date=sdtime.now()
-        event.priority=sdconst.DEFAULT_PRIORITY
-        sdeventdao.add_event(event,commit=True)
+    files_complete_event([tr])
+
+def files_complete_event(transfers,commit=True):
+    """Trigger 'file complete' event for many files at once.
+
+    Note
+        dataset status and variable completeness are computed only once per
+        dataset and per variable (i.e. not once per file).
+    """
+    datasets={}  # dataset_id => Dataset
+    variables={} # (dataset_id,variable) => transfer
+
+    for tr in transfers:
+        sdlog.log("SYDEVENT-001","'file_complete_event' triggered (%s)"%tr.file_functional_id,event_triggered_log_level)
+
+        if sdconfig.is_event_enabled(sdconst.EVENT_FILE_COMPLETE,tr.project):
+            event=Event(name=sdconst.EVENT_FILE_COMPLETE)
+            event.project=tr.project
+            event.model=tr.model
+            event.dataset_pattern=tr.dataset.local_path
+            event.variable=tr.variable
+            event.filename_pattern=tr.filename
+            event.crea_date=sdtime.now()
+            event.priority=sdconst.DEFAULT_PRIORITY
+            sdeventdao.add_event(event,commit=False)
+
+        # all transfers of the same dataset share the same dataset object from now
+        d=datasets.setdefault(tr.dataset.dataset_id,tr.dataset)
+        if d.last_done_transfer_date is None or (tr.end_date is not None and tr.end_date>d.last_done_transfer_date):
+            d.last_done_transfer_date=tr.end_date
+        tr.dataset=d
+
+        variables[(d.dataset_id,tr.variable)]=tr
 
     # update dataset (all except 'latest' flag)
-    tr.dataset.status=sddatasetflag.compute_dataset_status(tr.dataset)
-    tr.dataset.last_done_transfer_date=tr.end_date
-    sddatasetdao.update_dataset(tr.dataset)
+    for d in datasets.values():
+        d.status=sddatasetflag.compute_dataset_status(d)
+        sddatasetdao.update_dataset(d,commit=False)
+
+    cascaded=set() # 'dataset complete' event must be triggered only once per dataset, even if many variables complete in this batch
+    for (dataset_id,variable),tr in variables.iteritems():
+        if sdvariable.is_variable_complete(dataset_id,variable):
+            variable_complete_event(tr.project,tr.model,tr.dataset,variable,commit=False,dataset_cascade=(dataset_id not in cascaded)) # trigger 'variable complete' event
+            cascaded.add(dataset_id)
 
-    if sdvariable.is_variable_complete(tr.dataset.dataset_id,tr.variable):
-        variable_complete_event(tr.project,tr.model,tr.dataset,tr.variable) # trigger 'variable complete' event
+    if commit:
+        sddb.conn.commit()
 
-def variable_complete_event(project,model,dataset,variable,commit=True):
+def variable_complete_event(project,model,dataset,variable,commit=True,dataset_cascade=True):
     sdlog.log("SYDEVENT-002","'variable_complete_event' triggered (%s,%s)"%(dataset.dataset_functional_id,variable),event_triggered_log_level)
 
     if sdconfig.is_event_enabled(sdconst.EVENT_VARIABLE_COMPLETE,project):
@@ -88,8 +116,8 @@ def variable_complete_event(project,model,dataset,variable,commit=True):
         sdeventdao.add_event(event,commit=commit)
 
     # cascade 1 (trigger dataset event)
-    if dataset.status==sdconst.DATASET_STATUS_COMPLETE:
-        dataset_complete_event(project,model,dataset) # trigger 'dataset complete' event
+    if dataset_cascade and dataset.status==sdconst.DATASET_STATUS_COMPLETE:
+        dataset_complete_event(project,model,dataset,commit=commit) # trigger 'dataset complete' event
 
     # cascade 2 (trigger variable output12 event)
     if project=='CMIP5':
@@ -104,12 +132,12 @@ def variable_complete_event(project,model,dataset,variable,commit=True):
 
             if sdvariable.is_variable_complete(d1.dataset_id,variable) and sdvariable.is_variable_complete(d2.dataset_id,variable):
                 dataset_pattern=sdproduct.replace_output12_product_with_wildcard(dataset.local_path)
-                variable_complete_output12_event(project,model,dataset_pattern,variable) # trigger event (cross dataset event)
+                variable_complete_output12_event(project,model,dataset_pattern,variable,commit=commit) # trigger event (cross dataset event)
         else:
             # we also trigger the 'variable_complete_output12_event' event if the variable is over one product only (because if only one product, then output12 event is also true)
 
             dataset_pattern=sdproduct.replace_output12_product_with_wildcard(dataset.local_path)
-            variable_complete_output12_event(project,model,dataset_pattern,variable) # trigger event (cross dataset event)
+            variable_complete_output12_event(project,model,dataset_pattern,variable,commit=commit) # trigger event (cross dataset event)
 
 def variable_complete_output12_event(project,model,dataset_pattern,variable,commit=True):
     sdlog.log("SYDEVENT-003","'variable_complete_output12_event' triggered (%s,%s)"%(dataset_pattern,variable),event_triggered_log_level)
@@ -152,7 +180,7 @@ def dataset_complete_event(project,model,dataset,commit=True):
     if not old_latest:
         # old state is not latest
 
-        sddatasetflag.update_latest_flag(dataset) # warning: this method modifies the dataset object in memory (and in database too)
+        sddatasetflag.update_latest_flag(dataset,commit=commit) # warning: this method modifies the dataset object in memory (and in database too)
     else:
         # nothing to do concerning the 'latest' flag as the current dataset is already the latest
         # (the latest flag can only be switched off (i.e. to False) by *other* datasets versions, not by himself !!!)
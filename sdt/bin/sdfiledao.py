@@ -20,7 +20,6 @@ from sdtypes import File
 import sdlog
 from sdtime import SDTimer
 import sdconst
-import sdsqlitedict
 
 def update_transfer_last_access_date(i__date,i__transfer_id,conn=sddb.conn):
     # no commit here (will be committed in updatelastaccessdate())
@@ -29,22 +28,11 @@ def update_transfer_last_access_date(i__date,i__transfer_id,conn=sddb.conn):
     c.close()
 
 def add_file(file,commit=True,conn=sddb.conn):
-    keys_to_insert=['status', 'crea_date', 'url', 'local_path', 'filename', 'file_functional_id', 'tracking_id', 'priority', 'checksum', 'checksum_type', 'size', 'variable', 'project', 'model', 'data_node', 'dataset_id', 'insertion_group_id', 'timestamp']
-    # for future:, 'searchapi_host']
+    return sdsqlutils.insert(file,keys_to_insert,commit,conn)
 
-    if not sdconst.GET_FILES_CACHING:
-        return sdsqlutils.insert(file,keys_to_insert,commit,conn)
-    else:
-        id_ = sdsqlutils.insert(file,keys_to_insert,commit,conn)
-
-        priority = file.__dict__['priority']
-        data_node = file.__dict__['data_node']
-        hipri = highest_waiting_priority( data_node )
-        if hipri is None or priority>hipri:
-            # Compute cached max(priority) for the data node, ignoring any previous value.
-            highest_waiting_priority( data_node, True )
-
-        return id_
+def add_files(files,commit=True,conn=sddb.conn):
+    """Insert many files at once (executemany)."""
+    sdsqlutils.insert_many(files,keys_to_insert,commit,conn)
 
 def delete_file(tr,commit=True,conn=sddb.conn):
     c = conn.cursor()
@@ -111,125 +99,112 @@ def get_file(file_functional_id,conn=sddb.conn):
 
     return t
 
+def get_files_status(file_functional_ids,conn=sddb.conn):
+    """Retrieve status and priority of many files at once.
+
+    Returns
+        dict (file_functional_id => (status,priority)) (files not found are not included)
+    """
+    files={}
+
+    file_functional_ids=list(set(file_functional_ids))
+
+    c = conn.cursor()
+
+    for rs in sdsqlutils.select_in(c,"select file_functional_id,status,priority from file where file_functional_id in (%s)",file_functional_ids):
+        files[rs[0]]=(rs[1],rs[2])
+
+    c.close()
+
+    return files
+
 def get_files(limit=None,conn=sddb.conn,**search_constraints): # don't change arguments order here
     """
     Notes
       - one search constraint must be given at least
       - if 'limit' is None, retrieve all records matching the search constraints
     """
-    gfs0 = SDTimer.get_time()
-
-    data_node = search_constraints.get('data_node',None)
-
-    # Is the cache applicable to this situation?  Then use it, unless it's empty.
-    if set(search_constraints.keys())==set(['status','data_node']) and\
-       search_constraints['status']==sdconst.TRANSFER_STATUS_WAITING and\
-       limit==1 and\
-       sdconst.GET_FILES_CACHING:
-        # ...limit==1 isn't essential, but the present coding is for limit==1
-        use_cache = True
-        if len( get_files.files.get( data_node, [] ) )>0:
-            gfs1 = SDTimer.get_elapsed_time( gfs0, show_microseconds=True )
-            sdlog.info("SDFILDAO-200","get_files time is %s, used cache, data_node %s"%\
-                       (gfs1,data_node))
-            return [ get_files.files[data_node].pop(0) ]
-        else:
-            cachelen = 100
-            limit += cachelen
-    else:
-        use_cache = False
-
     files=[]
     c = conn.cursor()
 
     search_placeholder=sdsqlutils.build_search_placeholder(search_constraints)
     limit_clause="limit %i"%limit if limit is not None else ""
 
-    getfirst = priority_clause( data_node, use_cache, c )
-    if getfirst=='':
-        return []
-    q="select * from file where %s %s %s"%(search_placeholder,getfirst,limit_clause)
+    q="select * from file where %s ORDER BY priority DESC, checksum %s"%(search_placeholder,limit_clause)
     c.execute(q,search_constraints)
     rs=c.fetchone()
 
-    #if use_cache and (rs is None or len(rs)==0):
-    if use_cache and (rs is None or len(rs)==0):
-        # No files found.  Possibly we could find one if we retry at another priority level.
-        # Note that it makes no sense to do this if getfirst==''.  That has alread triggered
-        # an early return.
-        highest_waiting_priority( data_node, c )   # compute the priority to retry at
-        getfirst = priority_clause( data_node, use_cache, c )
-        q="select * from file where %s %s %s"%(search_placeholder,getfirst,limit_clause)
-        c.execute(q,search_constraints)
-        rs = c.fetchone()
-
     while rs!=None:
         files.append(sdsqlutils.get_object_from_resultset(rs,File))
         rs=c.fetchone()
     c.close()
 
-    if len(files)>1 and use_cache:
-        # We shall return one of the files and cache the rest.
-        get_files.files[ data_node ] = files[1:]
-        files = files[0:1]
-
-    gfs1 = SDTimer.get_elapsed_time( gfs0, show_microseconds=True )
-    sdlog.info("SDFILDAO-200","get_files time is %s, search %s with %s"%(gfs1,q,search_constraints))
     return files
-get_files.files = {}
-
-def priority_clause( data_node, use_cache, cursor ):
-    if use_cache:
-        pri = highest_waiting_priority(data_node)
-        if pri is None:
-            getfirst = ''
-        else:
-            getfirst = "AND priority=%s" % pri
+
+def get_files_by_id(file_ids,status=None,conn=sddb.conn):
+    """Retrieve many files at once.
+
+    Args
+        status: if set, only files with this status are returned
+
+    Returns
+        dict (file_id => File)
+    """
+    files={}
+
+    file_ids=list(set(file_ids))
+
+    c = conn.cursor()
+
+    if status is None:
+        rows=sdsqlutils.select_in(c,"select * from file where file_id in (%s)",file_ids)
     else:
-        getfirst = "ORDER BY priority DESC, checksum"
-    return getfirst
-
-def highest_waiting_priority( data_node, cursor=None, connection=sddb.conn ):
-    """This function contains a dictionary-like cache of the highest priority among status='waiting'
-    files for each data_node.  It will always return the dictionary value for the specified
-    data node, or one of the specified data nodes if several are provided.
-    - When called with a data_node and cursor, it will update its value for that data_node.
-    - If cursor==True, then this function will create and close its own cursor.
-    - If data_node==True, then this function will be applied to all data nodes.
+        rows=sdsqlutils.select_in(c,"select * from file where file_id in (%s) and status=?",file_ids,[status])
+
+    for rs in rows:
+        f=sdsqlutils.get_object_from_resultset(rs,File)
+        files[f.file_id]=f
+
+    c.close()
+
+    return files
+
+def get_waiting_files_index(min_file_id=None,conn=sddb.conn):
+    """Retrieve the minimal set of columns needed to index 'waiting' files.
+
+    Args
+        min_file_id: if set, only files with a greater file_id are returned (i.e. files inserted since the last call)
+
+    Returns
+        list of (file_id,data_node,priority,checksum) tuples
     """
-    if cursor is None:
-        return (highest_waiting_priority.vals).get(data_node,None)
+    c = conn.cursor()
+
+    if min_file_id is None:
+        c.execute("select file_id,data_node,priority,checksum from file where status=?",(sdconst.TRANSFER_STATUS_WAITING,))
     else:
-        if cursor==True:
-            c = connection.cursor()
-        else:
-            c = cursor
-        if data_node==True:
-            q = "SELECT data_node FROM file GROUP BY data_node"
-            c.execute(q)
-            data_nodes = [tup[0] for tup in c.fetchall()]
-        else:
-            data_nodes = [data_node]
-        for dn in data_nodes:
-            hwp0 = SDTimer.get_time()
-            q = "SELECT MAX(priority) FROM file WHERE status='waiting' AND data_node='%s'" % dn
-            c.execute(q)
-            val = c.fetchone()
-            if len(val)>0:
-                highest_waiting_priority.vals[dn] = val[0]
-            else:
-                highest_waiting_priority.vals.pop(dn,None)
-            hwp1 = SDTimer.get_elapsed_time( hwp0, show_microseconds=True )
-            #sdlog.info("SDFILDAO-300","time %s to recompute priority=%s for %s" %
-            #           (hwp1,val[0],dn) )
-            #sdlog.info("SDFILDAO-301","  query %s" % q )
-        if cursor==True:
-            c.close()
-        return (highest_waiting_priority.vals).get(data_nodes[0],None)
-# The cache is a database masquerading as a dictionary.  A real dictionary in memory would be:
-# highest_waiting_priority.vals = {}
-highest_waiting_priority.vals=sdsqlitedict.SqliteStringDict(
-    sdconfig.default_db_folder+"/caches.db", 'maxpri', None )
+        c.execute("select file_id,data_node,priority,checksum from file where +status=? and file_id>?",(sdconst.TRANSFER_STATUS_WAITING,min_file_id)) # '+' prevents using the 'status' index (only new rows are read, using the primary key)
+
+    li=[tuple(rs) for rs in c.fetchall()]
+
+    c.close()
+
+    return li
+
+def get_max_file_id(conn=sddb.conn):
+    c = conn.cursor()
+    c.execute("select max(file_id) from file")
+    rs=c.fetchone()
+    c.close()
+    return rs[0] if rs[0] is not None else 0
+
+def get_file_id_generation(conn=sddb.conn):
+    """Returns a value which changes each time file_id of deleted files may be reused (see 'sddbobj.create_triggers')."""
+    c = conn.cursor()
+    c.execute("select generation from file_id_generation")
+    rs=c.fetchone()
+    c.close()
+    return rs[0]
 
 def get_dataset_files(d,conn=sddb.conn,limit=None):
     """
@@ -257,6 +232,15 @@ def get_dataset_files(d,conn=sddb.conn,limit=None):
 
     return files
 
+def update_files(files,commit=True,conn=sddb.conn):
+    """Update many files in one transaction."""
+
+    for f in files:
+        update_file(f,commit=False,conn=conn)
+
+    if commit:
+        conn.commit()
+
 def update_file(file,commit=True,conn=sddb.conn):
     keys=['status','error_msg','sdget_status','sdget_error_msg','start_date','end_date','duration','rate','priority']
 
@@ -273,3 +257,7 @@ def update_file(file,commit=True,conn=sddb.conn):
     elif rowcount>1:
         raise SDException("SYNCDDAO-120","duplicate functional primary key (file_id=%i)"%(i__tr.file_id,))
 
+# init.
+
+keys_to_insert=['status', 'crea_date', 'url', 'local_path', 'filename', 'file_functional_id', 'tracking_id', 'priority', 'checksum', 'checksum_type', 'size', 'variable', 'project', 'model', 'data_node', 'dataset_id', 'insertion_group_id', 'timestamp']
+# for future:, 'searchapi_host']
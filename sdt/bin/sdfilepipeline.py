@@ -41,6 +41,16 @@ from sdexception import SDException
 
 def run(**kw):
     files=kw.get('files')
+    files=run_stateless(files)
+    files=run_stateful(files)
+    return files
+
+def run_stateless(files):
+    """Run stages which only depend on the input files (no database access).
+
+    Note
+        Those stages can be run in a worker process (see 'sdpipelineprocessing.ParallelProcessingObject').
+    """
     check_type(files)
     check_fields(files)
     files=sdreducerow.run(files)
@@ -78,6 +88,10 @@ def run(**kw):
     #
     # TODO
 
+    return files
+
+def run_stateful(files):
+    """Run stages which use the database (must be run in the synda process)."""
 
     files=sdcomplete.run(files)
 
@@ -42,18 +42,18 @@ def transfer_status_count(status=None,conn=sddb.conn):
     c.close()
     return count
 
+def transfer_waiting_datanodes( conn=sddb.conn ):
+    """Returns the list of data nodes having at least one 'waiting' transfer."""
+    c = conn.cursor()
+    q = "SELECT data_node FROM file WHERE status='waiting' GROUP BY data_node"
+    c.execute(q)
+    dns = [r[0] for r in c.fetchall()]
+    c.close()
+    return dns
+
 def transfer_running_count_by_datanode( conn=sddb.conn ):
+    rcs = {r:0 for r in transfer_waiting_datanodes(conn)}
     c = conn.cursor()
-    if sdconst.GET_FILES_CACHING:
-        # Get a list of 'waiting' data nodes from the highest-priority cache
-        dns = [dn for dn in sdfiledao.highest_waiting_priority.vals.keys() if
-               sdfiledao.highest_waiting_priority.vals[dn] is not None]
-        rcs = {r:0 for r in dns}
-    else:
-        # Get a list of 'waiting' data nodes from the database
-        q = "SELECT data_node FROM file WHERE status='waiting' GROUP BY data_node"
-        c.execute(q)
-        rcs = {r[0]:0 for r in c.fetchall()}
     q = "SELECT data_node,COUNT(data_node) FROM file WHERE status='running' GROUP BY data_node"
     c.execute(q)
     rcs.update( {r[0]:r[1] for r in c.fetchall()} )
@@ -63,7 +63,7 @@ def transfer_running_count_by_datanode( conn=sddb.conn ):
 def get_download_status(project=None):
     li=[]
 
-    c = sddb.conn.cursor()
+    c = sddb.get_ro_conn().cursor()
 
     if project is None:
         q="select status,count(*),sum(size) from file group by status"
@@ -87,12 +87,16 @@ def get_download_status(project=None):
     return li
 
 def count_dataset_files(d,file_status,conn=sddb.conn):
+    """
+    Note
+        counters are used instead of a 'count' on the 'file' table (see 'dataset_status_count' table in 'sddbobj')
+    """
     c = conn.cursor()
 
     if file_status is None:
-        c.execute("select count(1) from file where dataset_id=?",(d.dataset_id,))
+        c.execute("select ifnull(sum(count),0) from dataset_status_count where dataset_id=?",(d.dataset_id,))
     else:
-        c.execute("select count(1) from file where dataset_id=? and status=?",(d.dataset_id,file_status,))
+        c.execute("select ifnull(sum(count),0) from dataset_status_count where dataset_id=? and status=?",(d.dataset_id,file_status,))
 
     rs=c.fetchone()
     nbr=rs[0]
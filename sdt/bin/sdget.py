@@ -16,6 +16,13 @@ Notes
         - urllib2 (pure python)
         - wget (external script)
         - gridftp (external script)
+    - When 'checksum_type' is set, the local checksum is computed while the
+      file is being downloaded (urllib2 and wget only). Returned checksum is
+      None when the on the fly computation is not available (i.e. gridftp, or
+      wget in non-buffered mode), so the caller must fallback to
+      sdutils.compute_checksum() in this case.
+    - External script child processes are registered in 'sdwatchdog' while
+      running, so stalled transfers can be detected.
     - This module is mainly used as module, but can also be used as script for basic
       url download test.
 """
@@ -29,11 +36,17 @@ import sdconfig
 import sdutils
 import sdconst
 import sdget_urllib
+import sdwatchdog
 from sdtools import print_stderr
 
-def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,verbosity=0,buffered=True,hpss=False):
+def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,verbosity=0,buffered=True,hpss=False,checksum_type=None):
+    """
+    Returns
+        (status,killed,script_stderr,local_checksum) tuple
+    """
     killed=False
     script_stderr=None
+    local_checksum=None
 
     transfer_protocol=sdutils.get_transfer_protocol(url)
 
@@ -41,15 +54,22 @@ def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,ti
     if transfer_protocol==sdconst.TRANSFER_PROTOCOL_HTTP:
 
         if http_client==sdconst.HTTP_CLIENT_URLLIB:
-            status=sdget_urllib.download_file(url,full_local_path,timeout)
+            (status,local_checksum)=sdget_urllib.download_file(url,full_local_path,timeout,checksum_type)
         elif http_client==sdconst.HTTP_CLIENT_WGET:
 
-            li=prepare_args(url,full_local_path,sdconfig.data_download_script_http,debug,timeout,verbosity,hpss)
+            # on the fly checksum needs stdout to be retrieved
+            if not buffered:
+                checksum_type=None
 
-            (status,script_stderr)=run_download_script(li,buffered)
+            li=prepare_args(url,full_local_path,sdconfig.data_download_script_http,debug,timeout,verbosity,hpss,checksum_type)
+
+            (status,script_stdout,script_stderr)=run_download_script(li,buffered,full_local_path)
 
             killed=is_killed(transfer_protocol,status)
 
+            if status==0 and checksum_type is not None:
+                local_checksum=parse_checksum(script_stdout)
+
         else:
             assert False
 
@@ -61,7 +81,7 @@ def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,ti
 
         li=prepare_args(url,full_local_path,sdconfig.data_download_script_gridftp,debug,timeout,verbosity,hpss)
 
-        (status,script_stderr)=run_download_script(li,buffered)
+        (status,script_stdout,script_stderr)=run_download_script(li,buffered,full_local_path)
 
         killed=is_killed(transfer_protocol,status)
 
@@ -73,29 +93,53 @@ def download(url,full_local_path,debug=False,http_client=sdconfig.http_client,ti
 
         assert False
 
-    return (status,killed,script_stderr)
+    return (status,killed,script_stderr,local_checksum)
+
+def parse_checksum(stdout):
+    """Retrieve the checksum printed by the download script on stdout.
+
+    Returns
+        None if no checksum found
+    """
+
+    lines=stdout.strip().splitlines() if stdout is not None else []
 
-def run_download_script(li,buffered):
-    if buffered:
-        return run_download_script_BUFSTDXXX(li)
+    if len(lines)>0 and len(lines[-1])>0:
+        return lines[-1].strip()
     else:
-        return run_download_script_RTSTDXXX(li)
+        return None
 
-def run_download_script_RTSTDXXX(li):
+def run_download_script(li,buffered,full_local_path):
+    pids=[]
+
+    def started(p):
+        pids.append(p.pid)
+        sdwatchdog.register(p.pid,full_local_path,lambda: sdwatchdog.kill(p.pid))
+
+    try:
+        if buffered:
+            return run_download_script_BUFSTDXXX(li,started)
+        else:
+            return run_download_script_RTSTDXXX(li,started)
+    finally:
+        for pid in pids:
+            sdwatchdog.unregister(pid)
+
+def run_download_script_RTSTDXXX(li,started):
 
     # start a new process (fork is blocking here, so thread will wait until child is done)
-    status=sdutils.get_status(li,shell=False)
+    status=sdutils.get_status(li,shell=False,started=started)
 
-    return (status,None)
+    return (status,None,None)
 
-def run_download_script_BUFSTDXXX(li):
+def run_download_script_BUFSTDXXX(li,started):
 
     # start a new process (fork is blocking here, so thread will wait until child is done)
     #
     # note
     #  in the child shell script, stderr for error message
     #
-    (status,stdout,stderr)=sdutils.get_status_output(li,shell=False)
+    (status,stdout,stderr)=sdutils.get_status_output(li,shell=False,started=started)
 
 
     # download scripts may
@@ -151,7 +195,7 @@ def run_download_script_BUFSTDXXX(li):
         fh.write("END '%s' script output\n"%os.path.basename(script))
     """
 
-    return (status,stderr)
+    return (status,stdout,stderr)
 
 def is_killed(transfer_protocol,status):
     """This func return True if child process has been killed."""
@@ -186,10 +230,14 @@ def build_verbosity_option(verbosity):
     else:
         return None
 
-def prepare_args(url,full_local_path,script,debug,timeout,verbosity,hpss):
+def prepare_args(url,full_local_path,script,debug,timeout,verbosity,hpss,checksum_type=None):
 
     li=[script,'-l',sdconfig.log_folder,'-T',sdconfig.tmp_folder,'-t',str(timeout),'-c',sdconfig.get_security_dir(),url,full_local_path]
 
+    if checksum_type is not None:
+        li.insert(1,'-k')
+        li.insert(2,checksum_type)
+
     if debug:
         li.insert(1,'-d')
 
@@ -222,7 +270,7 @@ if __name__ == '__main__':
         if os.path.isfile(local_path):
             os.remove(local_path)
 
-        (status,killed,script_stderr)=download(url,local_path,debug=True)
+        (status,killed,script_stderr,local_checksum)=download(url,local_path,debug=True)
 
         if status!=0:
             if not args.quiet:
@@ -29,6 +29,10 @@
 #              - 3 - debug info displayed and progress bar
 #              - 4 - debug info displayed and progress bar and bash '-x' mode enabled in this script
 #  - the code returned by sdget.sh script may vary depending on which mode is used.
+#  - when '-k' option is set, the local file checksum is computed while the file
+#    is being downloaded (i.e. no need to re-read the whole file afterward).
+#    In this case, the checksum is printed on stdout (one line terminated by EOL)
+#    when the transfer succeeds.
 #
 # Return values
 #  0 => success
@@ -60,11 +64,12 @@ usage ()
 {
     echo ""
     echo "Usage"
-    echo "  $0 [ -v | -a ] [ -h ] [ -p parse_output ] [ -s ] [ -t timeout ] <src> <dest>"
+    echo "  $0 [ -v | -a ] [ -h ] [ -k checksum_type ] [ -p parse_output ] [ -s ] [ -t timeout ] <src> <dest>"
     echo ""
     echo "Options:"
     echo "  -a      always log wget output"
     echo "  -h      help - display help message"
+    echo "  -k      checksum type - compute checksum on the fly (md5 | sha256)"
     echo "  -p      parse_output"
     echo "  -s      show progress - show wget progress"
     echo "  -t      timeout - wget timeout"
@@ -124,6 +129,14 @@ log_wget_output ()
 cleanup ()
 {
     rm -f "$local_file"
+    cleanup_checksum
+}
+
+cleanup_checksum ()
+{
+    if [ -n "$checksum_fifo" ]; then
+        rm -f "$checksum_fifo" "$checksum_file"
+    fi
 }
 
 abort ()
@@ -185,7 +198,10 @@ wget_timeout=360
 certdirprefix=
 tmpdir=/tmp
 logdir=/tmp
-while getopts 'ac:dhl:p:st:T:v' OPTION
+checksum_type=
+checksum_fifo=
+checksum_file=
+while getopts 'ac:dhk:l:p:st:T:v' OPTION
 do
   case $OPTION in
   a)    always_log_wget_output=1
@@ -197,6 +213,8 @@ do
   h)    usage
         exit 0
         ;;
+  k)    checksum_type=$OPTARG
+        ;;
   l)    logdir=$OPTARG
         ;;
   p)    parse_output=$OPTARG
@@ -234,6 +252,18 @@ if [ -z "$url" ]; then
     exit 3
 fi
 
+if [ -n "$checksum_type" ]; then
+    case $checksum_type in
+    md5)    checksum_cmd=md5sum
+            ;;
+    sha256) checksum_cmd=sha256sum
+            ;;
+    *)      err "Incorrect checksum type ($checksum_type)"
+            exit 3
+            ;;
+    esac
+fi
+
 
 # init
 
@@ -253,8 +283,18 @@ debug_file=$logdir/debug.log
 
 # wget configuration
 
+# when checksum is computed on the fly, wget writes into a FIFO which is
+# consumed by 'tee' (which writes the local file) and by the checksum command
+if [ -n "$checksum_type" ]; then
+    checksum_fifo="$tmpdir/sdget_checksum_$$.fifo"
+    checksum_file="$tmpdir/sdget_checksum_$$.txt"
+    wget_output_file=$checksum_fifo
+else
+    wget_output_file=$local_file
+fi
+
 WGETOPT="-D $local_file" # hack: (this is to help CFrozenDownloadCheckerThread class to do its work (this class need to know the local file associated with the process, but because of the FIFO, this dest file do not show in "ps fax" output, so we put the dest file in unused " -D domain-list" option (this option is used only in recursive mode, which we do not use))
-WGETOPT="$WGETOPT -O $local_file --timeout=$wget_timeout"
+WGETOPT="$WGETOPT -O $wget_output_file --timeout=$wget_timeout"
 
 if [ $parse_output -eq 1 ]; then
 
@@ -387,6 +427,25 @@ strip_dot_progress ()
 # set group writable
 umask u=rw,g=rw,o=r
 
+# start on the fly checksum computation
+#
+# notes
+#     - FIFO is opened read-write on fd 3 by this script, so that the reader
+#       doesn't block forever if wget fails before opening its output file.
+#       EOF is sent to the reader when fd 3 is closed (i.e. once wget is done).
+#     - fd 3 must be closed in the reader, else it never gets EOF.
+#
+if [ -n "$checksum_type" ]; then
+    rm -f "$checksum_fifo" "$checksum_file"
+    if ! mkfifo "$checksum_fifo"; then
+        err "FIFO creation error ($checksum_fifo)"
+        exit 4
+    fi
+    exec 3<>"$checksum_fifo"
+    { tee "$local_file" < "$checksum_fifo" | $checksum_cmd | cut -d ' ' -f 1 > "$checksum_file"; } 3>&- &
+    checksum_pid=$!
+fi
+
 # start wget
 
 wget_error_status_from_parsing=0
@@ -451,6 +510,17 @@ fi
 
 
 
+# wait for on the fly checksum computation to complete
+
+local_checksum=
+if [ -n "$checksum_type" ]; then
+    exec 3>&-
+    wait $checksum_pid
+    local_checksum=$(cat "$checksum_file")
+    cleanup_checksum
+fi
+
+
 # parse wget output
 
 if [ $parse_output -eq 1 ]; then
@@ -504,5 +574,9 @@ else
 
     #log "DEB020" "Transfer done - $*"
 
+    if [ -n "$checksum_type" ]; then
+        echo "$local_checksum" # stdout
+    fi
+
     exit 0
 fi
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains file transfer functions for HTTP protocol (httplib impl. with persistent connections).
+
+Notes
+    - Unlike 'sdget.sh' (wget), no process is forked for each transfer, and
+      keep-alive connections are kept open and reused for each data node
+      (i.e. no TLS handshake and no certificate loading for each file).
+    - Return codes are the same as 'sdget.sh' script return codes (only a
+      subset of them is used).
+    - This module can also be used as script to benchmark this implementation
+      against the wget implementation.
+"""
+
+import os
+import sys
+import time
+import json
+import socket
+import argparse
+import threading
+import urlparse
+import urllib2
+import cookielib
+import httplib
+import ssl
+import sdapp
+import sdconst
+import sdconfig
+import sdlog
+from sdget_urllib import ChecksumFile
+
+class ResponseInfo():
+    """Adapter used to give cookielib access to httplib response headers."""
+
+    def __init__(self,response):
+        self.response=response
+
+    def info(self):
+        return self.response.msg
+
+class ConnectionPool():
+    """Keep-alive connections pool for one data node (i.e. one (scheme,host,port) tuple)."""
+
+    def __init__(self,scheme,host,port,max_idle):
+        self.scheme=scheme
+        self.host=host
+        self.port=port
+        self.max_idle=max_idle
+        self.idle=[]
+        self.lock=threading.Lock()
+
+    def get(self,timeout,reuse=True):
+        """
+        Args:
+            reuse: if false, a new connection is always opened
+
+        Returns
+            (conn,reused) tuple
+        """
+
+        with self.lock:
+            if reuse and len(self.idle)>0:
+                conn=self.idle.pop()
+                conn.timeout=timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return (conn,True)
+
+        if self.scheme=='https':
+            conn=httplib.HTTPSConnection(self.host,self.port,timeout=timeout,context=get_ssl_context())
+        else:
+            conn=httplib.HTTPConnection(self.host,self.port,timeout=timeout)
+
+        return (conn,False)
+
+    def put(self,conn,response):
+        """Give back the connection to the pool once the response has been fully read."""
+
+        if response.will_close:
+            conn.close()
+            return
+
+        with self.lock:
+            if len(self.idle)<self.max_idle:
+                self.idle.append(conn)
+                return
+
+        conn.close()
+
+    def clear(self):
+        with self.lock:
+            for conn in self.idle:
+                conn.close()
+            self.idle=[]
+
+class Cancellation():
+    """Allow another thread (e.g. 'sdwatchdog') to abort a running download."""
+
+    def __init__(self):
+        self.cancelled=False
+        self.conn=None # set once the connection is open
+
+    def cancel(self):
+        self.cancelled=True
+
+        # unblock the read if any
+        conn=self.conn
+        if conn is not None and conn.sock is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def check(self):
+        if self.cancelled:
+            raise HTTPDownloadError(29,"Transfer cancelled (stalled)")
+
+class HTTPDownloadError(Exception):
+    def __init__(self,status,msg):
+        self.status=status
+        self.msg=msg
+    def __str__(self):
+        return "status=%s,message=%s"%(self.status,self.msg)
+
+def get_ssl_context():
+    """Return the SSL context shared by all connections.
+
+    Notes
+        - the context is rebuilt (and idle connections are dropped) when the
+          ESGF credential file changes (i.e. after a certificate renewal).
+        - as with wget (see '--no-check-certificate' in 'sdget.sh'), server
+          certificate is not checked.
+    """
+    global ssl_context, ssl_context_mtime
+
+    mtime=os.path.getmtime(sdconfig.esgf_x509_proxy) if os.path.isfile(sdconfig.esgf_x509_proxy) else None
+
+    with pools_lock:
+        if ssl_context is None or mtime!=ssl_context_mtime:
+            context=ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            context.check_hostname=False
+            context.verify_mode=ssl.CERT_NONE
+            if mtime is not None:
+                context.load_cert_chain(sdconfig.esgf_x509_proxy,sdconfig.esgf_x509_proxy)
+
+            if ssl_context is not None:
+                sdlog.info("SDGETHTL-001","ESGF credential has changed: SSL context reloaded")
+                for pool in pools.values():
+                    pool.clear()
+
+            ssl_context=context
+            ssl_context_mtime=mtime
+
+        return ssl_context
+
+def get_pool(scheme,host,port):
+    key=(scheme,host,port)
+
+    with pools_lock:
+        if key not in pools:
+            pools[key]=ConnectionPool(scheme,host,port,max_idle_connections_per_host)
+
+        return pools[key]
+
+def open_url(url,timeout):
+    """Send the request (following redirects and handling cookies).
+
+    Returns
+        (pool,conn,response) tuple
+    """
+    redirect_count=0
+
+    while True:
+        u=urlparse.urlparse(url)
+        port=u.port if u.port is not None else (443 if u.scheme=='https' else 80)
+        path=u.path if u.query=='' else '%s?%s'%(u.path,u.query)
+
+        request=urllib2.Request(url)
+        cookiejar.add_cookie_header(request)
+        headers={'Host':u.netloc,'Connection':'keep-alive','User-Agent':user_agent}
+        headers.update(request.unredirected_hdrs)
+
+        pool=get_pool(u.scheme,u.hostname,port)
+
+        (conn,reused)=pool.get(timeout)
+        try:
+            conn.request('GET',path,headers=headers)
+            response=conn.getresponse()
+        except (httplib.HTTPException,socket.error),e:
+            conn.close()
+
+            if not reused:
+                raise
+
+            # the keep-alive connection has been closed by the server in the
+            # meantime, so we retry with a new one (other idle connections to
+            # this host are likely closed too, so we drop them)
+            pool.clear()
+            (conn,reused)=pool.get(timeout,reuse=False)
+            try:
+                conn.request('GET',path,headers=headers)
+                response=conn.getresponse()
+            except:
+                conn.close()
+                raise
+
+        cookiejar.extract_cookies(ResponseInfo(response),request)
+
+        if response.status in (301,302,303,307,308):
+            location=response.getheader('location')
+            response.read()
+            pool.put(conn,response)
+
+            if location is None:
+                raise HTTPDownloadError(23,"Redirect without location (url=%s)"%url)
+
+            redirect_count+=1
+            if redirect_count>max_redirect:
+                raise HTTPDownloadError(23,"Too many redirects (url=%s)"%url)
+
+            url=urlparse.urljoin(url,location)
+        elif response.status==200:
+            return (pool,conn,response)
+        else:
+            response.read()
+            pool.put(conn,response)
+
+            if response.status==403:
+                if redirect_count>0:
+                    raise HTTPDownloadError(20,"403 Forbidden (you need to subscribe to the required role/group to access the data (e.g. cmip5_research))")
+                else:
+                    raise HTTPDownloadError(22,"403 Forbidden (before redirect)")
+            else:
+                raise HTTPDownloadError(1,"HTTP error %i %s"%(response.status,response.reason))
+
+def download_file(url,local_path,timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,checksum_type=None,cancellation=None):
+    """
+    Args:
+        cancellation: Cancellation object (used to abort the download from another thread)
+
+    Returns
+        (status,error_msg,local_checksum) tuple
+    """
+
+    if os.path.exists(local_path):
+        return (2,"Local file already exists (%s)"%local_path,None)
+
+    # create folder if missing
+    destdir=os.path.dirname(local_path)
+    try:
+        if not os.path.exists(destdir):
+            os.makedirs(destdir)
+
+        f=open(local_path,'wb',write_buffer_size)
+    except (IOError,OSError),e:
+        return (30,"Local file creation error (%s)"%local_path,None)
+
+    try:
+        try:
+            fp=ChecksumFile(f,checksum_type) if checksum_type is not None else f
+
+            (pool,conn,response)=open_url(url,timeout)
+
+            if cancellation is not None:
+                cancellation.conn=conn
+
+            total_size=response.getheader('content-length')
+            bytes_so_far=0
+
+            try:
+                while True:
+                    if cancellation is not None:
+                        cancellation.check()
+
+                    data=response.read(read_chunksize)
+
+                    if not data:
+                        break
+
+                    fp.write(data)
+                    bytes_so_far+=len(data)
+            except:
+                conn.close()
+                raise
+
+            if cancellation is not None:
+                cancellation.check() # read may have been interrupted by the cancellation
+
+            if total_size is not None and bytes_so_far!=int(total_size):
+                conn.close()
+                raise HTTPDownloadError(1,"Incomplete read (expected=%s,received=%i)"%(total_size,bytes_so_far))
+
+            pool.put(conn,response)
+
+            local_checksum=fp.hexdigest() if checksum_type is not None else None
+
+        finally:
+            f.close()
+
+        return (0,'',local_checksum)
+
+    except HTTPDownloadError,e:
+        status,error_msg=e.status,e.msg
+    except socket.timeout,e:
+        status,error_msg=21,"Read error (Connection timed out)"
+    except (httplib.HTTPException,socket.error,ssl.SSLError),e:
+        status,error_msg=1,"Network error (%s)"%str(e)
+    except (IOError,OSError),e: # must be after socket.error, which is a subclass of IOError
+        status,error_msg=30,"Local file write error (%s)"%str(e)
+
+    # remove the local file if something goes wrong
+    if os.path.exists(local_path):
+        os.unlink(local_path)
+
+    return (status,"Transfer failed with error %i (%s)"%(status,error_msg),None)
+
+def benchmark(files,engine,parallel,dest_folder):
+    """Download files with the given engine and print the throughput."""
+    import Queue
+    import sdget
+
+    queue=Queue.Queue()
+    for i,f in enumerate(files):
+        queue.put((i,f['url']))
+
+    failures=[]
+
+    def worker():
+        while True:
+            try:
+                (i,url)=queue.get_nowait()
+            except Queue.Empty:
+                return
+
+            local_path=os.path.join(dest_folder,engine,'%i_%s'%(i,os.path.basename(url)))
+
+            if engine=='native':
+                (status,error_msg,local_checksum)=download_file(url,local_path)
+            else:
+                (status,killed,error_msg,local_checksum)=sdget.download(url,local_path,http_client=sdconst.HTTP_CLIENT_WGET,buffered=True)
+
+            if status!=0:
+                failures.append((url,status,error_msg))
+
+    start=time.time()
+    threads=[threading.Thread(target=worker) for i in range(parallel)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed=time.time()-start
+
+    print "%s: %i file(s) in %.2f sec (%.2f file/s, %i failure(s))"%(engine,len(files),elapsed,len(files)/elapsed,len(failures))
+    for (url,status,error_msg) in failures:
+        print "  %s (%s)"%(url,error_msg)
+
+# init.
+
+max_redirect=10
+read_chunksize=1024*1024
+write_buffer_size=4*1024*1024
+user_agent='synda/%s'%sdconst.SYNDA_VERSION
+max_idle_connections_per_host=sdconfig.config.getint('download','max_parallel_download_per_datanode')
+
+pools={}
+pools_lock=threading.RLock()
+cookiejar=cookielib.CookieJar()
+ssl_context=None
+ssl_context_mtime=None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark native HTTP download engine against the wget one (files list is read from stdin, in JSON format).')
+    parser.add_argument('-d','--dest_folder',default=os.path.join(sdconfig.tmp_folder,'sdget_httplib_benchmark'))
+    parser.add_argument('-e','--engine',choices=['native','wget','both'],default='both')
+    parser.add_argument('-p','--parallel',type=int,default=8)
+    args = parser.parse_args()
+
+    files=json.load( sys.stdin )
+
+    engines=['native','wget'] if args.engine=='both' else [args.engine]
+    for engine in engines:
+        benchmark(files,engine,args.parallel,args.dest_folder)
+
+    sys.exit(0)
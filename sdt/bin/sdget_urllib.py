@@ -22,20 +22,43 @@ import sdapp
 import sdconst
 import sdconfig
 import sdtrace
+import sdutils
 from sdnetutils import HTTPSClientAuthHandler
 from sdprogress import SDProgressDot
 from sdexception import SDException
 
-def download_file(url,local_path,timeout=sdconst.DIRECT_DOWNLOAD_HTTP_TIMEOUT):
+class ChecksumFile():
+    """File-like object which computes the checksum of the data while writing it.
+
+    Note
+        This is used to prevent re-reading the whole file once downloaded.
+    """
+
+    def __init__(self,f,checksum_type):
+        self.f=f
+        self.d=sdutils.get_checksum_object(checksum_type)
+
+    def write(self,data):
+        self.d.update(data)
+        self.f.write(data)
+
+    def hexdigest(self):
+        return self.d.hexdigest()
+
+def download_file(url,local_path,timeout=sdconst.DIRECT_DOWNLOAD_HTTP_TIMEOUT,checksum_type=None):
+    """
+    Returns
+        (status,local_checksum) tuple (local_checksum is None if checksum_type is None)
+    """
 
     # create folder if missing
     destdir=os.path.dirname(local_path)
     if not os.path.exists(destdir):
         os.makedirs(destdir)
 
-    status=download_file_helper(url,local_path,timeout)
+    (status,local_checksum)=download_file_helper(url,local_path,timeout,checksum_type)
 
-    return status
+    return (status,local_checksum)
 
 def socket2disk_basic(socket,f):
 
@@ -176,7 +199,7 @@ def socket2disk_percent(socket,f):
 
         print ''
 
-def download_file_helper(url,local_path,timeout):
+def download_file_helper(url,local_path,timeout,checksum_type):
     f=None
     socket=None
     opener=None
@@ -193,6 +216,9 @@ def download_file_helper(url,local_path,timeout):
 
         f=open(local_path, 'wb') # TODO: rename f to fp
 
+        # compute checksum on the fly if asked
+        fp=ChecksumFile(f,checksum_type) if checksum_type is not None else f
+
 
         # open socket
 
@@ -204,10 +230,12 @@ def download_file_helper(url,local_path,timeout):
         #socket2disk_basic(socket,f)
         #socket2disk_largefile(socket,f)
         #socket2disk_progressbar(socket,f)
-        socket2disk_progressbar_and_rate(socket,f)
+        socket2disk_progressbar_and_rate(socket,fp)
         #socket2disk_percent(socket,f)
 
-        return 0
+        local_checksum=fp.hexdigest() if checksum_type is not None else None
+
+        return (0,local_checksum)
 
     except Exception,e:
 
@@ -11,6 +11,7 @@
 
 """This module translate search-api json output to python object."""
 
+import re
 import argparse
 import json
 import sdapp
@@ -89,58 +90,174 @@ def parse_metadata(buffer):
     doc_nodes=body_node["docs"]
 
     for doc_node in doc_nodes: # file/dataset loop
-        l__dict={}
+        l__files.append(parse_doc(doc_node))
 
+    sdlog.debug("SYNDJSON-014","files-count=%d"%len(l__files))
+
+    return {'files':l__files,'num_found':l__num_found,'num_result':len(l__files)}
+
+def parse_doc(doc_node):
+    """Parse one file/dataset node."""
+    l__dict={}
+
+    """
+    SAMPLE
+
+    {
+    "id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601|esgf2.dkrz.de",
+    "data_node":"esgf2.dkrz.de",
+    "instance_id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601",
+    "size":23697992,
+    "type":"Dataset",
+    "variable":["sbl",
+      "snc",
+      "snd",
+      "snm",
+      "snw",
+      "tsn"],
+    "score":1.0
+    },
+    """
+
+    for attr_name,attr_value in doc_node.iteritems():
+
+        # TODO: maybe move transformation below in a downstream
+        #       step (e.g. in the generic pipeline) so to keep
+        #       original xml stream not altered when using dump
+        #       action in raw mode.
+
+        if attr_name=="url":
+            # url array have three subitems (GRIDFTP, HTTPServer and openDAP)
+            # url array entry sample => http://bmbf-ipcc-ar5.dkrz.de/thredds/fileServer/cmip5/output1/MPI-M/MPI-ESM-P/historical/mon/atmos/Amon/r1i1p1/v20120315/tasmin/tasmin_Amon_MPI-ESM-P_historical_r1i1p1_185001-200512.nc|application/netcdf|HTTPServer
+
+            for item in attr_value:
+                url=item.split('|')[0] # keep only first field (i.e. keep only the file url)
+                protocol=item.split('|')[-1]
+
+                if protocol.upper()=="HTTPSERVER":
+                    l__dict['url_http']=url
+                elif protocol.upper()=="GRIDFTP":
+                    l__dict['url_gridftp']=url
+                elif protocol.upper()=="GLOBUS":
+                    l__dict['url_globus']=url
+                elif protocol.upper()=="OPENDAP":
+                    l__dict['url_opendap']=url
+        else:
+            l__dict[attr_name]=attr_value
+
+    return l__dict
+
+def parse_metadata_stream(stream):
+    """Parse result while it is being read from 'stream' (e.g. socket).
+
+    Returns
+        (num_found,files) tuple, with files a file/dataset generator
+
+    Notes
+        - only one chunk of the input and one file/dataset are in memory at once.
+        - if the input layout is not the expected one (i.e. 'numFound'
+          before 'docs'), fall back to the non-streaming parser.
+    """
+    reader=DocsReader(stream)
+
+    num_found=reader.read_header()
+    if num_found is None:
+        sdlog.debug("SYNDJSON-020","Unexpected layout: fall back to non-streaming parser")
+
+        result=parse_metadata(reader.read_all())
+        return (result['num_found'],iter(result['files']))
+
+    return (num_found,(parse_doc(doc_node) for doc_node in reader.read_docs()))
+
+class DocsReader():
+    """Incremental reader for the 'response.docs' array of a search-API JSON output."""
+
+    def __init__(self,stream,chunksize=65536):
+        self.stream=stream
+        self.chunksize=chunksize
+        self.buf=''
+        self.pos=0 # parsing position in buf
+        self.decoder=json.JSONDecoder()
+
+    def read_chunk(self):
         """
-        SAMPLE
-
-        {
-        "id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601|esgf2.dkrz.de",
-        "data_node":"esgf2.dkrz.de",
-        "instance_id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601",
-        "size":23697992,
-        "type":"Dataset",
-        "variable":["sbl",
-          "snc",
-          "snd",
-          "snm",
-          "snw",
-          "tsn"],
-        "score":1.0
-        },
+        Returns
+            False if end of stream is reached
         """
+        chunk=self.stream.read(self.chunksize)
+        if not chunk:
+            return False
 
-        for attr_name,attr_value in doc_node.iteritems():
+        self.buf=self.buf[self.pos:]+chunk # drop already parsed data
+        self.pos=0
 
-            # TODO: maybe move transformation below in a downstream
-            #       step (e.g. in the generic pipeline) so to keep
-            #       original xml stream not altered when using dump
-            #       action in raw mode.
+        return True
 
-            if attr_name=="url":
-                # url array have three subitems (GRIDFTP, HTTPServer and openDAP)
-                # url array entry sample => http://bmbf-ipcc-ar5.dkrz.de/thredds/fileServer/cmip5/output1/MPI-M/MPI-ESM-P/historical/mon/atmos/Amon/r1i1p1/v20120315/tasmin/tasmin_Amon_MPI-ESM-P_historical_r1i1p1_185001-200512.nc|application/netcdf|HTTPServer
+    def read_header(self):
+        """Read input until the beginning of the 'docs' array.
 
-                for item in attr_value:
-                    url=item.split('|')[0] # keep only first field (i.e. keep only the file url)
-                    protocol=item.split('|')[-1]
+        Returns
+            'numFound' value, or None if not found before the 'docs' array
+        """
+        while True:
+            response_match=response_regex.search(self.buf)
+            if response_match is not None:
+                docs_match=docs_regex.search(self.buf,response_match.end())
+                if docs_match is not None:
+                    break
 
-                    if protocol.upper()=="HTTPSERVER":
-                        l__dict['url_http']=url
-                    elif protocol.upper()=="GRIDFTP":
-                        l__dict['url_gridftp']=url
-                    elif protocol.upper()=="GLOBUS":
-                        l__dict['url_globus']=url
-                    elif protocol.upper()=="OPENDAP":
-                        l__dict['url_opendap']=url
-            else:
-                l__dict[attr_name]=attr_value
+            if not self.read_chunk():
+                return None
 
-        l__files.append(l__dict)
+        num_found_match=num_found_regex.search(self.buf,response_match.end(),docs_match.start())
+        if num_found_match is None:
+            return None
 
-    sdlog.debug("SYNDJSON-014","files-count=%d"%len(l__files))
+        self.pos=docs_match.end()
 
-    return {'files':l__files,'num_found':l__num_found,'num_result':len(l__files)}
+        return int(num_found_match.group(1))
+
+    def read_docs(self):
+        while True:
+            self.pos=separator_regex.match(self.buf,self.pos).end()
+
+            if self.pos>=len(self.buf):
+                if not self.read_chunk():
+                    raise SDException("SYNDJSON-021","Unexpected end of input")
+                continue
+
+            if self.buf[self.pos]==']':
+                break
+
+            try:
+                (doc_node,end)=self.decoder.raw_decode(self.buf,self.pos)
+            except ValueError:
+                # doc not complete yet
+
+                if not self.read_chunk():
+                    raise
+
+                continue
+
+            self.pos=end
+
+            yield doc_node
+
+    def read_all(self):
+        li=[self.buf]
+        while True:
+            chunk=self.stream.read(self.chunksize)
+            if not chunk:
+                break
+            li.append(chunk)
+        return ''.join(li)
+
+# init.
+
+response_regex=re.compile(r'"response"\s*:\s*\{')
+num_found_regex=re.compile(r'"numFound"\s*:\s*(\d+)')
+docs_regex=re.compile(r'"docs"\s*:\s*\[')
+separator_regex=re.compile(r'[\s,]*')
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
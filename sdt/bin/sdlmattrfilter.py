@@ -17,16 +17,16 @@ Note
 
 import sdapp
 import sdconst
-import sdpipelineprocessing
+import sdtypes
 
 def run(metadata,attrs_to_keep):
-    metadata_cpy=metadata.copy() # prevent modify original data
-    po=sdpipelineprocessing.ProcessingObject(attribute_filter,attrs_to_keep)
-    light_metadata=sdpipelineprocessing.run_pipeline(metadata_cpy,po)
-    return light_metadata
+    """Returns a new metadata object containing only the given attributes (original data is not modified).
 
-def attribute_filter(files,kept_attrs):
-    new_files=[]
-    for f in files:
-        new_files.append(dict((k, f[k]) for k in kept_attrs))
-    return new_files
+    Note
+        Use 'Metadata.iter_columns' instead when files only need to be read once
+        (no store is created in this case).
+    """
+    light_metadata=sdtypes.Metadata()
+    for chunk in metadata.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR,attrs_to_keep): # projection is done by the store (full files are not copied)
+        light_metadata.add_files(chunk)
+    return light_metadata
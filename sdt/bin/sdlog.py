@@ -9,12 +9,28 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This module contains code related to logging."""
+"""This module contains code related to logging.
+
+Notes
+    - verbosity level is read from configuration once (see 'reload' to
+      re-read it), and messages below this level are discarded before any
+      formatting
+    - log files are written by a background thread (see 'AsyncFileHandler'),
+      so callers are not blocked by log file I/O
+    - '*_throttled' funcs are to be used for messages emitted in loops (e.g.
+      once per file), so they don't flood the log file
+"""
 
 import sys
 import os
+import time
+import errno
+import fcntl
+import atexit
+import collections
 import logging
 import argparse
+import threading
 import sdapp
 import sdconst
 import sdconfig
@@ -33,6 +49,112 @@ LABELS = {logging.DEBUG: 'debug',
           logging.ERROR: 'error',
           logging.CRITICAL: 'critical'}
 
+class AsyncFileHandler(logging.Handler):
+    """Log handler which hands records over to a background thread, which writes them in the file.
+
+    Notes
+        - records are queued in a deque, which doesn't use any lock (messages
+          are logged from signal handlers, which may interrupt the main thread
+          while it is itself logging)
+        - the thread sleeps in a blocking read on a pipe, and is woken up by
+          writing one byte in it for each record (pipes can be used from signal
+          handlers, unlike 'Queue.Queue' or 'threading.Condition' locks)
+        - queue is bounded (if the thread can't keep up, callers block until
+          it has written all queued records, instead of using unbounded memory)
+        - after a fork (e.g. daemon, worker processes), queue, file handler and
+          thread are re-created in the child on first use (locks held by parent
+          threads at fork time must not be used in the child)
+    """
+
+    def __init__(self,filename,formatter):
+        logging.Handler.__init__(self)
+        self.filename=filename
+        self.file_formatter=formatter
+        self.pid=None
+        self.records=None
+        self.stop=None
+        self.thread=None
+        self.fds=[]
+
+    def start(self):
+        self.close_pipes() # pipes of the previous thread (or inherited from the parent process)
+
+        self.pid=os.getpid()
+        self.records=collections.deque()
+        self.stop=[False] # shared with the thread
+
+        (wakeup_r,self.wakeup_w)=os.pipe() # one byte per record (or stop request)
+        (self.space_r,space_w)=os.pipe()   # one byte each time the thread has written all queued records
+        set_nonblocking(self.wakeup_w)
+        set_nonblocking(space_w)
+        self.fds=[wakeup_r,self.wakeup_w,self.space_r,space_w]
+
+        file_handler=logging.FileHandler(self.filename)
+        file_handler.setFormatter(self.file_formatter)
+
+        self.thread=threading.Thread(target=write_records,args=(self.records,file_handler,self.stop,wakeup_r,space_w))
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def emit(self,record):
+        if self.pid!=os.getpid():
+            self.start()
+
+        while len(self.records)>=queue_maxsize:
+            read(self.space_r) # writer thread can't keep up
+
+        self.records.append(record)
+        wakeup(self.wakeup_w)
+
+    def flush(self):
+        """Write queued records and stop the thread (it is restarted on next record)."""
+        if self.pid==os.getpid():
+            self.stop[0]=True
+            wakeup(self.wakeup_w)
+            self.thread.join(flush_timeout)
+        self.pid=None
+
+    def close_pipes(self):
+        for fd in self.fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.fds=[]
+
+def write_records(records,file_handler,stop,wakeup_r,space_w):
+    while True:
+        read(wakeup_r) # block until records are queued
+
+        while len(records)>0:
+            file_handler.handle(records.popleft())
+
+        wakeup(space_w)
+
+        if stop[0]:
+            break
+
+    file_handler.close()
+
+def read(fd):
+    try:
+        os.read(fd,4096)
+    except OSError,e:
+        if e.errno!=errno.EINTR:
+            raise
+        # interrupted by a signal (caller checks again if it must wait)
+
+def wakeup(fd):
+    try:
+        os.write(fd,'x')
+    except OSError,e:
+        if e.errno!=errno.EAGAIN:
+            raise
+        # pipe is full, so the reader will wake up anyway
+
+def set_nonblocking(fd):
+    fcntl.fcntl(fd,fcntl.F_SETFL,fcntl.fcntl(fd,fcntl.F_GETFL)|os.O_NONBLOCK)
+
 def debug(code,message,stdout=False,stderr=False,logfile=True,logger_name=None):
     log(code,message,logging.DEBUG,stdout,stderr,logfile,logger_name)
 def info(code,message,stdout=False,stderr=False,logfile=True,logger_name=None):
@@ -44,26 +166,52 @@ def error(code,message,stdout=False,stderr=False,logfile=True,logger_name=None):
 def critical(code,message,stdout=False,stderr=False,logfile=True,logger_name=None):
     log(code,message,logging.CRITICAL,stdout,stderr,logfile,logger_name)
 
+def debug_throttled(code,message,interval=1.0):
+    log_throttled(code,message,logging.DEBUG,interval)
+def info_throttled(code,message,interval=1.0):
+    log_throttled(code,message,logging.INFO,interval)
+
+def log_throttled(code,message,level,interval=1.0):
+    """Same as 'log', but only log one message for this code every 'interval' seconds.
+
+    Note
+        The number of discarded messages is appended to the next logged message.
+    """
+    if level<verbosity_level:
+        return
+
+    now=time.time()
+    (last,discarded)=throttling.get(code,(0,0))
+
+    if now-last<interval:
+        throttling[code]=(last,discarded+1)
+        return
+
+    if discarded>0:
+        message='%s (%d similar message(s) discarded)'%(message,discarded)
+
+    throttling[code]=(now,0)
+
+    log(code,message,level)
+
 def log(code,message,level,stdout=False,stderr=False,logfile=True,logger_name=None):
     # check code length
     if len(code)!=12:
         raise SDException("SYNDALOG-002","%s have an incorrect length"%code)
 
-    # retrieve modulecode part of code
-    modulecode=code[0:8]
+    if level<verbosity_level:
+        return # note: log file handlers use the same level, so the message would be discarded there too
 
-    if level>=get_verbosity_level():
+    if stdout:
+        sdtools.print_stdout(message)
 
-        if stdout:
-            sdtools.print_stdout(message)
+    if stderr:
 
-        if stderr:
+        # add msg prefix
+        label=get_verbosity_label(level)
+        formatted_msg='%s: %s'%(label.upper(),message)
 
-            # add msg prefix
-            label=get_verbosity_label(level)
-            formatted_msg='%s: %s'%(label.upper(),message)
-
-            sdtools.print_stderr(formatted_msg)
+        sdtools.print_stderr(formatted_msg)
 
     if logfile:
         if logger_name is None:
@@ -85,20 +233,38 @@ def get_verbosity_label(level):
     label=LABELS[level] # int to string conversion
     return label
 
+def reload():
+    """Re-read verbosity level from configuration file (e.g. on daemon SIGHUP)."""
+    global verbosity_level
+
+    sdconfig.config.read(sdconfig.configuration_file)
+    verbosity_level=get_verbosity_level()
+
+    for logger in (discovery_logger,transfer_logger,domain_logger):
+        logger.setLevel(verbosity_level)
+        for handler in logger.handlers:
+            handler.setLevel(verbosity_level)
+
+    info("SYNDALOG-003","Verbosity level reloaded (%s)"%get_verbosity_label(verbosity_level))
+
 def create_logger(name,filename):
     FORMAT = '%(asctime)-15s %(levelname)s %(code)s %(message)s'
-    verbosity_level=get_verbosity_level()
 
     logger = logging.getLogger(name)
     logger.setLevel(verbosity_level)
     fullpath_filename="%s/%s"%(sdconfig.log_folder,filename)
-    fh = logging.FileHandler(fullpath_filename)
+    fh = AsyncFileHandler(fullpath_filename,logging.Formatter(FORMAT))
     fh.setLevel(verbosity_level)
-    fh.setFormatter(logging.Formatter(FORMAT))
     logger.addHandler(fh)
+    handlers.append(fh)
 
     return logger
 
+def flush():
+    """Write all queued records (called at exit)."""
+    for handler in handlers:
+        handler.flush()
+
 def set_default_logger(name):
     global default_logger
     default_logger=logging.getLogger(name)
@@ -107,12 +273,22 @@ def set_default_logger(name):
 
 os.umask(0002)
 
+verbosity_level=get_verbosity_level()
+
+queue_maxsize=10000 # records
+flush_timeout=10    # seconds
+
+handlers=[]
+throttling={} # code => (last logged message time,discarded messages count)
+
 discovery_logger=create_logger(sdconst.LOGGER_FEEDER,sdconst.LOGFILE_FEEDER)
 transfer_logger=create_logger(sdconst.LOGGER_CONSUMER,sdconst.LOGFILE_CONSUMER)
 domain_logger=create_logger(sdconst.LOGGER_DOMAIN,sdconst.LOGFILE_DOMAIN)
 
 default_logger=discovery_logger
 
+atexit.register(flush)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-n', '--name',required=True,choices=[sdconst.LOGGER_FEEDER,sdconst.LOGGER_CONSUMER])
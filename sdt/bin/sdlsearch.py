@@ -49,9 +49,12 @@ def run(stream=None,path=None,parameter=None,dry_run=False,load_default=None):
 
     return files
 
-def get_files(q,type_,conn=sddb.conn):
+def get_files(q,type_,conn=None):
     files=[]
 
+    if conn is None:
+        conn=sddb.get_ro_conn() # read-only query (so not to wait for the daemon to release the write lock)
+
     c = conn.cursor()
     c.execute(q)
     rs=c.fetchone()
@@ -18,15 +18,12 @@ Notes
 """
 
 import sdapp
-import sdlmattrfilter
 
 def get_attributes(metadata,attr_name):
     li=[]
 
-    light_metadata=sdlmattrfilter.run(metadata,[attr_name]) # create light metadata with one column only
-
-    for f in light_metadata.get_files(): # load metadata in memory (dict), but as metadata only contain one attribute, it should not exceed the available memory.
+    for f in metadata.iter_columns([attr_name]): # only one attribute is read from the store, chunk by chunk
         attr_val=f[attr_name]
-        li.append(attr_val) # duplicate metadata in memory (list). Means metadata are loaded twice simultaneously.
+        li.append(attr_val)
 
     return li
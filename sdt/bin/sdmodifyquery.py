@@ -18,6 +18,7 @@ import sddb
 import sdlog
 import sdconst
 import sdfiledao
+import sdutils
 
 def change_replica(file_functional_id,new_replica,conn=sddb.conn):
     (url,data_node)=new_replica
@@ -27,6 +28,8 @@ def change_replica(file_functional_id,new_replica,conn=sddb.conn):
     conn.commit()
     c.close()
 
+    sdutils.notify_daemon(resync=True)
+
 def change_status(old_status,new_status,conn=sddb.conn):
     nbr=0
 
@@ -36,10 +39,11 @@ def change_status(old_status,new_status,conn=sddb.conn):
         (new_status,old_status,))
     nbr=c.rowcount
     conn.commit()
-    if new_status==sdconst.TRANSFER_STATUS_WAITING and sdconst.GET_FILES_CACHING:
-        sdfiledao.highest_waiting_priority( True, c )
     c.close()
 
+    if nbr>0:
+        sdutils.notify_daemon(resync=True)
+
     return nbr
 
 def change_priority(new_priority,conn=sddb.conn):
@@ -51,6 +55,8 @@ def change_priority(new_priority,conn=sddb.conn):
     conn.commit()
     c.close()
 
+    sdutils.notify_daemon(resync=True)
+
 def wipeout_datasets_flags(status=None,latest=0,conn=sddb.conn):
     """Reset flags on all datasets."""
     c=conn.cursor()
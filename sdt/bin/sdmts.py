@@ -25,11 +25,13 @@ import shutil
 import sddbpagination
 import sdconst
 import sdconfig
+from sdexception import SDException
 
 # abstract class
 class Storage():
 
-    def get_chunks(self,io_mode):
+    def get_chunks(self,io_mode,columns=None):
+        """Returns files by chunk ('columns' is the list of the attributes to be returned, all attributes if None)."""
         pass
 
     def merge(self,store):
@@ -51,6 +53,10 @@ class Storage():
     def disconnect(self):
         pass
 
+    def new(self):
+        """Returns a new empty store of the same kind."""
+        return self.__class__()
+
 class MemoryStorage(Storage):
 
     def __init__(self):
@@ -65,11 +71,14 @@ class MemoryStorage(Storage):
     def get_files(self):
         return self.files
 
-    def get_chunks(self,io_mode): # io_mode is not used (but need to be present to respect Storage contract)
+    def get_chunks(self,io_mode,columns=None): # io_mode is not used (but need to be present to respect Storage contract)
         chunksize=sdconst.PROCESSING_CHUNKSIZE
 
         for i in xrange(0, self.count(), chunksize):
-            yield self.files[i:i+chunksize]
+            if columns is None:
+                yield self.files[i:i+chunksize]
+            else:
+                yield [project(f,columns) for f in self.files[i:i+chunksize]]
 
     def merge(self,store):
         self.files.extend(store.get_files())
@@ -95,6 +104,10 @@ class MemoryStorage(Storage):
         return self.files[0]
 
 class DatabaseStorage(Storage):
+    """Store each file as one json row."""
+
+    columns='attrs'
+    columns_definition='attrs TEXT'
 
     def __init__(self,dbfile=None):
         if dbfile is None:
@@ -111,7 +124,7 @@ class DatabaseStorage(Storage):
 
     def create_table(self,name='data'):
         with contextlib.closing(self.conn.cursor()) as c:
-            c.execute("CREATE TABLE %s (%s)"%(name,columns_definition))
+            c.execute("CREATE TABLE %s (%s)"%(name,self.columns_definition))
             self.conn.commit()
 
     def drop_table(self):
@@ -137,64 +150,35 @@ class DatabaseStorage(Storage):
         """WARNING: this func loads all the data in memory."""
 
         li=[]
-        with contextlib.closing(self.conn.cursor()) as c:
-            c.execute("SELECT %s from data"%columns)
-            rs=c.fetchone()
-            while rs is not None:
-
-
-                # multicol table
-                #
-                #=rs[0]
-                #=rs[1]
-                #=rs[2]
-                #attrs=json.loads(rs[3])
-                #
-                #tu=(rs[0],rs[1],rs[2],attrs)
-                #li.append(tu)
-
-
-                # monocol table
-                attrs=json.loads(rs[0])
-                li.append(attrs)
-
-                rs=c.fetchone()
+        for chunk in self.get_chunks_GENERATOR():
+            li.extend(chunk)
         return li
 
-    def get_chunks(self,io_mode):
+    def get_chunks(self,io_mode,columns=None):
         if io_mode=='generator':
-            return self.get_chunks_GENERATOR()
+            return self.get_chunks_GENERATOR(columns)
         elif io_mode=='pagination':
             return self.get_chunks_PAGINATION()
         else:
             assert False
 
-    def get_chunks_GENERATOR(self):
+    def get_chunks_GENERATOR(self,columns=None):
         """This method is used to loop over all files using yield without consuming too much memory ('yield' based impl.)
 
         Note
             It is not possible to write anywhere in the db file between two yields !
         """
+        (select_clause,decode)=self.get_decoder(columns)
+
         with contextlib.closing(self.conn.cursor()) as c:
-            c.execute("select %s from data"%columns)
+            c.execute("select %s from data"%select_clause)
             while True:
                 results = c.fetchmany(sdconst.PROCESSING_CHUNKSIZE)
                 if not results:
                     break
 
                 # WARNING: two (sdconst.PROCESSING_CHUNKSIZE) list in memory at the same time
-                li=[]
-                for rs in results:
-                
-                    # multicol table
-                    #attrs=json.loads(rs[3])
-
-                    # monocol table
-                    attrs=json.loads(rs[0])
-
-                    li.append(attrs)
-
-                yield li
+                yield [decode(rs) for rs in results]
 
     def get_chunks_PAGINATION(self):
         dbpagination=sddbpagination.DBPagination('bla','foo',self.conn)
@@ -213,30 +197,43 @@ class DatabaseStorage(Storage):
             files=dbpagination.get_files()
 
     def merge(self,store):
+        if store.__class__!=self.__class__:
+            # storage layout differs, so we can't copy rows as is
+
+            for chunk in store.get_chunks('generator'):
+                self.append_files(chunk)
+            return
+
         store.disconnect() # not sure if needed (more info => https://www.sqlite.org/lang_detach.html)
 
         self.conn.execute("ATTACH DATABASE '%s' AS incoming"%store.dbfile)
-        self.conn.execute("insert into data select %s from incoming.data"%columns)
+        self.merge_attached()
         self.conn.commit() # commit all attached databases (TBC)
         self.conn.execute("DETACH DATABASE incoming")
 
         store.connect() # not sure if needed
 
-    def append_files(self,files):
+    def merge_attached(self):
+        self.conn.execute("insert into data select %s from incoming.data"%self.columns)
 
-        # WARNING: slow perf here. Maybe replace rown-by-row insert with array insert.
+    def append_files(self,files):
         with contextlib.closing(self.conn.cursor()) as c:
-            for f in files:
+            c.executemany("INSERT INTO data (%s) VALUES (%s)"%(self.columns,','.join(['?']*len(self.columns.split(',')))), (self.encode(f) for f in files))
+            self.conn.commit()
 
-                # multicol table
-                #tu=(f['id'], f['size'], f['data_node'], json.dumps(f))
-                #c.execute("INSERT INTO data (%s) VALUES (?, ?, ?, ?)"%columns, tu)
+    def encode(self,f):
+        return (json.dumps(f),)
 
-                # monocol table
-                tu=(json.dumps(f),)
-                c.execute("INSERT INTO data (%s) VALUES (?)"%columns, tu)
+    def get_decoder(self,columns):
+        """Returns select clause and row decoding func (i.e. row to file dict).
 
-            self.conn.commit()
+        Note
+            'columns' is the list of the attributes to be returned (all attributes if None)
+        """
+        if columns is None:
+            return (self.columns,lambda rs: json.loads(rs[0]))
+        else:
+            return (self.columns,lambda rs: project(json.loads(rs[0]),columns))
 
     def delete(self):
         self.disconnect()
@@ -246,6 +243,10 @@ class DatabaseStorage(Storage):
     def connect(self):
         self.conn = sqlite3.connect(self.dbfile, isolation_level='DEFERRED')
 
+        # storage is transient (i.e. no need to survive a crash), so we disable fsync and on-disk journal
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("PRAGMA journal_mode=MEMORY")
+
     def disconnect(self):
         if self.conn is not None:
             self.conn.close()
@@ -263,7 +264,7 @@ class DatabaseStorage(Storage):
         shutil.copy(self.dbfile,dbfile_cpy)
 
         # create new instance
-        cpy=DatabaseStorage(dbfile=dbfile_cpy)
+        cpy=self.__class__(dbfile=dbfile_cpy)
 
         # re-open ori connection
         self.connect()
@@ -272,36 +273,205 @@ class DatabaseStorage(Storage):
 
     def get_one_file(self):
         assert self.count()>0
-        with contextlib.closing(self.conn.cursor()) as c:
-            c.execute("SELECT %s from data LIMIT 1"%columns)
-            rs=c.fetchone()
 
-            # multicol table
-            #=rs[0]
-            #=rs[1]
-            #=rs[2]
-            #=rs[3]
+        (select_clause,decode)=self.get_decoder(None)
 
-            # monocol table
-            file_=json.loads(rs[0])
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("SELECT %s from data LIMIT 1"%select_clause)
+            file_=decode(c.fetchone())
 
         return file_
 
+class ColumnarDatabaseStorage(DatabaseStorage):
+    """Store hot attributes in typed columns, and remaining attributes as a json blob.
+
+    Notes
+        - an attribute is stored in its column only if its value has the
+          column type (e.g. a 'size' attribute stored as string goes in the
+          blob), so files are returned exactly as they were stored.
+        - 'overflow' table contains the name of the attributes stored in the
+          blob at least once. This allows to skip blob decoding when all the
+          requested columns are hot (see 'get_decoder').
+    """
+
+    # most used attributes in the pipeline
+    hot_attributes=[('id','TEXT'),
+                    ('file_functional_id','TEXT'),
+                    ('dataset_functional_id','TEXT'),
+                    ('data_node','TEXT'),
+                    ('size','INT'),
+                    ('checksum','TEXT'),
+                    ('checksum_type','TEXT'),
+                    ('url_http','TEXT'),
+                    ('url_gridftp','TEXT'),
+                    ('local_path','TEXT'),
+                    ('dataset_local_path','TEXT'),
+                    ('status','TEXT'),
+                    ('timestamp','TEXT'),
+                    ('title','TEXT'),
+                    ('type','TEXT')]
+
+    column_types={'TEXT':(str,unicode),'INT':(int,long)} # python types stored as is for each column type (other types go in the blob)
+
+    hot_columns=[name for (name,type_) in hot_attributes]
+    hot_attributes_types=[(name,column_types[type_]) for (name,type_) in hot_attributes]
+    columns=','.join(hot_columns+['attrs'])
+    columns_definition=','.join(['%s %s'%(name,type_) for (name,type_) in hot_attributes]+['attrs TEXT'])
+
+    def create_table(self,name='data'):
+        DatabaseStorage.create_table(self,name)
+
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("CREATE TABLE IF NOT EXISTS overflow (name TEXT PRIMARY KEY)")
+            self.conn.commit()
+
+    def drop_table(self):
+        DatabaseStorage.drop_table(self)
+
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("DELETE FROM overflow")
+            self.conn.commit()
+
+    def append_files(self,files):
+        overflow_keys=set()
+
+        def encode(f):
+            (row,keys)=self.encode(f)
+            overflow_keys.update(keys)
+            return row
+
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.executemany("INSERT INTO data (%s) VALUES (%s)"%(self.columns,','.join(['?']*(len(self.hot_columns)+1))), (encode(f) for f in files))
+            c.executemany("INSERT OR IGNORE INTO overflow (name) VALUES (?)", ((k,) for k in overflow_keys))
+            self.conn.commit()
+
+    def merge_attached(self):
+        DatabaseStorage.merge_attached(self)
+        self.conn.execute("insert or ignore into overflow select name from incoming.overflow")
+
+    def encode(self,f):
+        """
+        Returns
+            (row,overflow_keys) tuple
+        """
+        blob=f.copy()
+        row=[]
+        for (name,types) in self.hot_attributes_types:
+            if type(blob.get(name)) in types:
+                row.append(blob.pop(name))
+            else:
+                row.append(None)
+
+        row.append(json.dumps(blob) if len(blob)>0 else None)
+
+        return (row,blob.keys())
+
+    def get_decoder(self,columns):
+        if columns is None:
+            names=self.hot_columns
+            use_blob=True
+        else:
+            names=[name for name in self.hot_columns if name in columns]
+            use_blob=any(name in self.get_overflow_keys() for name in columns)
+
+        select_clause=','.join(names+(['attrs'] if use_blob else []))
+        if len(select_clause)==0:
+            select_clause='NULL' # no requested column exists
+
+        def decode(rs):
+            if use_blob and rs[-1] is not None:
+                f=json.loads(rs[-1])
+                if columns is not None:
+                    f=project(f,columns)
+            else:
+                f={}
+
+            for (name,value) in zip(names,rs):
+                if value is not None:
+                    f[name]=value
+
+            return f
+
+        return (select_clause,decode)
+
+    def get_overflow_keys(self):
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("SELECT name FROM overflow")
+            return set(rs[0] for rs in c.fetchall())
+
+class GroupStorage():
+    """Transient table used to select one file per group, without loading all groups in memory.
+
+    Each added file is described by its group key, its rank and its position
+    (index of the file in the metadata store). For each group, the file with
+    the lowest rank is selected (the first one if several files have the same
+    rank).
+
+    Note
+        Grouping and sorting are done by SQLite, using temporary disk
+        storage if needed (memory usage doesn't depend on the number of files).
+    """
+
+    def __init__(self):
+        self.dbfile=get_uniq_fullpath_db_filename()
+        assert not os.path.isfile(self.dbfile) # dbfile shouldn't exist at this time
+
+        self.conn=sqlite3.connect(self.dbfile, isolation_level='DEFERRED')
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("PRAGMA journal_mode=MEMORY")
+        self.conn.execute("CREATE TABLE item (key TEXT, rank REAL, position INTEGER)")
+        self.conn.commit()
+
+    def add(self,items):
+        """Add (key,rank,position) tuples."""
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.executemany("INSERT INTO item (key,rank,position) VALUES (?,?,?)",items)
+        self.conn.commit()
+
+    def get_selected_positions(self):
+        """Returns the positions of the selected files, in ascending order ('yield' based impl.)."""
+
+        # index is created after insertion (faster than maintaining it during insertion)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_item_key ON item (key,rank,position)")
+        self.conn.commit()
+
+        with contextlib.closing(self.conn.cursor()) as c:
+            c.execute("SELECT (SELECT position FROM item WHERE key=g.key ORDER BY rank,position LIMIT 1) AS selected FROM (SELECT DISTINCT key FROM item) g ORDER BY selected")
+            while True:
+                results=c.fetchmany(sdconst.PROCESSING_CHUNKSIZE)
+                if not results:
+                    break
+
+                for rs in results:
+                    yield rs[0]
+
+    def delete(self):
+        self.conn.close()
+        if os.path.isfile(self.dbfile):
+            os.unlink(self.dbfile)
+
+def project(file_,columns):
+    return dict((k,file_[k]) for k in columns if k in file_)
+
 def get_uniq_fullpath_db_filename():
     dbfilename='sdt_transient_storage_%s_%s.db'%(str(os.getpid()),str(uuid.uuid4()))
     dbfile=os.path.join(sdconfig.db_folder,dbfilename)
     return dbfile
 
-def get_new_store(lowmem=False):
+def get_new_store(lowmem=False,backend=None):
+    """
+    Args
+        backend: disk storage layout used in lowmem mode (json | columnar), default to 'sdconfig.lowmem_storage'
+    """
     if lowmem:
-        return DatabaseStorage()
+        if backend is None:
+            backend=sdconfig.lowmem_storage
+
+        if backend=='columnar':
+            return ColumnarDatabaseStorage()
+        elif backend=='json':
+            return DatabaseStorage()
+        else:
+            raise SDException("SYNDAMTS-001","Incorrect value for 'core.lowmem_storage' parameter (%s)"%backend)
     else:
         return MemoryStorage()
-
-# init.
-
-#columns='id, size, data_node, attrs'
-#columns_definition='id TEXT PRIMARY KEY, size INT, data_node TEXT, attrs TEXT'
-
-columns='attrs'
-columns_definition='attrs TEXT'
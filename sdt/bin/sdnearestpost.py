@@ -24,13 +24,13 @@ import json
 import sdnearestutils
 import sdpostpipelineutils
 import sdprint
-import sdrtt
+import sdrttprobe
 import sdconfig
 import sdlog
 import sdgc
 import sdpipelineprocessing
 import sdconst
-import sdlmattrfilter
+import sdmts
 from sdexception import SDException
 
 def run(metadata):
@@ -42,55 +42,66 @@ def run(metadata):
     f=metadata.get_one_file()
     functional_id_keyname=sdpostpipelineutils.get_functional_identifier_name(f)
 
-    light_metadata=sdlmattrfilter.run(metadata,[functional_id_keyname,'data_node']) # create light list with needed columns only, not to overload system memory.
+    # For each file, the nearest replica is the first (in files order) of the
+    # replicas located on the nearest datanode. This also removes duplicates
+    # (memo: duplicate != replicate, i.e. some exact same file may be present
+    # multiple time in the list (see 'Type-A' in sdshrink for more info)).
+    #
+    # Grouping is done on disk, as there can be tens of millions of replicas.
 
-    score=build_score_table(light_metadata,functional_id_keyname) # warning: load list in memory
+    if sdconfig.config.get('behaviour','nearest_mode')=='rtt':
+        prefetch_RTT(metadata)
 
-    # filtering to keep nearest datanode
-    for id in score:
-        datanodes=score[id]
-        dn=get_nearest_dn(datanodes)
-        score[id]=dn # replace list with scalar
+    group_storage=sdmts.GroupStorage()
+    try:
+        group_storage.add(get_group_items(metadata,functional_id_keyname))
 
-    # at this point, 'score' table is in the form: [id]=dn
+        # final filtering (come back to files list)
+        selection=Selection(group_storage.get_selected_positions())
+        po=sdpipelineprocessing.ProcessingObject(keep_nearest_file,selection)
+        metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+    finally:
+        group_storage.delete()
 
-    # 'score' data structure transformation
-    score=dict(((k, score[k]),False) for k in score) # warning: two list in memory simultaneously !
+    return metadata
 
-    # at this point, 'score' table is in the form: [(id,dn)]=False
+class Selection():
+    """Walk through files positions in parallel with the selected positions (both in ascending order)."""
 
-    # final filtering (come back to files list)
-    po=sdpipelineprocessing.ProcessingObject(keep_nearest_file,functional_id_keyname,score)
-    metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+    def __init__(self,selected_positions):
+        self.selected_positions=selected_positions
+        self.next_selected=next(self.selected_positions,None)
+        self.position=0
 
-    return metadata
+    def is_selected(self):
+        """Returns True if the current file is selected, then move to the next file."""
+        selected=(self.position==self.next_selected)
+        if selected:
+            self.next_selected=next(self.selected_positions,None)
+        self.position+=1
+        return selected
 
-def keep_nearest_file(files,functional_id_keyname,score):
+def keep_nearest_file(files,selection):
     new_files=[]
 
     for f in files:
-        id_=f[functional_id_keyname]
-        dn=f['data_node']
-        if (id_,dn) in score: # add the nearest replicate
-            if not score[(id_,dn)]: # prevent adding duplicate (memo: duplicate != replicate). i.e. some exact same file may be present multiple time in the list (see 'Type-A' in sdshrink for more info).
-                new_files.append(f)
-                score[(id_,dn)]=True
+        if selection.is_selected():
+            new_files.append(f)
 
     return new_files
 
-def build_score_table(light_metadata,functional_id_keyname):
-    score={}
-    
-    for f in light_metadata.get_files(): # warning: load list in memory
-        key=f[functional_id_keyname]
+def get_group_items(metadata,functional_id_keyname):
+    """Returns (functional_id,rank,position) tuples ('yield' based impl.)."""
+    scores={} # datanode => score
+
+    position=0
+    for f in metadata.iter_columns([functional_id_keyname,'data_node']): # read needed columns only, not to overload system memory
         dn=f['data_node']
-        if key in score:
-            if dn not in score[key]: # prevent exact duplicate if any (i.e. duplicate NOT replicate)
-                score[key].append(dn)
-        else:
-            score[key]=[dn]
+        if dn not in scores:
+            scores[dn]=get_score(dn)
 
-    return score
+        yield (f[functional_id_keyname],scores[dn],position)
+        position+=1
 
 def old_algo(files):
     """
@@ -113,53 +124,38 @@ def old_algo(files):
 
     return new_files.values()
 
-def get_nearest_dn(datanodes):
-    nearest=datanodes[0]
-    for d in datanodes:
-        if compare_dn(d,nearest):
-            nearest=d # replace as d is the nearest of the two
-    return nearest
-
-def compare_file(f1,f2):
-    return compare_dn(f1['data_node'],f2['data_node'])
-
-def compare_dn(datanode_1,datanode_2):
+def get_score(datanode):
+    """Returns datanode distance (the lower, the nearer)."""
     mode=sdconfig.config.get('behaviour','nearest_mode')
 
     if mode=='geolocation':
-        return (get_distance(datanode_1) < get_distance(datanode_2))
+        return get_distance(datanode)
     elif mode=='rtt':
-        return (get_RTT(datanode_1) < get_RTT(datanode_2))
+        return get_RTT(datanode)
     else:
         raise SDException("SDNEARES-001","Incorrect nearest mode (%s)"%mode)
 
-def get_RTT(remote_host):
-
-    if remote_host not in sdgc.RTT_cache:
-        sdlog.info("SDNEARES-012","Compute RTT for '%s' host."%remote_host)
-        sdgc.RTT_cache[remote_host]=compute_RTT(remote_host)
+def compare_file(f1,f2):
+    return compare_dn(f1['data_node'],f2['data_node'])
 
-    return sdgc.RTT_cache[remote_host]
+def compare_dn(datanode_1,datanode_2):
+    return (get_score(datanode_1) < get_score(datanode_2))
 
-def compute_RTT(remote_host):
+def get_RTT(remote_host):
     """Returns round trip time between the client and the file (i.e. the file's datanode)."""
-    rtt=0.0
-
-    try:
-        rtt=sdrtt.compute_RTT(remote_host)
-    except SDException,e:
-        if e.code=='SYNDARTT-002':
-            # when here, it means no response from host
 
-            sdlog.info("SDNEARES-006","No reply to ICMP request (ping) from '%s' host."%remote_host)
+    if remote_host not in sdgc.RTT_cache:
+        sdgc.RTT_cache.update(sdrttprobe.get_RTTs([remote_host]))
 
-            # in this case, we return a high RTT to prevent using this host
+    return sdgc.RTT_cache[remote_host]
 
-            return 20000.0 # 20 seconds
-        else:
-            raise
+def prefetch_RTT(metadata):
+    """Retrieve RTT of all datanodes at once (so they are probed concurrently)."""
+    datanodes=set(f['data_node'] for f in metadata.iter_columns(['data_node']))
+    datanodes=[dn for dn in datanodes if dn not in sdgc.RTT_cache]
 
-    return rtt
+    if len(datanodes)>0:
+        sdgc.RTT_cache.update(sdrttprobe.get_RTTs(datanodes))
 
 def get_distance(remote_host):
 
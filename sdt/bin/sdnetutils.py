@@ -12,6 +12,7 @@
 """This module contains network functions."""
 
 import os
+import argparse
 import urllib2
 import requests
 import sdtypes
@@ -22,6 +23,7 @@ import sdlog
 import sdconst
 import sdconfig
 import sdpoodlefix
+import sdsearchapicache
 import httplib
 import sdtrace
 import ssl
@@ -38,6 +40,61 @@ class HTTPSClientAuthHandler(urllib2.HTTPSHandler):
             return httplib.HTTPSConnection(host, key_file=self.key, cert_file=self.cert)
 
 def call_web_service(url,timeout=sdconst.SEARCH_API_HTTP_TIMEOUT,lowmem=False): # default is to load list resulting from HTTP call in memory (should work on lowmem machine as response should not exceed SEARCH_API_CHUNKSIZE)
+    """
+    Notes
+        - The HTTP body is parsed while it is being received (i.e. it is never
+          fully loaded in memory), except when 'fix_encoding' is enabled, as
+          the fix needs the whole document.
+        - responses are cached on disk (see sdsearchapicache)
+    """
+    response=sdsearchapicache.get(url,lowmem)
+    if response is not None:
+        return response
+
+    if sdconfig.fix_encoding:
+        response=call_web_service__BUFFER(url,timeout,lowmem)
+    else:
+        response=call_web_service__STREAM(url,timeout,lowmem)
+
+    sdsearchapicache.put(url,response)
+
+    return response
+
+def call_web_service__STREAM(url,timeout,lowmem):
+    start_time=SDTimer.get_time()
+
+    sock=None
+    try:
+        sdpoodlefix.start(url)
+
+        try:
+            sock=urllib2.urlopen(url, timeout=timeout)
+        except Exception, e:
+            errmsg="HTTP query failed (url=%s,exception=%s,timeout=%d)"%(url,str(e),timeout)
+            errcode="SDNETUTI-002"
+
+            raise SDException(errcode,errmsg)
+
+        try:
+            response=parse_stream(sock,lowmem)
+        except Exception,e:
+            log_parsing_error(e)
+
+            raise SDException('SDNETUTI-008','Network error (see log for details)') # we raise a new exception 'network error' here, because most of the time, 'xml parsing error' is due to an 'network error'.
+
+    finally:
+        if sock!=None:
+            sock.close()
+
+        sdpoodlefix.stop()
+
+    response.call_duration=SDTimer.get_elapsed_time(start_time)
+
+    sdlog.debug("SDNETUTI-044","files-count=%d"%response.count())
+
+    return response
+
+def call_web_service__BUFFER(url,timeout,lowmem):
     start_time=SDTimer.get_time()
     buf=HTTP_GET(url,timeout)
     elapsed_time=SDTimer.get_elapsed_time(start_time)
@@ -45,33 +102,59 @@ def call_web_service(url,timeout=sdconst.SEARCH_API_HTTP_TIMEOUT,lowmem=False):
     buf=fix_encoding(buf)
 
     try:
-        di=search_api_parser.parse_metadata(buf)
+        response=parse_buffer(buf,lowmem)
     except Exception,e:
+        log_parsing_error(e)
 
-        # If we are here, it's likely that they is a problem with the internet connection
-        # (e.g. we are behind an HTTP proxy and have no authorization to use it)
+        raise SDException('SDNETUTI-008','Network error (see log for details)') # we raise a new exception 'network error' here, because most of the time, 'xml parsing error' is due to an 'network error'.
 
-        sdlog.info('SDNETUTI-001','XML parsing error (exception=%s). Most of the time, this error is due to a network error.'%str(e))
+    response.call_duration=elapsed_time
 
-        # debug
-        #
-        # TODO: maybe always enable this
-        #
-        sdtrace.log_exception()
+    sdlog.debug("SDNETUTI-044","files-count=%d"%response.count())
 
-        # debug
-        #
-        # (if the error is not due to a network error (e.g. internet connection
-        # problem), raise the original exception below and set the debug mode
-        # to see the stacktrace.
-        #
-        #raise
+    return response
 
-        raise SDException('SDNETUTI-008','Network error (see log for details)') # we raise a new exception 'network error' here, because most of the time, 'xml parsing error' is due to an 'network error'.
+def log_parsing_error(e):
+
+    # If we are here, it's likely that they is a problem with the internet connection
+    # (e.g. we are behind an HTTP proxy and have no authorization to use it)
+
+    sdlog.info('SDNETUTI-001','XML parsing error (exception=%s). Most of the time, this error is due to a network error.'%str(e))
+
+    # debug
+    #
+    # TODO: maybe always enable this
+    #
+    sdtrace.log_exception()
+
+    # debug
+    #
+    # (if the error is not due to a network error (e.g. internet connection
+    # problem), raise the original exception in the caller and set the debug
+    # mode to see the stacktrace.
+
+def parse_buffer(buf,lowmem=False):
+    di=search_api_parser.parse_metadata(buf)
+    return sdtypes.Response(lowmem=lowmem,**di) # RAM storage is ok here as one response is limited by SEARCH_API_CHUNKSIZE
+
+def parse_stream(stream,lowmem=False):
+    """Parse search-API output while it is being read, storing files in the Response object by batch."""
+    (num_found,files)=search_api_parser.parse_metadata_stream(stream)
+
+    response=sdtypes.Response(lowmem=lowmem,num_found=num_found)
+
+    batch=[]
+    for f in files:
+        batch.append(f)
 
-    sdlog.debug("SDNETUTI-044","files-count=%d"%len(di.get('files')))
+        if len(batch)>=stream_batch_size:
+            response.add_files(batch)
+            batch=[]
 
-    return sdtypes.Response(call_duration=elapsed_time,lowmem=lowmem,**di) # RAM storage is ok here as one response is limited by SEARCH_API_CHUNKSIZE
+    if len(batch)>0:
+        response.add_files(batch)
+
+    return response
 
 def call_param_web_service(url,timeout):
     buf=HTTP_GET(url,timeout)
@@ -184,6 +267,56 @@ def allow_self_signed_certificate():
 
         pass
 
+def benchmark(files):
+    """Compare buffer and stream parsing of recorded search-API responses.
+
+    Each measure is done in a dedicated process, so peak RSS of one mode is
+    not affected by the other.
+
+    Note
+        A response can be recorded with
+        curl -o response.json 'https://esgf-data.dkrz.de/esg-search/search?type=File&project=CMIP5&limit=9000&fields=*&format=application%2Fsolr%2Bjson'
+    """
+    import time
+    import resource
+    import multiprocessing
+    import psutil
+
+    def measure(mode,file_,result_queue):
+        rss_before=psutil.Process(os.getpid()).memory_info().rss
+
+        start=time.time()
+        with open(file_,'rb') as fh:
+            if mode=='buffer':
+                response=parse_buffer(fh.read())
+            else:
+                response=parse_stream(fh)
+        elapsed=time.time()-start
+
+        peak_rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024 # kB on Linux
+
+        result_queue.put((response.count(),elapsed,peak_rss-rss_before))
+
+    print "%-30s %-7s %8s %12s %16s"%('file','mode','docs','docs/sec','peak RSS (MB)')
+    for file_ in files:
+        for mode in ('buffer','stream'):
+            result_queue=multiprocessing.Queue()
+            p=multiprocessing.Process(target=measure,args=(mode,file_,result_queue))
+            p.start()
+            (count,elapsed,peak_rss)=result_queue.get()
+            p.join()
+
+            print "%-30s %-7s %8d %12.0f %16.1f"%(os.path.basename(file_)[:30],mode,count,count/max(elapsed,1e-6),peak_rss/1024.0/1024)
+
 # init.
 
 search_api_parser=get_search_api_parser()
+stream_batch_size=1000 # number of files stored at once in the Response object when parsing a stream
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b','--benchmark',nargs='+',metavar='FILE',help='Compare buffer and stream parsing of recorded search-API responses')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
@@ -17,6 +17,7 @@ import sdapp
 import sddao
 import sdnormalize
 import sdcache
+import sdparamindex
 import sdconst
 import sdtools
 import sdi18n
@@ -30,12 +31,12 @@ def handle_negated_value(name):
     return re.sub('!$','',name)
 
 def is_case_incorrect(value):
-    if value in reversed_params:
+    if value in index.reversed_params:
         # if we are here, it means that value exist with that exact case, so the case is correct
 
         return False
     else:
-        if value.upper() in ucvalue2value:
+        if value.upper() in index.ucvalue2value:
             # if we are here, it means value exist, but without another case
 
             return True
@@ -47,7 +48,7 @@ def is_case_incorrect(value):
             return False
 
 def fix_value_case(value):
-    return ucvalue2value[value.upper()]
+    return index.ucvalue2value[value.upper()]
 
 def exists_parameter_name(name):
     name=handle_negated_value(name)
@@ -217,8 +218,8 @@ def denormalize_models_list(models_list):
 def search_match_fast(value):
     """Same as 'search_match' func, but faster."""
 
-    if value in reversed_params:
-        return reversed_params[value]
+    if value in index.reversed_params:
+        return index.reversed_params[value]
     else:
         return []
 
@@ -296,24 +297,48 @@ def print_(args):
             else:
                 sdtools.print_stderr("Parameter not found")
 
-# module init
+def build_index():
+    """
+    Returns
+        (index,key) tuple (key identifies the 'param' table content the index has been built from)
+    """
+
+    # key is computed before reading the table, so that if the table is
+    # modified in the meantime, the snapshot is outdated (and not the reverse)
+    key=sdparamindex.get_key()
+    params=sddao.fetch_parameters() # load parameters list in memory
+
+    # if params empty, cache need to be populated
+    if len(params)<1:
+        sdtools.print_stderr('Retrieving parameters from ESGF..')
+        sdcache.run(reload=True)
+        key=sdparamindex.get_key()
+        params=sddao.fetch_parameters()
 
-params=sddao.fetch_parameters() # load parameters list in memory
+    index={}
 
-# if params empty, cache need to be populated
-if len(params)<1:
-    sdtools.print_stderr('Retrieving parameters from ESGF..')
-    sdcache.run(reload=True)
-    params=sddao.fetch_parameters()
+    index['params']=params
 
-# data structure used for acceleration
-reversed_params=reverse_params(params)
+    # data structure used for acceleration
+    index['reversed_params']=reverse_params(params)
+
+    # load norm.=>non-norm. model mapping in memory
+    index['models']=get_models_mapping(params['model'])
+
+    # data structure used by ignorecase mode
+    index['ucvalue2value']=build_ucvalue_index(index['reversed_params'])
+
+    return (sdparamindex.ParamIndex(index),key)
+
+# module init
 
-# load norm.=>non-norm. model mapping in memory
-models=get_models_mapping(params['model'])
+index=sdparamindex.load() # precompiled index (see 'sdparamindex' module)
+if index is None:
+    (index,key)=build_index()
+    sdparamindex.save(index,key)
 
-# data structure used by ignorecase mode
-ucvalue2value=build_ucvalue_index(reversed_params)
+params=index.params
+models=index.models
 
 mapping_keywords=('model_mapping','mapping')
 
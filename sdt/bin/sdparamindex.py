@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the search-API parameters index snapshot.
+
+Notes
+    - the snapshot contains the 'param' table content and the data structures
+      built from it by 'sdparam' (so they don't have to be rebuilt each time
+      'synda' starts)
+    - the snapshot is stored using 'marshal' (faster than pickle to load
+      builtin types)
+    - 'reversed_params' and 'ucvalue2value' are stored as marshalled
+      strings, and only loaded on first access (loading them costs more than
+      loading 'params', and most commands don't use them)
+    - the snapshot is removed each time 'sdcache' modifies the 'param' table,
+      and it is also ignored if the 'param' table doesn't match the key stored
+      in the snapshot (e.g. database replaced)
+"""
+
+import os
+import sys
+import uuid
+import marshal
+import sdapp
+import sdconfig
+import sdlog
+import sddb
+
+class ParamIndex(object):
+    """Data structures built from the 'param' table."""
+
+    lazy_members=('reversed_params','ucvalue2value')
+
+    def __init__(self,members):
+        self.members=members
+
+    def __getattr__(self,name):
+        if name not in self.members:
+            raise AttributeError(name)
+
+        value=self.members[name]
+        if name in self.lazy_members and isinstance(value,str):
+            value=marshal.loads(value)
+            self.members[name]=value
+
+        return value
+
+    def dumps(self):
+        """Returns members with lazy members marshalled."""
+        members={}
+        for (name,value) in self.members.iteritems():
+            if name in self.lazy_members and not isinstance(value,str):
+                value=marshal.dumps(value)
+            members[name]=value
+        return members
+
+def load():
+    """Returns ParamIndex object, or None if snapshot is missing or outdated."""
+    try:
+        with open(snapshot_file,'rb') as fh:
+            snapshot=marshal.load(fh)
+    except (IOError,OSError):
+        return None # no snapshot
+    except (EOFError,ValueError,TypeError),e:
+        sdlog.warning("SDPARIDX-001","Corrupted parameters index snapshot ignored (%s)"%str(e))
+        return None
+
+    if snapshot.get('key')!=get_key():
+        return None
+
+    return ParamIndex(snapshot['index'])
+
+def save(index,key):
+    """
+    Args:
+        key: 'param' table key, computed before reading the table (see 'get_key')
+    """
+    snapshot={'key':key,'index':index.dumps()}
+
+    tmp_file='%s.%s.tmp'%(snapshot_file,uuid.uuid4())
+    try:
+        with open(tmp_file,'wb') as fh:
+            marshal.dump(snapshot,fh)
+        os.rename(tmp_file,snapshot_file) # atomic, so concurrent synda processes never read a partially written snapshot
+    except (IOError,OSError,ValueError),e:
+        sdlog.warning("SDPARIDX-002","Cannot write parameters index snapshot (%s)"%str(e))
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+
+def invalidate():
+    if os.path.isfile(snapshot_file):
+        os.remove(snapshot_file)
+
+def get_key(conn=sddb.conn):
+    """Returns a value which identifies the 'param' table content."""
+    (count,max_rowid)=conn.execute("select count(1),max(rowid) from param").fetchone()
+    return [sdconfig.db_file,count,max_rowid,sys.version]
+
+# init.
+
+snapshot_file=os.path.join(sdconfig.db_folder,'sdt_param_index.marshal')
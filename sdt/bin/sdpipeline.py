@@ -36,15 +36,21 @@ import sdpipelineprocessing
 import sdexception
 
 def main_pipeline(files,mode=None):
+    files=main_pipeline_stateless(files,mode)
+    files=main_pipeline_stateful(files,mode)
+    return files
+
+def main_pipeline_stateless(files,mode=None):
+    """Main pipeline stages without database access (can be run in a worker process)."""
 
     assert isinstance(files,list)
 
     if mode=='file':
         files=sdgenericpipeline.run(files)
-        files=sdfilepipeline.run(files=files)
+        files=sdfilepipeline.run_stateless(files)
     elif mode=='dataset':
         files=sdgenericpipeline.run(files)
-        files=sddatasetpipeline.run(files=files)
+        files=sddatasetpipeline.run_stateless(files)
     elif mode=='generic':
         files=sdgenericpipeline.run(files)
     else:
@@ -52,6 +58,16 @@ def main_pipeline(files,mode=None):
 
     return files
 
+def main_pipeline_stateful(files,mode=None):
+    """Main pipeline stages using the database."""
+
+    if mode=='file':
+        files=sdfilepipeline.run_stateful(files)
+    elif mode=='dataset':
+        files=sddatasetpipeline.run_stateful(files)
+
+    return files
+
 def build_queries(stream=None,selection=None,path=None,parameter=None,index_host=None,load_default=None,query_type='remote',dry_run=False,parallel=True,count=False):
     """This pipeline add 'path', 'parameter' and 'selection' input type to the
     standalone query pipeline.
@@ -95,8 +111,11 @@ def post_pipeline(metadata,mode=None):
 
     sdlog.info("SDPIPELI-004","Start main pipeline")
 
-    po=sdpipelineprocessing.ProcessingObject(main_pipeline,mode)
-    metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+    po=sdpipelineprocessing.ParallelProcessingObject(main_pipeline_stateless,mode)
+    metadata=sdpipelineprocessing.run_pipeline(metadata,po,deferred=True)
+
+    po=sdpipelineprocessing.ProcessingObject(main_pipeline_stateful,mode)
+    metadata=sdpipelineprocessing.run_pipeline(metadata,po,deferred=True)
 
     sdlog.info("SDPIPELI-006","Main pipeline completed")
 
@@ -9,27 +9,155 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This module contains pipeline execution routines."""
+"""This module contains pipeline execution routines.
 
+Notes
+    - stages wrapped in a 'ParallelProcessingObject' are run by a pool of
+      worker processes (see 'core.pipeline_processes' configuration parameter),
+      one chunk per task
+    - chunks are read and written by the synda process only (workers never
+      access the database), and chunks order is preserved
+    - the number of chunks in flight is bounded, so memory usage doesn't
+      depend on the number of files
+"""
+
+import os
+import sys
+import copy
+import time
+import atexit
+import argparse
+import collections
+import multiprocessing
 import sdapp
+import sdconfig
 import sdtypes
 import sdlog
 import sdconst
 
 class ProcessingObject(object):
+    parallel=False
+
     def __init__(self,f,*args,**kwargs):
         self.f=f # note: this func must take files list as first argument (i.e. chunk).
         self.args=args # note: this do not contain the first argument of f. It will be set automatically during processing (see below).
         self.kwargs=kwargs
 
-def run_pipeline(metadata,po,io_mode=sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+class ParallelProcessingObject(ProcessingObject):
+    """Processing stage which can be run in a worker process.
+
+    Note
+        'f' must be a module level func without side effect (e.g. no database
+        access, no global state modification), and args must be picklable.
+    """
+    parallel=True
+
+def process_chunks(chunks,pos):
+    """Apply processing stages to each chunk.
+
+    Returns
+        processed chunks iterator (same order as input)
+
+    Note
+        Consecutive parallel stages are grouped, so a chunk is sent only once
+        to a worker for all of them.
     """
+    groups=[] # list of (parallel,pos) tuples
+    for po in pos:
+        parallel=po.parallel and get_processes_count()>1
+
+        if len(groups)>0 and groups[-1][0]==parallel:
+            groups[-1][1].append(po)
+        else:
+            groups.append((parallel,[po]))
+
+    for (parallel,group) in groups:
+        if parallel:
+            chunks=imap_pool(group,chunks)
+        else:
+            chunks=imap_local(group,chunks)
+
+    return chunks
+
+def imap_local(pos,chunks):
+    for chunk in chunks:
+        yield apply_stages((pos,chunk))
+
+def imap_pool(pos,chunks):
+    """Run stages in worker processes.
+
+    Note
+        'multiprocessing.Pool.imap' is not used here, as it consumes its input
+        iterator from another thread (sqlite objects can't be used from another
+        thread), and without limit (whole store would be loaded in memory).
+    """
+    pool=get_pool()
+    max_inflight=2*get_processes_count()
+
+    inflight=collections.deque()
+    for chunk in chunks:
+        inflight.append(pool.apply_async(apply_stages,((pos,chunk),)))
+
+        if len(inflight)>=max_inflight:
+            yield inflight.popleft().get(task_timeout)
+
+    while len(inflight)>0:
+        yield inflight.popleft().get(task_timeout)
+
+def apply_stages(task):
+    (pos,chunk)=task
+
+    sdlog.debug("SYNDPIPR-002","Process chunk")
+
+    for po in pos:
+        chunk=po.f(chunk,*po.args,**po.kwargs)
+
+    return chunk
+
+def get_processes_count():
+    if sdconfig.pipeline_processes>0:
+        return sdconfig.pipeline_processes
+    else:
+        return multiprocessing.cpu_count()
+
+def get_pool():
+    global pool
+
+    if pool is None:
+        pool=multiprocessing.Pool(get_processes_count())
+        sdlog.debug("SYNDPIPR-005","Pipeline worker pool started (processes=%d)"%get_processes_count())
+
+    return pool
+
+def terminate_pool():
+    global pool
+
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+        pool=None
+
+def run_pipeline(metadata,po,io_mode=sdconst.PROCESSING_FETCH_MODE_GENERATOR,deferred=False):
+    """
+    Args
+        deferred: if true, the stage is not executed now, but fused with the
+                  next deferred stages and executed in the same pass over the
+                  store when files are next accessed (see 'sdtypes.CommonIO.materialize').
+                  Only use it for chunk-local stages (i.e. stages whose
+                  result for a chunk doesn't depend on the other chunks) with
+                  no side effect expected by the caller right after the call.
+
     Note
         Beware: metadata input argument is modified in this func !
         (you have to make a copy before calling this func if you want
         to keep original data)
     """
 
+    if deferred:
+        sdlog.debug("SYNDPIPR-004","Stage deferred (%s)"%po.f.__name__)
+        metadata.defer(po)
+        return metadata
+
     # alias
     f=po.f
     args=po.args
@@ -47,11 +175,7 @@ def run_pipeline(metadata,po,io_mode=sdconst.PROCESSING_FETCH_MODE_GENERATOR):
 
         # way 1: chunk-by-chunk (using a second store)
         new_metadata=sdtypes.Metadata()
-        for chunk in metadata.get_chunks(io_mode):
-
-            sdlog.debug("SYNDPIPR-002","Process chunk")
-
-            chunk=f(chunk,*args,**kwargs)
+        for chunk in process_chunks(metadata.get_chunks(io_mode),[po]):
             new_metadata.add_files(chunk)
 
         metadata=new_metadata # note: metadata old value get's removed here (destructor is called). This is to enforce that this function IS destructive with its input argument (see func comment for more info).
@@ -75,3 +199,60 @@ def run_pipeline(metadata,po,io_mode=sdconst.PROCESSING_FETCH_MODE_GENERATOR):
     sdlog.debug("SYNDPIPR-003","Chunk loop completed (files-count=%d)"%metadata.count())
 
     return metadata
+
+def benchmark(files_,processes_list,chunksize=sdconst.PROCESSING_CHUNKSIZE):
+    """Measure main pipeline throughput for each number of worker processes.
+
+    Note
+        Input files are recorded search-API responses (see 'sdnetutils.benchmark').
+    """
+    import sdnetutils
+    import sdpipeline
+
+    files=[]
+    for file_ in files_:
+        with open(file_,'rb') as fh:
+            files.extend(sdnetutils.parse_buffer(fh.read()).get_files())
+    for f in files:
+        f['attached_parameters']={}
+
+    chunks=[files[i:i+chunksize] for i in range(0,len(files),chunksize)]
+    po=ParallelProcessingObject(sdpipeline.main_pipeline_stateless,'file')
+
+    print "%-10s %8s %12s %8s"%('processes','files','files/sec','speedup')
+    reference=None
+    for processes in processes_list:
+        sdconfig.pipeline_processes=processes
+        terminate_pool()
+        if processes>1:
+            get_pool() # pool startup is not measured
+
+        input_chunks=copy.deepcopy(chunks) # stages modify files in place
+
+        start=time.time()
+        count=0
+        for chunk in process_chunks(iter(input_chunks),[po]):
+            count+=len(chunk)
+        rate=count/max(time.time()-start,1e-6)
+
+        if reference is None:
+            reference=rate
+
+        print "%-10d %8d %12.0f %8.2f"%(processes,count,rate,rate/reference)
+
+# init.
+
+task_timeout=sys.maxint # note: 'get()' without timeout can't be interrupted by CTRL-C
+pool=None
+
+atexit.register(terminate_pool)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b','--benchmark',nargs='+',metavar='FILE',help='Measure main pipeline throughput on recorded search-API responses')
+    parser.add_argument('-p','--processes',type=int,nargs='+',default=[1,2,4,multiprocessing.cpu_count()],help='Numbers of worker processes to compare')
+    parser.add_argument('-c','--chunksize',type=int,default=sdconst.PROCESSING_CHUNKSIZE)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark,sorted(set(args.processes)),args.chunksize)
@@ -32,3 +32,40 @@ def timeit(func=None):
         return inner
     else:
         return func
+
+def benchmark_startup(commands,repeat=5):
+    """Measure 'synda' wall time for light subcommands (i.e. mostly startup time).
+
+    Note
+        Best time of 'repeat' runs is reported (first runs warm up the OS cache).
+    """
+    import os
+    import sys
+    import time
+    import subprocess
+
+    synda=os.path.join(os.path.dirname(os.path.abspath(__file__)),'synda.py')
+
+    print "%-20s %10s"%('command','time (ms)')
+    with open(os.devnull,'w') as devnull:
+        for command in commands:
+            args=command.split()
+            elapsed=[]
+            for i in range(repeat):
+                start=time.time()
+                subprocess.call([sys.executable,synda]+args,stdout=devnull,stderr=devnull)
+                elapsed.append(time.time()-start)
+
+            print "%-20s %10.0f"%(command,min(elapsed)*1000)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b','--benchmark',action='store_true',help="Measure startup time of common 'synda' subcommands")
+    parser.add_argument('-c','--commands',nargs='+',default=['-h','search -h','queue','list','param','param project','check -h'])
+    parser.add_argument('-r','--repeat',type=int,default=5)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_startup(args.commands,args.repeat)
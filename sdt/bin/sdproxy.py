@@ -12,7 +12,11 @@
 """This module contains search-api proxy."""
 
 import time
+import copy
+import threading
+import urlparse
 import argparse
+from multiprocessing.pool import ThreadPool
 import sdapp
 import sdtypes
 from sdexception import SDException
@@ -118,15 +122,34 @@ class SearchAPIProxy():
     def call_web_service__PAGINATION(self,request):
         """
         Notes
-            This function contain paging management (i.e. make web service calls until all results are returned)
+            - This function contain paging management (i.e. make web service calls until all results are returned)
+            - once the first page is retrieved (i.e. 'num_found' is known),
+              remaining pages are retrieved in parallel (see 'max_parallel_page_per_index')
         """
 
         # init
         request.limit=sdconst.SEARCH_API_CHUNKSIZE
         request.offset=0
-        offset = 0
         paginated_response=sdtypes.PaginatedResponse()
-        nread = 0 # how many already read
+        ids=set() # ids of the files already read (used to remove duplicates)
+
+        # first page
+        response=self.call_web_service__PAGE(request)
+        num_found=response.num_found
+        nread=response.count()
+        moredata = (num_found-nread>0) and (nread>0) # the second member is for the case when "num_found > 0" but nothing is returned
+        ingest_page(paginated_response,response,ids) # warning: response is modified here
+
+        if moredata:
+            if sdconfig.max_parallel_page_per_index>1:
+                self.call_web_service__PARALLEL_PAGINATION(request,paginated_response,ids,num_found)
+            else:
+                self.call_web_service__SEQUENTIAL_PAGINATION(request,paginated_response,ids,nread)
+
+        return paginated_response
+
+    def call_web_service__SEQUENTIAL_PAGINATION(self,request,paginated_response,ids,nread):
+        offset = sdconst.SEARCH_API_CHUNKSIZE
         moredata = True
 
         while moredata: # paging loop
@@ -135,10 +158,7 @@ class SearchAPIProxy():
             request.offset=offset
 
             # call
-            if sdconfig.mono_host_retry:
-                response=self.call_web_service__RETRY(request)
-            else:
-                response=self.call_web_service(request)
+            response=self.call_web_service__PAGE(request)
 
             # paging (post-processing)
             offset += sdconst.SEARCH_API_CHUNKSIZE
@@ -147,9 +167,74 @@ class SearchAPIProxy():
 
             moredata = (nleft>0) and (response.count()>0) # the second member is for the case when "num_found > 0" but nothing is returned
 
-            paginated_response.slurp(response) # warning: response is modified here
+            ingest_page(paginated_response,response,ids) # warning: response is modified here
 
-        return paginated_response
+    def call_web_service__PARALLEL_PAGINATION(self,request,paginated_response,ids,num_found):
+        """Retrieve remaining pages in parallel.
+
+        Notes
+            - pages are ingested in offset order
+            - concurrency is bounded per index (i.e. also when many paginated
+              calls run at the same time on the same index, see sdproxy_mt)
+        """
+        offsets=range(sdconst.SEARCH_API_CHUNKSIZE,num_found,sdconst.SEARCH_API_CHUNKSIZE)
+        semaphore=get_index_semaphore(request.get_url())
+
+        def fetch_page(offset):
+            page_request=copy.copy(request) # each page needs its own offset
+            page_request.offset=offset
+
+            with semaphore:
+                response=self.call_web_service__PAGE(page_request)
+
+            response.disconnect() # response is ingested by another thread
+            return response
+
+        pool=ThreadPool(min(sdconfig.max_parallel_page_per_index,len(offsets)))
+        try:
+            for response in pool.imap(fetch_page,offsets): # imap returns pages in offset order
+                response.connect()
+                ingest_page(paginated_response,response,ids) # warning: response is modified here
+        finally:
+            pool.terminate()
+
+    def call_web_service__PAGE(self,request):
+        if sdconfig.mono_host_retry:
+            return self.call_web_service__RETRY(request)
+        else:
+            return self.call_web_service(request)
+
+def ingest_page(paginated_response,response,ids):
+    """Add one page to the paginated response, removing files already read.
+
+    Note
+        Duplicates may occur when the index is modified during the paginated call
+        (e.g. new files published, which shift offsets).
+    """
+    files=response.get_files()
+    new_files=[f for f in files if f.get('id') is None or f['id'] not in ids]
+
+    if len(new_files)<len(files):
+        sdlog.info("SYDPROXY-120","%d duplicate(s) removed from search-API page"%(len(files)-len(new_files),))
+        response.set_files(new_files)
+
+    ids.update(f['id'] for f in new_files if f.get('id') is not None)
+
+    paginated_response.slurp(response)
+
+def get_index_semaphore(url):
+    """Returns the semaphore which bounds the number of concurrent pages retrieved from this index."""
+    host=urlparse.urlparse(url).netloc
+
+    with index_semaphores_lock:
+        if host not in index_semaphores:
+            index_semaphores[host]=threading.BoundedSemaphore(sdconfig.max_parallel_page_per_index)
+        return index_semaphores[host]
+
+# init.
+
+index_semaphores={}
+index_semaphores_lock=threading.Lock()
 
 if __name__ == '__main__':
 
@@ -28,214 +28,202 @@ import sdtrace
 import sdurlutils
 import sdexception
 
-class MetadataThread(threading.Thread):
-    def __init__(self,host,service,query,result_queue,error_queue):
+class SearchWorker(threading.Thread):
+    """Search-API worker thread bound to one index host.
+
+    Note
+        Workers of all hosts share the same work queue, so a query is
+        handed out as soon as a worker is free on any host.
+    """
+
+    def __init__(self,host,service,work_queue,result_queue):
         self.host=host                 # index
         self.service=service           # search-API service (SearchAPIProxy object)
-        self.query=query               # query
-        self.result_queue=result_queue # output queue (global thread-safe Queue PTR)
-        self.error_queue=error_queue   # error queue used by the retry mecanism (global thread-safe Queue PTR)
+        self.work_queue=work_queue     # input queue (tasks to process, None means 'stop')
+        self.result_queue=result_queue # output queue (one outcome per task processed)
+        self.busy=False
 
         threading.Thread.__init__(self)
 
     def run(self):
-        ap=self.query.get('attached_parameters',{})
+        while True:
+            task=self.work_queue.get()
 
-        try:
-            url_with_host_set=self.query['url'].replace(sdconst.IDXHOSTMARK,self.host)
+            if task is None:
+                break
+
+            self.busy=True
+            try:
+                self.result_queue.put(self.process(task))
+            finally:
+                self.busy=False
 
-            #sdlog.debug("SDPROXMT-012","Using %s"%self.host,stderr=False,logfile=True)
+    def process(self,task):
+        """
+        Returns
+            (task,metadata,host) tuple (metadata is None if the query failed)
+        """
+        query=task['query']
+        ap=query.get('attached_parameters',{})
 
+        try:
+            url_with_host_set=query['url'].replace(sdconst.IDXHOSTMARK,self.host)
 
             # BEWARE: printing stuff on stdxxx is NOT welcome here, as we are
             # here running inside a progress bar... so printing on stdxxx
-            # result in a big mess. Maybe enable verbose mode here only if
-            # progress is off, or just output to logfile....
-            # Well, in fact, maybe the better is to move the progress here,
-            # (i.e. as the slow part is the remote call, let's have the progress
-            # close to it, not far upstream !).
-            """
-            verbose=sdsquery.get_scalar(self.query,'verbose',default=False,type_=bool) # we cast here as verbose can be str (set from parameter) or bool (set from '-v' option)
-            if verbose:
-                sdtools.print_stderr("Using %s"%self.host)
-            """
-
+            # result in a big mess.
 
             metadata=self.service.run(url=url_with_host_set,attached_parameters=ap) # service is an instance of SearchAPIProxy
             metadata.disconnect() # TAGKLK434L3K34K
-            self.result_queue.put(metadata)
+
+            return (task,metadata,self.host)
         except Exception, e:
             # note
-            #  - it's not fatal to come here, because error queries will be
-            #    retried later using a different host (well until "max_retry"
-            #    is reached of course)
-
-            self.error_queue.put(self.query)
-
-            # not needed to log here as already done by 'SYDPROXY-400' and 'SYDPROXY-410'
-            #sdlog.info("SDPROXMT-001", "Query failed (url=%s)"%(url_with_host_set,))
-            #sdlog.info("SDPROXMT-006", "%s"%(str(e)),)
-
-            # debug
-            #sdtrace.log_exception()
+            #  - it's not fatal to come here, because error queries are
+            #    retried later (well until "max_retry" is reached of course)
+            #  - not needed to log here as already done by 'SYDPROXY-400' and 'SYDPROXY-410'
+
+            return (task,None,self.host)
+
+class SearchPool():
+    """Fixed-size search-API worker pool (max_thread_per_host workers per index host)."""
+
+    def __init__(self,services):
+        self.work_queue=Queue.Queue()
+        self.result_queue=Queue.Queue()
+        self.timers=[]
+        self.workers=[]
+
+        hosts=services.keys()
+        random.shuffle(hosts) # this is to prevent always starting with the same server
+
+        for i in range(max_thread_per_host):
+            for host in hosts:
+                th=SearchWorker(host,services[host]['iSearchAPIProxy'],self.work_queue,self.result_queue)
+                th.setDaemon(True)
+                th.start()
+                self.workers.append(th)
+
+        sdlog.debug("SDPROXMT-002","Search-API worker pool started (%d worker(s))"%len(self.workers))
+
+    def submit(self,task,delay=0):
+        if delay>0:
+            timer=threading.Timer(delay,self.work_queue.put,[task])
+            timer.setDaemon(True)
+            timer.start()
+            self.timers.append(timer)
+        else:
+            self.work_queue.put(task)
+
+    def get_outcome(self):
+        """Wait until one task is processed.
+
+        Note
+            'get' is called with a timeout so the main thread stays
+            interruptible (e.g. CTRL-C), this does not delay the outcome.
+        """
+        while True:
+            try:
+                return self.result_queue.get(True,1)
+            except Queue.Empty:
+                pass
+
+    def threads_per_host(self):
+        count={}
+        for th in self.workers:
+            count[th.host]=count.get(th.host,0)+(1 if th.busy else 0)
+        return count
+
+    def shutdown(self):
+        for timer in self.timers:
+            timer.cancel()
+        for th in self.workers:
+            self.work_queue.put(None)
 
 def run(i__queries):
-    """This method contains the retry mecanism."""
-
-    # check
-    for q in i__queries:
-        if sdconst.IDXHOSTMARK not in q['url']:
-            raise sdexception.SDException('SDPROXMT-044','Incorrect query: host must not be set at this step')
-
-    # retry loop
-    max_retry=6
-    i=0
+    """Run all queries and merge the results into one Metadata object."""
     metadata=sdtypes.Metadata()
-    l__queries=i__queries
-    while i < max_retry:
-
-        (success,errors)=run_helper(l__queries)
 
+    for success in run_iter(i__queries):
         metadata.slurp(success) # warning: success is modified here
 
-        if len(errors)>0:
-            sdlog.info("SDPROXMT-082","%d search-API queries failed"%(len(errors),))
-            sdlog.info("SDPROXMT-083","retry 'failed search-API queries'")
-            l__queries=errors
-
-            i+=1
-
-            continue
-        else:
-            if i>0:
-                sdlog.info("SDPROXMT-089","retry succeeded")
-
-            break
-
-    if len(errors)>0:
-        sdlog.error("SDPROXMT-084","max retry iteration reached. %d queries did not succeed"%(len(errors),))
-
     return metadata
 
-def start_new_thread(host,url):
-    sdlog.debug("SDPROXMT-002","Starting new search-API thread (%s)"%host)
-
-    service=searchAPIServices[host]["iSearchAPIProxy"]
-
-    th=MetadataThread(host,service,url,__result_queue,__error_queue)
-    th.setDaemon(True)
-    th.start()
-
-    return th
-
-def all_threads_completed():
-    """
-    Returns:
-      True   => all threads completed
-      False  => threads still running
-    """
-    for host in searchAPIServices.keys():
-        for t in searchAPIServices[host]['threadlist']:
-            if t.is_alive():
-                return False
+def run_iter(i__queries):
+    """Run queries in parallel and yield the result of each query as soon as it is available.
 
-    return True
+    Notes
+        - this method contains the retry mecanism (each failed query is
+          retried individually, after a backoff delay)
+        - results are yielded in completion order (not in query order)
 
-def process_query(host,query):
-    """
-    return 
-      True   => query processed
-      False  => query not processed (host is busy)
+    Returns
+        Metadata objects generator (one per successful query)
     """
 
-    if len(searchAPIServices[host]['threadlist'])<max_thread_per_host:
-
-        searchAPIServices[host]['threadlist'].append(start_new_thread(host,query))
-
-        return True
-    else:
-        return False
+    # check
+    for q in i__queries:
+        if sdconst.IDXHOSTMARK not in q['url']:
+            raise sdexception.SDException('SDPROXMT-044','Incorrect query: host must not be set at this step')
 
-def distribute_queries(queries):
+    total_query_to_process=len(i__queries)
+    if total_query_to_process==0:
+        return
 
-    hosts=searchAPIServices.keys()
+    sdlog.debug("SDPROXMT-003","%d search-API queries to process (max_thread_per_host=%d,timeout=%d)"%(total_query_to_process,max_thread_per_host,sdconst.SEARCH_API_HTTP_TIMEOUT))
 
-    random.shuffle(hosts) # this is to prevent always starting with the same server
+    pool=SearchPool(searchAPIServices)
+    try:
+        for q in i__queries:
+            pool.submit({'query':q,'attempt':0})
 
-    for host in hosts:
+        done=0
+        errors=0
+        retried=0
+        last_progress=time.time()
+        while done<total_query_to_process:
+            (task,success,host)=pool.get_outcome()
 
-        if len(queries)<1:
-            break
-        else:
-            query=queries.pop()
+            if success is not None:
+                done+=1
 
-            status=process_query(host,query)
+                if task['attempt']>0:
+                    sdlog.info("SDPROXMT-089","retry succeeded (attempt=%d)"%task['attempt'])
 
-            if not status:
-                # host is busy (thread is running on the host)
-                # so we send back query in the stack
+                success.connect() # TAGKLK434L3K34K
+                yield success
+            else:
+                task['attempt']+=1
 
-                queries.append(query)
+                if task['attempt']>max_retry:
+                    done+=1
+                    errors+=1
+                else:
+                    retried+=1
+                    delay=get_retry_delay(task['attempt'])
 
-def run_helper(queries):
-    """
-    notes
-      - "queries" is non-threadsafe (i.e. not a Queue), but doesn't matter as threads do not use it
-    """
-    total_query_to_process=len(queries)
+                    sdlog.info("SDPROXMT-083","retry failed search-API query in %.1f seconds (attempt=%d,host=%s)"%(delay,task['attempt'],host))
 
-    sdlog.debug("SDPROXMT-003","%d search-API queries to process (max_thread_per_host=%d,timeout=%d)"%(total_query_to_process,max_thread_per_host,sdconst.SEARCH_API_HTTP_TIMEOUT))
+                    pool.submit(task,delay)
 
-    while True:
-        if sdconfig.proxymt_progress_stat:
-            sdlog.info("SDPROXMT-033","threads per host: %s"%",".join(['%s=%s'%(host,len(searchAPIServices[host]['threadlist'])) for host in searchAPIServices.keys()]))
+            # log
+            if time.time()-last_progress>progress_interval and done<total_query_to_process:
+                last_progress=time.time()
 
-        if len(queries)>0:
-            distribute_queries(queries)
-        else:
-            # leave the loop only if all threads completed
-            if all_threads_completed():
-                break
+                sdlog.info("SDPROXMT-004","total_queries=%d, done_queries=%d, retried_queries=%d"%(total_query_to_process,done,retried))
 
-        # remove completed threads from list
-        for host in searchAPIServices.keys():
-            li=[]
-            for t in searchAPIServices[host]['threadlist']:
-                if t.is_alive():
-                    li.append(t)
-            searchAPIServices[host]['threadlist']=li
-
-        # log
-        total_query_already_processed = total_query_to_process - len(queries)
-        if total_query_to_process > 0: # display progress only when there are a lot of queries
-            if len(queries) > 0: # display progress only when still query to process
-                sdlog.info("SDPROXMT-004","total_queries=%d, running_or_done_queries=%d, waiting_queries=%d"%(total_query_to_process,total_query_already_processed,len(queries)))
-
-        # if all services are busy, we sleep to limit loop speed
-        # (note that all the code around the "sleep" call is to detect system overload)
-        sleep_time=10
-        warning_threshold=5 # threshold not to emit warning for every small load exceedance
-        befo=time.time()
-        time.sleep(sleep_time)
-        afte=time.time()
-        diff=afte-befo
-        if diff>sleep_time+warning_threshold:
-            sdlog.warning("SDPROXMT-005","WARNING: system overload detected (sleep takes %d second to complete)."%diff)
-
-    # retrieve result from output queue
-    metadata=sdtypes.Metadata()
-    while not __result_queue.empty():
-        success=__result_queue.get(False) # retrieve result from ONE successful search-API call
-        success.connect() # TAGKLK434L3K34K
-        metadata.slurp(success) # warning: success is modified here
+                if sdconfig.proxymt_progress_stat:
+                    sdlog.info("SDPROXMT-033","threads per host: %s"%",".join(['%s=%s'%(h,c) for (h,c) in pool.threads_per_host().iteritems()]))
 
-    # retrieve error from output queue and insert them into a list
-    errors=[]
-    while not __error_queue.empty():
-        query=__error_queue.get(False)
-        errors.append(query)
+        if errors>0:
+            sdlog.error("SDPROXMT-084","max retry iteration reached. %d queries did not succeed"%(errors,))
+    finally:
+        pool.shutdown()
 
-    return (metadata,errors)
+def get_retry_delay(attempt):
+    """Returns the backoff delay (in seconds) before the given retry attempt."""
+    delay=min(retry_backoff_base*(2**(attempt-1)),retry_backoff_max)
+    return delay+random.uniform(0,delay/2.0) # jitter prevents retries from being sent in bursts
 
 def set_index_hosts(index_hosts):
     global searchAPIServices
@@ -244,14 +232,14 @@ def set_index_hosts(index_hosts):
     for index_host in index_hosts:
         searchAPIServices[index_host]={}
         searchAPIServices[index_host]['iSearchAPIProxy']=sdproxy.SearchAPIProxy() # contains service PTR
-        searchAPIServices[index_host]['threadlist']=[]                            # contains threads PTR
 
 # module init
 
 max_thread_per_host=sdconfig.max_metadata_parallel_download_per_index
-
-__result_queue=Queue.Queue() # thread safe data structure to hold search-API result
-__error_queue=Queue.Queue()  # thread safe data structure to hold unsuccessful request (used by the retry mecanism)
+max_retry=6              # max retry per query
+retry_backoff_base=1     # delay before the first retry (in seconds, doubled at each retry)
+retry_backoff_max=30     # max delay between two retries (in seconds)
+progress_interval=10     # min delay between two progress messages (in seconds)
 
 searchAPIServices=None # list of search-API services (M queries will be sent to one service at once, resulting in MxN parallel streams, with N the number of service)
 
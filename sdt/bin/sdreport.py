@@ -12,16 +12,19 @@
 """This module contains report functions."""
 
 import os
+import time
 import humanize
 from tabulate import tabulate
 import argparse
 import sdapp
 import sdlog
+import sddb
 import sddao
 import sdfiledao
 import sddatasetdao
 from sdprogress import SDProgressDot
 import sdconst
+import sdtelemetry
 import sddatasetquery
 import sddatasetutils
 
@@ -58,9 +61,52 @@ def PROC0005():
     for d in sddatasetutils.get_old_versions_datasets():
         print d.get_full_local_path('output{,1,2}') # note: for non CMIP5-DRS-based-project, product argument is not used
 
+def print_running_transfers_from_stats():
+    """Print running transfers using the daemon stats file.
+
+    Returns
+        False if the stats file is not available (e.g. disabled or outdated)
+    """
+    samples=sdtelemetry.load()
+    if samples is None:
+        return False
+
+    metrics={}
+    for (name,labels,value) in samples:
+        metrics.setdefault(name,[]).append((labels,value))
+
+    timestamp=metrics.get('synda_stats_timestamp_seconds',[({},0)])[0][1]
+    if time.time()-timestamp>3*max(sdtelemetry.interval,1):
+        return False # daemon doesn't update the stats file anymore
+
+    sizes=dict((labels['file_id'],value) for (labels,value) in metrics.get('synda_transfer_size_bytes',[]))
+
+    li=[]
+    for (labels,value) in sorted(metrics.get('synda_transfer_bytes',[]),key=lambda x: x[0]['start_date']):
+        li.append([humanize.naturalsize(value,gnu=False),humanize.naturalsize(sizes.get(labels['file_id'],0),gnu=False),labels['start_date'],labels['filename']])
+
+    if len(li)>0:
+        print tabulate(li,headers=['Current size','Total size','Download start date','Filename'],tablefmt="plain")
+    else:
+        print 'No current download'
+
+    li=[]
+    for (labels,value) in metrics.get('synda_datanode_throughput_bytes_per_second',[]):
+        if value>0:
+            li.append([labels['data_node'],'%s/s'%humanize.naturalsize(value,gnu=False)])
+
+    if len(li)>0:
+        total=metrics['synda_throughput_bytes_per_second'][0][1]
+        li.append(['total','%s/s'%humanize.naturalsize(total,gnu=False)])
+
+        print
+        print tabulate(li,headers=['Data node','Throughput'],tablefmt="plain")
+
+    return True
+
 def print_running_transfers():
     li=[]
-    for tr in sdfiledao.get_files(status=sdconst.TRANSFER_STATUS_RUNNING):
+    for tr in sdfiledao.get_files(status=sdconst.TRANSFER_STATUS_RUNNING,conn=sddb.get_ro_conn()):
         current_size=os.path.getsize(tr.get_full_local_path()) if os.path.isfile(tr.get_full_local_path()) else 0
         li.append([humanize.naturalsize(current_size,gnu=False),humanize.naturalsize(tr.size,gnu=False),tr.start_date,tr.filename])
 
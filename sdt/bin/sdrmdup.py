@@ -24,17 +24,14 @@ import sdapp
 import sdconst
 import sdprint
 import sdpostpipelineutils
-import sdlmattrfilter
 import sdpipelineprocessing
 
 def run(metadata,functional_id_keyname):
-    light_metadata=sdlmattrfilter.run(metadata,[functional_id_keyname,'data_node']) # create light list with needed columns only not to overload system memory
-
     # list of dict => dict (id=>bool)
-    seen=dict(((f[functional_id_keyname],f['data_node']), False) for f in light_metadata.get_files())
+    seen=dict(((f[functional_id_keyname],f['data_node']), False) for f in metadata.iter_columns([functional_id_keyname,'data_node'])) # read needed columns only not to overload system memory
 
     po=sdpipelineprocessing.ProcessingObject(remove,functional_id_keyname,seen)
-    metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+    metadata=sdpipelineprocessing.run_pipeline(metadata,po,deferred=True)
 
     return metadata
 
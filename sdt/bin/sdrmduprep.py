@@ -24,7 +24,6 @@ import sdapp
 import sdconst
 import sdprint
 import sdpostpipelineutils
-import sdlmattrfilter
 import sdpipelineprocessing
 import sdlog
 
@@ -32,16 +31,14 @@ def run(metadata,functional_id_keyname):
 
     sdlog.info("SYNDRMDR-001","Build 'seen' table..")
 
-    light_metadata=sdlmattrfilter.run(metadata,[functional_id_keyname]) # create light list with needed columns only not to overload system memory
-
     # build 'seen' data structure (list of dict => dict (id=>bool))
-    seen=dict((f[functional_id_keyname], False) for f in light_metadata.get_files()) # warning: load list in memory
+    seen=dict((f[functional_id_keyname], False) for f in metadata.iter_columns([functional_id_keyname])) # read needed columns only not to overload system memory
 
 
     sdlog.info("SYNDRMDR-002","Perform duplicate and replicate suppression..")
 
     po=sdpipelineprocessing.ProcessingObject(remove,functional_id_keyname,seen)
-    metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+    metadata=sdpipelineprocessing.run_pipeline(metadata,po,deferred=True)
 
     return metadata
 
@@ -16,18 +16,23 @@ Note
 """
 
 import re
+import time
+import socket
 import argparse
 import sdutils
 from sdexception import SDException
 
-def compute_RTT(remote_host,count=1):
+def compute_RTT(remote_host,count=1,timeout=None):
     """
     Args
         count: how many ping used to compute the average RTT
+        timeout: how long to wait for a reply, in seconds (ping default if None)
     """
     rtt=0.0
 
-    (status,stdout,stderr)=sdutils.get_status_output('ping -q -c %i %s'%(count,remote_host),shell=True)
+    timeout_option='' if timeout is None else ' -W %i'%timeout
+
+    (status,stdout,stderr)=sdutils.get_status_output('ping -q -c %i%s %s'%(count,timeout_option,remote_host),shell=True)
     if status==0:
         m = re.search('.*min/avg/max/mdev = ([0-9.]+)/([0-9.]+)/([0-9.]+)/([0-9.]+) ms.*', stdout,re.MULTILINE|re.DOTALL)
         if m: 
@@ -39,9 +44,30 @@ def compute_RTT(remote_host,count=1):
 
     return rtt
 
+def compute_RTT_TCP(remote_host,port=443,timeout=5):
+    """Returns TCP connection establishment time in ms (i.e. one round trip).
+
+    Note
+        This is used when ICMP is filtered (e.g. by a firewall).
+    """
+    start=time.time()
+    try:
+        sock=socket.create_connection((remote_host,port),timeout)
+    except (socket.error,socket.timeout),e:
+        raise SDException("SYNDARTT-003","TCP connection failed (remote_host=%s,port=%i,error=%s)"%(remote_host,port,str(e)))
+    rtt=(time.time()-start)*1000
+    sock.close()
+
+    return rtt
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
+    parser.add_argument('-t','--tcp',action='store_true',help='Measure TCP connection time instead of ICMP RTT')
+    parser.add_argument('remote_host',nargs='?',default='google.fr')
     args = parser.parse_args()
 
-    rtt=compute_RTT('google.fr')
+    if args.tcp:
+        rtt=compute_RTT_TCP(args.remote_host)
+    else:
+        rtt=compute_RTT(args.remote_host)
     print rtt
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module measures and caches the round trip time to data nodes.
+
+Notes
+    - hosts are probed concurrently (a host which doesn't reply only delays
+      the probes of the same batch by the probe timeout)
+    - probe method is set with 'behaviour.nearest_rtt_probe' ('icmp' uses
+      ping, 'tcp' measures TCP connection time)
+    - results are stored in the 'generic_cache' table ('rtt' realm), so they
+      are shared by all synda processes, and expire after 'behaviour.nearest_rtt_cache_ttl' seconds
+    - the daemon refreshes cached values in the background (see 'RTTRefreshThread')
+    - unreachable hosts are stored with a high RTT, so they are not probed
+      again on each call
+"""
+
+import time
+import json
+import sqlite3
+import argparse
+import threading
+import multiprocessing.pool
+import sdapp
+import sdconfig
+import sdlog
+import sddb
+import sddao
+import sdrtt
+from sdexception import SDException
+
+class RTTRefreshThread(threading.Thread):
+    """Refresh cached RTT values before they expire (used by the daemon)."""
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+
+    def run(self):
+        conn=sqlite3.connect(sdconfig.db_file,120) # sqlite connection can't be shared between threads
+        sddb.set_pragmas(conn)
+
+        while quit==0:
+
+            # exit event aware sleep
+            for i in range(refresh_interval/10):
+                if quit==1:
+                    break
+                time.sleep(10)
+
+            if quit==1:
+                break
+
+            try:
+                refresh(conn)
+            except Exception,e:
+                sdlog.error("SDRTTPRB-003","Error occured during RTT refresh (%s)"%str(e))
+
+        conn.close()
+
+def get_RTTs(hosts,conn=sddb.conn):
+    """Returns host=>rtt dict (in ms).
+
+    Note
+        Hosts without a valid cached value are probed concurrently.
+    """
+    rtts={}
+    missing=[]
+
+    entries=get_entries(conn)
+    for host in set(hosts):
+        entry=entries.get(host)
+        if entry is not None and get_age(entry)<ttl:
+            rtts[host]=entry['rtt']
+        else:
+            missing.append(host)
+
+    if len(missing)>0:
+        rtts_=probe_all(missing)
+        store(rtts_,conn)
+        rtts.update(rtts_)
+
+    return rtts
+
+def refresh(conn=sddb.conn):
+    """Probe again cached hosts whose value will soon expire."""
+    hosts=[host for (host,entry) in get_entries(conn).iteritems() if get_age(entry)>ttl/2]
+
+    if len(hosts)>0:
+        sdlog.info("SDRTTPRB-004","Refresh RTT (%d host(s))"%len(hosts))
+        store(probe_all(hosts),conn)
+
+def probe_all(hosts):
+    """Returns host=>rtt dict."""
+    pool=multiprocessing.pool.ThreadPool(min(len(hosts),max_concurrent_probes))
+    try:
+        rtts=pool.map(probe,hosts)
+    finally:
+        pool.close()
+        pool.join()
+
+    return dict(zip(hosts,rtts))
+
+def probe(host):
+    sdlog.info("SDRTTPRB-001","Compute RTT for '%s' host (probe=%s)."%(host,probe_method))
+
+    try:
+        if probe_method=='tcp':
+            return sdrtt.compute_RTT_TCP(host,port=tcp_probe_port,timeout=probe_timeout)
+        elif probe_method=='icmp':
+            return sdrtt.compute_RTT(host,timeout=probe_timeout)
+        else:
+            raise SDException("SDRTTPRB-005","Incorrect RTT probe method (%s)"%probe_method)
+    except SDException,e:
+        if e.code in ('SYNDARTT-002','SYNDARTT-003'):
+            # when here, it means no response from host
+
+            sdlog.info("SDRTTPRB-002","No reply from '%s' host (probe=%s)."%(host,probe_method))
+
+            # in this case, we return a high RTT to prevent using this host
+
+            return unreachable_rtt
+        else:
+            raise
+
+def get_entries(conn):
+    """Returns host=>entry dict (only entries measured with the current probe method)."""
+    entries={}
+    for (host,value) in sddao.get_generic_cache_values(realm,conn=conn).iteritems():
+        entry=json.loads(value)
+        if entry['probe']==probe_method:
+            entries[host]=entry
+    return entries
+
+def get_age(entry):
+    return time.time()-entry['date']
+
+def store(rtts,conn):
+    for (host,rtt) in rtts.iteritems():
+        value=json.dumps({'rtt':rtt,'date':time.time(),'probe':probe_method})
+        sddao.set_generic_cache_value(realm,host,value,commit=False,conn=conn)
+    conn.commit()
+
+# init.
+
+realm='rtt'
+
+probe_method=sdconfig.config.get('behaviour','nearest_rtt_probe') # icmp | tcp
+ttl=sdconfig.config.getint('behaviour','nearest_rtt_cache_ttl')    # seconds
+
+probe_timeout=5            # seconds
+tcp_probe_port=443
+max_concurrent_probes=16
+unreachable_rtt=20000.0    # 20 seconds
+
+refresh_interval=600       # seconds (daemon refresh thread period)
+
+quit=0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('hosts',nargs='+')
+    parser.add_argument('-f','--force',action='store_true',help='Ignore cached values')
+    args = parser.parse_args()
+
+    if args.force:
+        rtts=probe_all(args.hosts)
+        store(rtts,sddb.conn)
+    else:
+        rtts=get_RTTs(args.hosts)
+
+    for host in args.hosts:
+        print '%s %.1f'%(host,rtts[host])
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the on-disk search-API response cache.
+
+Notes
+    - one entry per search-API call (i.e. per page, as 'limit' and 'offset' are part of the url)
+    - entries are named after the sha1 of the normalized url, and are stored
+      as zlib compressed json
+    - the index host is part of the key (federated indexes may not be in
+      sync, so responses from different indexes may differ)
+    - file mtime is used as last access time (LRU eviction), creation time is
+      stored in the entry (TTL)
+    - entries are written in a temporary file, then renamed, so concurrent
+      synda processes never read a partially written entry
+    - eviction only runs when the cache size (counted since the first 'put'
+      of the process) exceeds the limit
+    - ESGF search-API doesn't send validators (ETag, Last-Modified), so
+      expired entries are not revalidated but simply refetched
+"""
+
+import os
+import time
+import json
+import zlib
+import uuid
+import urllib
+import urlparse
+import hashlib
+import argparse
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sdtypes
+
+def get(url,lowmem=False):
+    """Returns cached Response object for this url, or None."""
+    if mode!=sdconst.SEARCH_API_CACHE_MODE_ON or ttl<=0:
+        return None
+
+    path=get_entry_path(url)
+
+    try:
+        with open(path,'rb') as fh:
+            entry=json.loads(zlib.decompress(fh.read()))
+    except (IOError,OSError):
+        return None # cache miss
+    except Exception,e:
+        sdlog.warning("SDSACACH-001","Corrupted cache entry removed (url=%s,exception=%s)"%(url,str(e)))
+        remove_entry(path)
+        return None
+
+    if time.time()-entry['created']>ttl:
+        return None # expired (entry will be replaced by the next put)
+
+    try:
+        os.utime(path,None) # LRU
+    except OSError:
+        pass
+
+    sdlog.debug("SDSACACH-002","Cache hit (url=%s)"%url)
+
+    return sdtypes.Response(files=entry['files'],num_found=entry['num_found'],call_duration=0,lowmem=lowmem)
+
+def put(url,response):
+    global cache_size
+
+    if mode==sdconst.SEARCH_API_CACHE_MODE_OFF or ttl<=0:
+        return
+
+    entry={'url':url,'created':time.time(),'num_found':response.num_found,'files':response.get_files()} # get_files() here loads list in memory, but Response never exceed SEARCH_API_CHUNKSIZE
+    buf=zlib.compress(json.dumps(entry))
+
+    if not os.path.isdir(cache_folder):
+        try:
+            os.makedirs(cache_folder)
+        except OSError:
+            pass # created by a concurrent process
+
+    path=get_entry_path(url)
+    tmp_path='%s.%s.tmp'%(path,uuid.uuid4())
+    try:
+        with open(tmp_path,'wb') as fh:
+            fh.write(buf)
+        os.rename(tmp_path,path)
+    except (IOError,OSError),e:
+        sdlog.warning("SDSACACH-003","Cannot write cache entry (url=%s,exception=%s)"%(url,str(e)))
+        remove_entry(tmp_path)
+        return
+
+    if cache_size is None:
+        cache_size=get_cache_size()
+    else:
+        cache_size+=len(buf) # may overestimate (e.g. replaced entry), which only makes eviction run earlier
+
+    if cache_size>max_size:
+        evict()
+
+def get_cache_size():
+    size=0
+    for name in os.listdir(cache_folder):
+        try:
+            size+=os.path.getsize(os.path.join(cache_folder,name))
+        except OSError:
+            pass # removed by a concurrent process
+    return size
+
+def evict():
+    """Remove least recently used entries until the cache size is under the limit.
+
+    Note
+        entries are removed until the cache size is below 90% of the limit,
+        so the eviction doesn't run again at each 'put'.
+    """
+    global cache_size
+
+    entries=[]
+    total_size=0
+    for name in os.listdir(cache_folder):
+        path=os.path.join(cache_folder,name)
+        try:
+            st=os.stat(path)
+        except OSError:
+            continue # removed by a concurrent process
+
+        entries.append((st.st_mtime,st.st_size,path))
+        total_size+=st.st_size
+
+    cache_size=total_size
+
+    if total_size<=max_size:
+        return
+
+    count=0
+    for (mtime,size,path) in sorted(entries):
+        remove_entry(path)
+        total_size-=size
+        count+=1
+
+        if total_size<=max_size*0.9:
+            break
+
+    cache_size=total_size
+
+    sdlog.debug("SDSACACH-004","%d cache entries evicted"%count)
+
+def clear():
+    if os.path.isdir(cache_folder):
+        for name in os.listdir(cache_folder):
+            remove_entry(os.path.join(cache_folder,name))
+
+def remove_entry(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def get_entry_path(url):
+    return os.path.join(cache_folder,'%s.json.z'%hashlib.sha1(normalize_url(url)).hexdigest())
+
+def normalize_url(url):
+    """Returns url in canonical form (sorted parameters)."""
+    (scheme,netloc,path,query,fragment)=urlparse.urlsplit(url)
+
+    parameters=sorted(urlparse.parse_qsl(query,keep_blank_values=True))
+
+    return urlparse.urlunsplit(('',netloc,path,urllib.urlencode(parameters),''))
+
+def set_mode(mode_):
+    global mode
+    mode=mode_
+
+# init.
+
+mode=sdconst.SEARCH_API_CACHE_MODE_ON
+
+cache_folder=os.path.join(sdconfig.tmp_folder,'search_api_cache')
+ttl=sdconfig.config.getint('index','search_api_cache_ttl')                   # seconds (0 disables the cache)
+max_size=sdconfig.config.getint('index','search_api_cache_max_size')*1024*1024 # bytes
+cache_size=None # bytes (None until the first 'put')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c','--clear',action='store_true',help='Remove all cache entries')
+    parser.add_argument('-n','--normalize',metavar='URL',help='Print normalized url')
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+    elif args.normalize:
+        print normalize_url(args.normalize)
@@ -12,7 +12,6 @@
 """This module contains shrink test routines."""
 
 import sdconfig
-import sdlmattrfilter
 import sdpostpipelineutils
 import sdlog
 
@@ -34,10 +33,8 @@ def nearest_flag_set_on_all_files(metadata):
     """This func checks that all files have the 'nearest' flag (as sdnearestpost processing type is 'interfile', we need ALL files to be flagged)."""
     status=True
 
-    # create light list with needed columns only not to overload system memory
-    light_metadata=sdlmattrfilter.run(metadata,['attached_parameters']) # we keep 'attached_parameters' because it contains 'nearest' flag we are interested in
-
-    for f in light_metadata.get_files(): # load complete list in memory
+    # read needed columns only not to overload system memory
+    for f in metadata.iter_columns(['attached_parameters']): # we keep 'attached_parameters' because it contains 'nearest' flag we are interested in
         nearest=sdpostpipelineutils.get_attached_parameter(f,'nearest','false')
         if nearest=='false': # one false wins
             status=False
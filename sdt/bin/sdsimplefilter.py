@@ -20,13 +20,13 @@ import sdpipelineprocessing
 def run(metadata,filter_name,filter_value,mode):
     if mode=='keep':
         po=sdpipelineprocessing.ProcessingObject(keep_matching_files,filter_name,filter_value)
-        metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+        metadata=sdpipelineprocessing.run_pipeline(metadata,po,deferred=True)
     elif mode=='remove':
         po=sdpipelineprocessing.ProcessingObject(remove_matching_files,filter_name,filter_value)
-        metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+        metadata=sdpipelineprocessing.run_pipeline(metadata,po,deferred=True)
     elif mode=='remove_substr':
         po=sdpipelineprocessing.ProcessingObject(remove_matching_files_substr,filter_name,filter_value)
-        metadata=sdpipelineprocessing.run_pipeline(metadata,po)
+        metadata=sdpipelineprocessing.run_pipeline(metadata,po,deferred=True)
     else:
         raise SDException("SDSIMPLF-002","Incorrect mode (%s)"%mode)
 
@@ -105,6 +105,51 @@ def insert(instance,columns_subset,commit,conn):
 
     return id_
 
+def insert_many(instances,columns_subset,commit,conn):
+    """This func insert many rows in table using placeholders (same table for all instances).
+
+    Note:
+        Row ids are not returned.
+    """
+    if len(instances)==0:
+        return
+
+    # generate SQL
+    tablename=get_tablename(instances[0])
+    columns=', '.join(columns_subset)
+    placeholders=':'+', :'.join(columns_subset)
+    query='INSERT INTO %s (%s) VALUES (%s)' % (tablename,columns, placeholders)
+
+    # EXEC
+    c = conn.cursor()
+    c.executemany(query, (dict((k,instance.__dict__[k]) for k in columns_subset) for instance in instances)) # placeholders resolution take place here
+    c.close()
+
+    if commit:
+        conn.commit()
+
+def select_in(c,query,values,params=[]):
+    """This func runs a select query for many values at once ('IN' clause).
+
+    Args
+        query: SQL query with one '%s' for the 'IN' list placeholders (e.g. "select * from file where file_id in (%s)")
+        params: additional parameters (placed after the 'IN' list values)
+
+    Returns
+        rows generator
+
+    Note:
+        Values are split in chunks, to stay below sqlite max host parameters.
+    """
+    for i in range(0,len(values),in_chunksize):
+        chunk=values[i:i+in_chunksize]
+        c.execute(query%",".join(["?"]*len(chunk)),chunk+list(params))
+
+        rs=c.fetchone()
+        while rs!=None:
+            yield rs
+            rs=c.fetchone()
+
 def update(instance,columns_subset_without_pk,commit,conn):
     """This func update data in table using placeholders.
 
@@ -151,6 +196,10 @@ def update(instance,columns_subset_without_pk,commit,conn):
 
     return rowcount
 
+# init.
+
+in_chunksize=500 # stay below sqlite max host parameters (999 by default)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('teststring')
@@ -136,9 +136,10 @@ def run(subparsers):
     subparser.add_argument('-p','--password',help='ESGF password')
     subparser.add_argument('-x','--force_renew_ca_certificates',action='store_true',help='Force renew CA certificates')
 
-    subparser=create_subparser(subparsers,'check',no_default=False,help='Perform check over ESGF metadata',example=sdcliex.check(),description=sddescription.check())
+    subparser=create_subparser(subparsers,'check',no_default=False,help='Perform check over ESGF metadata or local database',example=sdcliex.check(),description=sddescription.check())
+    sdcommonarg.add_search_api_cache_options(subparser)
     sdcommonarg.add_playback_record_options(subparser)
-    add_action_argument(subparser,choices=['dataset_version','file_variable','selection'])
+    add_action_argument(subparser,choices=['dataset_version','file_variable','selection','status_counters'])
     add_parameter_argument(subparser)
     subparser.add_argument('-F','--output_format',help='Set output format',default='text',choices=['text','pdf'])
     subparser.add_argument('-o','--outfile',default='/tmp/dataset_version_report.pdf')
@@ -149,6 +150,7 @@ def run(subparsers):
     subparser=create_subparser(subparsers,'contact',common_option=False,help='Print contact information')
 
     subparser=create_subparser(subparsers,'count',help='Count file / dataset',example=sdcliex.count())
+    sdcommonarg.add_search_api_cache_options(subparser)
     subparser.add_argument('-i','--index_host',help='Retrieve parameters from the specified index')
     add_parameter_argument(subparser)
     add_timestamp_boundaries(subparser,hidden=False)
@@ -158,6 +160,7 @@ def run(subparsers):
     add_action_argument(subparser,choices=['start','stop','status'])
 
     subparser=create_subparser(subparsers,'dump',help='Display raw metadata',example=sdcliex.dump())
+    sdcommonarg.add_search_api_cache_options(subparser)
     add_parameter_argument(subparser)
     sdcommonarg.add_type_grp(subparser)
     add_dump_option(subparser)
@@ -193,6 +196,7 @@ def run(subparsers):
     subparser=create_subparser(subparsers,'history',common_option=False,help='Show history')
 
     subparser=create_subparser(subparsers,'install',help='Download dataset (async)',note=sdi18n.m0022,example=sdcliex.install())
+    sdcommonarg.add_search_api_cache_options(subparser)
     add_ni_option(subparser)
     add_parameter_argument(subparser)
     add_incremental_mode_argument(subparser,'install')
@@ -240,6 +244,7 @@ def run(subparsers):
     subparser=create_subparser(subparsers,'retry',common_option=False,help='Retry transfer (switch status from error to waiting)')
 
     subparser=create_subparser(subparsers,'search',help='Search dataset',example=sdcliex.search('synda search'))
+    sdcommonarg.add_search_api_cache_options(subparser)
     add_parameter_argument(subparser)
     subparser.add_argument('-e','--explode',action='store_true',help=argparse.SUPPRESS) # explode id into individual facets (hidden option mainly used for debug)
     subparser.add_argument('-l','--limit',type=int,default=sdconfig.get_default_limit('search'),help=sdi18n.m0024)
@@ -250,12 +255,14 @@ def run(subparsers):
     subparser=create_subparser(subparsers,'selection',common_option=False,help='List selection files')
 
     subparser=create_subparser(subparsers,'show',help='Display detailed information about dataset',example=sdcliex.show())
+    sdcommonarg.add_search_api_cache_options(subparser)
     add_parameter_argument(subparser)
     add_lsearch_option(subparser)
     #sdcommonarg.add_type_grp(subparser) # disabled as type depend on user input (e.g. file_functional_id, dataset_functional_id, etc..)
     add_verbose_option(subparser)
 
     subparser=create_subparser(subparsers,'stat',help='Display summary information about dataset',example=sdcliex.stat())
+    sdcommonarg.add_search_api_cache_options(subparser)
     add_parameter_argument(subparser)
     add_incremental_mode_argument(subparser,'stat')
     add_timestamp_boundaries(subparser,hidden=True) # hidden option mainly used for test and debug
@@ -269,6 +276,7 @@ def run(subparsers):
     subparser.add_argument('-p','--project',help='Retrieve project specific parameters for the specified project')
 
     subparser=create_subparser(subparsers,'upgrade',selection=False,no_default=False,help="Run 'install' command on all selection files")
+    sdcommonarg.add_search_api_cache_options(subparser)
     add_parameter_argument(subparser)
     add_ni_option(subparser)
     add_incremental_mode_argument(subparser,'upgrade')
@@ -282,6 +290,7 @@ def run(subparsers):
     subparser.add_argument('-S','--standard_name',action='store_true')
 
     subparser=create_subparser(subparsers,'version',help='List all versions of a dataset',example=sdcliex.version())
+    sdcommonarg.add_search_api_cache_options(subparser)
     add_parameter_argument(subparser)
     #sdcommonarg.add_type_grp(subparser) # disabled as type depend on user input (e.g. file_functional_id, dataset_functional_id, etc..)
 
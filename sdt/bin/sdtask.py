@@ -26,9 +26,39 @@ import sdlog
 import sddb
 import sddeletefile
 import sdtrace
-from sdexception import NoTransferWaitingException,FatalException,RemoteException
+import sdwaitingqueue
+import sdtelemetry
+import sdconcurrency
+from sdexception import FatalException,RemoteException
 from sdtypes import File
 
+class RunningTransfers():
+    """In-memory running transfers counters.
+
+    Notes
+        - this prevents querying the database at each scheduler loop.
+        - 'running' transfers are reset to 'waiting' at daemon startup (see
+          'cleanup_running_transfer' func), so counters start at zero.
+    """
+
+    def __init__(self):
+        self.transfers={} # file_id => data_node
+
+    def add(self,tr):
+        self.transfers[tr.file_id]=tr.data_node
+
+    def remove(self,tr):
+        self.transfers.pop(tr.file_id,None)
+
+    def count(self):
+        return len(self.transfers)
+
+    def count_by_datanode(self):
+        counts={}
+        for data_node in self.transfers.values():
+            counts[data_node]=counts.get(data_node,0)+1
+        return counts
+
 @sdprofiler.timeit
 def delete_transfers():
     sddeletefile.delete_transfers(limit=100)
@@ -68,7 +98,31 @@ def transfers_end():
     this function.
     """
 
-    dmngr.transfers_end()
+    try:
+        transfers=dmngr.transfers_end()
+    except FatalException,e:
+        # batch has been saved before the fatal error occured
+        account_ended_transfers(getattr(e,'transfers',[]))
+        raise
+
+    account_ended_transfers(transfers)
+
+def account_ended_transfers(transfers):
+    for tr in transfers:
+        running_transfers.remove(tr)
+        rtr=sdtelemetry.transfer_ended(tr)
+        sdconcurrency.transfer_ended(tr,rtr)
+
+        # transfer to be retried (e.g. 'next url' feature)
+        if tr.status==sdconst.TRANSFER_STATUS_WAITING:
+            waiting_queue.add(tr.file_id,tr.data_node,tr.priority,tr.checksum)
+
+def update_telemetry():
+    sdtelemetry.update(waiting_queue,sdconcurrency.get_limits())
+    sdconcurrency.update(running_transfers.count_by_datanode())
+
+def transfer_running_count():
+    return running_transfers.count()
 
 def prepare_transfer(tr):
 
@@ -131,53 +185,84 @@ def pre_transfer_check_list(tr):
 def transfers_begin():
     transfers=[]
 
+    waiting_queue.sync()
+
     # how many new transfers can be started:
-    new_transfer_count=max_transfer - sdfilequery.transfer_running_count()
+    new_transfer_count=max_transfer - running_transfers.count()
     # datanode_count[datanode], is number of running transfers for a data node:
-    datanode_count = sdfilequery.transfer_running_count_by_datanode()
+    datanode_count = {dn:0 for dn in waiting_queue.datanodes()}
+    datanode_count.update(running_transfers.count_by_datanode())
     if new_transfer_count>0:
-        transfers_needed = new_transfer_count
-        for i in range(new_transfer_count):
-            for datanode in datanode_count.keys():
-                try:
-                    # Handle per-datanode maximum number of transfers:
-                    try:
-                        new_count = max_datanode_count - datanode_count[datanode]
-                    except KeyError:
-                        sdlog.info("SYNDTASK-189","key error on datanode %s, legal keys are %s"%
-                                   (datanode,datanode_count.keys()) )
-                        new_count = max_datanode_count
-                    if new_count<=0:
-                        continue
-
-                    tr=sddao.get_one_waiting_transfer( datanode )
-
-                    prepare_transfer(tr)
-
-                    if pre_transfer_check_list(tr):
-                        sdfiledao.update_file(tr)
-                        transfers.append(tr)
-
-                    if datanode in datanode_count:
-                        datanode_count[datanode] += 1
-                    else:
-                        datanode_count[datanode] = 1
-                    transfers_needed -= 1
-                    if transfers_needed <= 0:
-                        break
-                except NoTransferWaitingException, e:
-                    pass
-            if transfers_needed <= 0:
-                break
+
+        # Handle per-datanode maximum number of transfers (fixed, or adaptive
+        # if 'adaptive_concurrency' is set, see 'sdconcurrency'):
+        limits={}
+        for datanode in datanode_count.keys():
+            new_count = min(sdconcurrency.get_limit(datanode) - datanode_count[datanode], new_transfer_count)
+            if new_count>0:
+                limits[datanode]=new_count
+
+        # pick transfers from the waiting transfers index, one data node at a
+        # time (round-robin), so that transfers are spread over data nodes
+        datanodes=limits.keys()
+        file_ids=[]
+        while len(file_ids)<new_transfer_count and len(datanodes)>0:
+            for datanode in datanodes[:]:
+                if len(file_ids)>=new_transfer_count:
+                    break
+
+                file_id=waiting_queue.pop(datanode)
+                if file_id is None:
+                    datanodes.remove(datanode)
+                    continue
+
+                file_ids.append(file_id)
+                limits[datanode]-=1
+                if limits[datanode]==0:
+                    datanodes.remove(datanode)
+
+        # retrieve candidate transfers in one query
+        waiting_transfers=sddao.get_waiting_transfers(file_ids)
+
+        for file_id in file_ids:
+            if file_id not in waiting_transfers:
+                # index is out of sync with the database (e.g. transfer modified by another process)
+                sdlog.info("SYNDTASK-210","Transfer not waiting anymore, waiting transfers index will be reloaded (file_id=%i)"%file_id)
+                waiting_queue.reload_requested=True
+                continue
+
+            tr=waiting_transfers[file_id]
+
+            prepare_transfer(tr)
+
+            if pre_transfer_check_list(tr):
+                transfers.append(tr)
+
+        # mark all transfers as running in one transaction
+        sdfiledao.update_files(transfers)
+
+        for tr in transfers:
+            running_transfers.add(tr)
 
     dmngr.transfers_begin(transfers)
 
+    for tr in transfers:
+        sdtelemetry.transfer_started(tr) # after 'transfers_begin', as transfer start may be delayed (see 'sddmdefault.get_start_delay')
+
 def get_download_manager():
-    download_manager='globustransfer_dm' if sdconfig.config.getboolean('module','globustransfer') else 'default_dm'
+    if sdconfig.config.getboolean('module','globustransfer'):
+        download_manager='globustransfer_dm'
+    elif sdconfig.config.get('download','http_engine')=='native':
+        download_manager='http_dm'
+    else:
+        download_manager='default_dm'
 
     if download_manager=='globustransfer_dm':
         import sddmgo
         return sddmgo
+    elif download_manager=='http_dm':
+        import sddmhttp
+        return sddmhttp
     elif download_manager=='default_dm':
         import sddmdefault
         return sddmdefault
@@ -193,7 +278,8 @@ def fatal_exception():
 # init.
 
 max_transfer=sdconfig.config.getint('download','max_parallel_download')
-max_datanode_count = sdconfig.config.getint('download','max_parallel_download_per_datanode')
 lfae_mode=sdconfig.config.get('behaviour','lfae_mode')
 
 dmngr=get_download_manager()
+running_transfers=RunningTransfers()
+waiting_queue=sdwaitingqueue.WaitingQueue()
@@ -21,6 +21,7 @@ import time
 import sdapp
 import sdconfig
 import sdwatchdog
+import sdrttprobe
 import sddao
 import sdfiledao
 import sdconst
@@ -31,6 +32,9 @@ import sdtask
 import sdprofiler
 import sdfilequery
 import sdsqlutils
+import sdworkerutils
+import sdtelemetry
+import sdconcurrency
 from sdexception import FatalException,SDException,OpenIDNotSetException
 from sdtime import SDTimer
 
@@ -48,6 +52,8 @@ def terminate(signal,frame):
         return
 
     sdwatchdog.quit=1
+    sdrttprobe.quit=1
+    sdconcurrency.quit=1
     quit=1
 
 
@@ -69,6 +75,36 @@ def terminate(signal,frame):
 
     sdlog.info("SDTSCHED-006","Waiting for the daemon to stop..")
 
+def wakeup(signal,frame):
+    """Wake up the scheduler (e.g. when new transfers have been added by another process)."""
+    sdworkerutils.wakeup.set()
+
+def reload_configuration(signal,frame):
+    """Re-read log verbosity level (e.g. after sdt.conf modification)."""
+    global reload_requested
+
+    reload_requested=True
+    sdworkerutils.wakeup.set()
+
+def resync(signal,frame):
+    """Reload the waiting transfers index and wake up the scheduler (e.g. when transfers have been modified by another process)."""
+    sdtask.waiting_queue.reload_requested=True
+    sdworkerutils.wakeup.set()
+
+def restart_interrupted_syscalls():
+    """Prevent notification signals from interrupting system calls.
+
+    Note
+        In Python 2, 'signal.signal()' makes system calls interrupted by the
+        signal fail with EINTR (e.g. blocking socket reads in transfer
+        threads). As notification signals are sent by each 'synda
+        install/remove' command, interrupted system calls are restarted
+        instead. This must be called after the signal handlers are installed.
+    """
+    import signal
+    for sig in (signal.SIGUSR1,signal.SIGUSR2,signal.SIGHUP):
+        signal.siginterrupt(sig,False)
+
 def cleanup_running_transfer():
     """This handle zombie cases (transfers with 'running' status, but not running).
 
@@ -120,6 +156,15 @@ def start_watchdog():
     frozenCheckerThread.setDaemon(True)
     frozenCheckerThread.start()
 
+def start_rtt_refresh():
+    """Starting data nodes RTT refresh (used by 'nearest' filter in 'rtt' mode)."""
+
+    sdlog.info("SDTSCHED-994","Starting RTT refresh..")
+
+    rttRefreshThread=sdrttprobe.RTTRefreshThread()
+    rttRefreshThread.setDaemon(True)
+    rttRefreshThread.start()
+
 def cleanup():
     # this func is only used in 'nohup' execution mode
 
@@ -151,19 +196,28 @@ def run_soft_tasks():
 
 @sdprofiler.timeit
 def can_leave():
-    return sdfilequery.transfer_running_count()==0 and sdtask.can_leave()
+    return sdtask.transfer_running_count()==0 and sdtask.can_leave()
+
+def get_loop_sleep():
+    """Returns maximum idle time (the stats file must be rewritten every 'daemon.stats_interval' seconds)."""
+    if sdtelemetry.is_enabled():
+        return min(main_loop_sleep,sdtelemetry.interval)
+    else:
+        return main_loop_sleep
 
 def event_loop():
-    global scheduler_state
+    global scheduler_state,reload_requested
 
     sdlog.info("SDTSCHED-533","Connected to %s"%sdconfig.db_file,stderr=True)
 
     scheduler_state=2
     start_watchdog()
+    if sdconfig.config.get('behaviour','nearest_mode')=='rtt':
+        start_rtt_refresh()
     cleanup_running_transfer()
     clear_failed_url()
-    if sdconst.GET_FILES_CACHING:
-        sdfiledao.highest_waiting_priority( True, True ) #initializes cache of max priorities
+    sdtask.waiting_queue.load()
+    sdconcurrency.load()
     scheduler_state=1
 
     if sdconfig.download:
@@ -202,8 +256,13 @@ def event_loop():
 
     while True:
         evlp0 = SDTimer.get_time()
+        loop_start=time.time()
         assert os.path.isfile(sdconfig.daemon_pid_file)
 
+        if reload_requested:
+            reload_requested=False
+            sdlog.reload()
+
         if quit==0:
             run_soft_tasks()
 
@@ -219,24 +278,34 @@ def event_loop():
                 sdlog.info("SDTSCHED-003","Running transfer processing completed",stderr=False)
                 break
 
-        time.sleep(main_loop_sleep)
+        sdtelemetry.record_loop_duration(time.time()-loop_start)
+        sdtask.update_telemetry()
+
+        # wait until something happens (transfer completion, new transfers
+        # enqueued..) or until main_loop_sleep timeout expires
+        sdworkerutils.wakeup.wait(get_loop_sleep())
 
         #sdlog.debug("SDTSCHED-400","end of event loop")
         evlp1 = SDTimer.get_elapsed_time( evlp0, show_microseconds=True )
-        sdlog.info("SDTSCHED-400","%s time for once through event loop"%(evlp1))
+        sdlog.info_throttled("SDTSCHED-400","%s time for once through event loop"%(evlp1),interval=60)
 
     print
     evlp1 = SDTimer.get_elapsed_time( evlp0, show_microseconds=True )
     sdlog.info("SDTSCHED-401","%s time for once through event loop"%(evlp1))
+    sdtelemetry.remove_stats_file()
     sdlog.info("SDTSCHED-901","Scheduler successfully stopped",stderr=True)
 
 # module init.
 
 quit=0 # 0 => start, 1 => stop
 scheduler_state=0 # 0 => stopped, 1 => running, 2 => starting
-# jfp Previously wwe had main_loop_sleep=9.  1 gives much better throughput if there are many
-# parallel downloads.  0 might cause a lot of spinning in low-volume use...
-main_loop_sleep=1
+reload_requested=False # set on SIGHUP
+# The scheduler is woken up as soon as a transfer completes (see
+# sdworkerutils.wakeup) or when new transfers are enqueued (SIGUSR1, see
+# sdutils.notify_daemon), so main_loop_sleep is only the maximum idle time
+# (i.e. used to process events not bound to a notification, such as Globus
+# transfers completion or post-processing events).
+main_loop_sleep=10
 sdlog.set_default_logger(sdconst.LOGGER_CONSUMER)
 
 if sdconfig.prevent_daemon_and_ihm:
@@ -264,6 +333,10 @@ if __name__ == '__main__':
     import signal
     signal.signal(signal.SIGINT, terminate)   
     signal.signal(signal.SIGTERM, terminate)   
+    signal.signal(signal.SIGUSR1, wakeup)
+    signal.signal(signal.SIGUSR2, resync)
+    signal.signal(signal.SIGHUP, reload_configuration)
+    restart_interrupted_syscalls()
 
     import atexit
     atexit.register(cleanup) # unexpected exit AND normal exit (during normal exit, cleanup is called twice, that's normal)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the daemon live telemetry.
+
+Notes
+    - counters are kept in memory by the daemon and periodically written in
+      the stats file (Prometheus text format), so they can be read without
+      querying the database (e.g. 'synda watch', node_exporter textfile collector)
+    - the stats file is rewritten every 'daemon.stats_interval' seconds by
+      the scheduler event loop (0 disables the stats file)
+    - bytes in flight are measured from the local file size of each running
+      transfer, and data node throughput is computed over the last
+      'throughput_window' seconds
+    - counters are also updated when the stats file is disabled, as they are
+      used by 'sdconcurrency'
+"""
+
+import os
+import re
+import time
+import uuid
+import argparse
+import collections
+import sdapp
+import sdconfig
+import sdlog
+
+class RunningTransfer():
+
+    def __init__(self,tr):
+        self.file_id=tr.file_id
+        self.data_node=tr.data_node
+        self.filename=tr.filename
+        self.local_path=tr.get_full_local_path()
+        self.size=tr.size
+        self.start_date=tr.start_date
+        self.start_time=time.time()+getattr(tr,'start_delay',0) # transfer start may be delayed by the download manager
+        self.bytes=0                 # last measured local file size
+        self.first_byte_delay=None   # seconds (None until the first byte is received)
+
+class Summary():
+    """Duration summary (i.e. Prometheus summary without quantiles)."""
+
+    def __init__(self):
+        self.count=0
+        self.sum=0.0
+        self.last=0.0
+
+    def add(self,duration):
+        self.count+=1
+        self.sum+=duration
+        self.last=duration
+
+def transfer_started(tr):
+    transfers[tr.file_id]=RunningTransfer(tr)
+
+def transfer_ended(tr):
+    """Returns the RunningTransfer object, or None if the transfer was not tracked."""
+    rtr=transfers.pop(tr.file_id,None)
+    if rtr is not None:
+        sample(rtr,time.time()) # account bytes received since the last update
+    return rtr
+
+def record_loop_duration(duration):
+    loop_durations.add(duration)
+
+def update(waiting_queue,limits=None,force=False):
+    """Measure transfers progress and rewrite the stats file if needed.
+
+    Args:
+        limits (dict): data_node => concurrency limit (None if not adaptive)
+
+    Note
+        This func is called at each scheduler event loop iteration.
+    """
+    global last_update
+
+    now=time.time()
+    if not force and last_update is not None and now-last_update<get_sample_interval():
+        return
+    last_update=now
+
+    for rtr in transfers.values():
+        sample(rtr,now)
+
+    for data_node in datanode_bytes.keys():
+        add_throughput_sample(data_node,now)
+
+    if not is_enabled():
+        return
+
+    try:
+        write(now,waiting_queue,limits)
+    except (IOError,OSError),e:
+        sdlog.warning("SDTELEME-001","Cannot write stats file (%s)"%str(e))
+    except Exception,e:
+        sdlog.error("SDTELEME-002","Error occured while writing stats file (%s)"%str(e)) # telemetry must never stop the scheduler
+
+def sample(rtr,now):
+    try:
+        size=os.path.getsize(rtr.local_path)
+    except OSError:
+        size=0 # file not created yet, or already removed (e.g. transfer error)
+
+    delta=size-rtr.bytes
+    if delta>0:
+        datanode_bytes[rtr.data_node]=datanode_bytes.get(rtr.data_node,0)+delta
+    rtr.bytes=size
+
+    if size>0 and rtr.first_byte_delay is None:
+        rtr.first_byte_delay=now-rtr.start_time # upper bound (precision is the sample interval)
+
+def add_throughput_sample(data_node,now):
+    samples=throughput_samples.setdefault(data_node,collections.deque()) # (date,bytes_total) tuples
+    samples.append((now,datanode_bytes[data_node]))
+
+    while len(samples)>1 and samples[1][0]<=now-throughput_window:
+        samples.popleft()
+
+def get_throughput(data_node):
+    """Returns data node throughput (bytes per second)."""
+    samples=throughput_samples.get(data_node)
+    if not samples:
+        return 0.0
+
+    (first_date,first_bytes)=samples[0]
+    (last_date,last_bytes)=samples[-1]
+    if last_date-first_date<=0:
+        return 0.0
+
+    return (last_bytes-first_bytes)/(last_date-first_date)
+
+def write(now,waiting_queue,limits):
+    lines=[]
+
+    def add(name,type_,help_,values):
+        lines.append('# HELP %s %s'%(name,help_))
+        lines.append('# TYPE %s %s'%(name,type_))
+        for (labels,value) in values:
+            lines.append(format_sample(name,labels,value))
+
+    running=transfers.values()
+
+    add('synda_transfer_bytes','gauge','Bytes received by running transfer',
+        [(get_transfer_labels(rtr),rtr.bytes) for rtr in running])
+    add('synda_transfer_size_bytes','gauge','Total size of running transfer',
+        [(get_transfer_labels(rtr),rtr.size) for rtr in running])
+
+    running_count={}
+    for rtr in running:
+        running_count[rtr.data_node]=running_count.get(rtr.data_node,0)+1
+    add('synda_datanode_running_transfers','gauge','Running transfers by data node',
+        [({'data_node':dn},count) for (dn,count) in sorted(running_count.iteritems())])
+
+    add('synda_datanode_received_bytes_total','counter','Bytes received from data node',
+        [({'data_node':dn},count) for (dn,count) in sorted(datanode_bytes.iteritems())])
+    add('synda_datanode_throughput_bytes_per_second','gauge','Data node throughput (last %i seconds)'%throughput_window,
+        [({'data_node':dn},get_throughput(dn)) for dn in sorted(datanode_bytes.keys())])
+    add('synda_throughput_bytes_per_second','gauge','Total throughput (last %i seconds)'%throughput_window,
+        [({},sum(get_throughput(dn) for dn in datanode_bytes.keys()))])
+
+    if limits is not None:
+        add('synda_datanode_concurrency_limit','gauge','Data node concurrency limit (adaptive)',
+            [({'data_node':dn},limit) for (dn,limit) in sorted(limits.iteritems())])
+
+    add('synda_waiting_transfers','gauge','Waiting transfers by priority',
+        [({'priority':str(priority)},count) for (priority,count) in sorted(waiting_queue.count_by_priority().iteritems())])
+
+    for (name,help_,summary) in (('synda_scheduler_loop_seconds','Scheduler event loop duration',loop_durations),
+                                 ('synda_db_commit_seconds','Database commit duration',commit_durations)):
+        add(name,'summary',help_,[])
+        lines.append(format_sample('%s_sum'%name,{},summary.sum))
+        lines.append(format_sample('%s_count'%name,{},summary.count))
+        add('%s_last'%name,'gauge','%s (last)'%help_,[({},summary.last)])
+
+    add('synda_stats_timestamp_seconds','gauge','Stats file update date',[({},now)])
+
+    tmp_file='%s.%s.tmp'%(stats_file,uuid.uuid4())
+    try:
+        with open(tmp_file,'w') as fh:
+            fh.write('\n'.join(lines)+'\n')
+        os.rename(tmp_file,stats_file) # atomic, so readers never see a partially written file
+    finally:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+
+def get_transfer_labels(rtr):
+    return {'file_id':str(rtr.file_id),'data_node':rtr.data_node,'filename':rtr.filename,'start_date':rtr.start_date}
+
+def format_sample(name,labels,value):
+    if len(labels)>0:
+        buf=','.join('%s="%s"'%(k,escape(v)) for (k,v) in sorted(labels.iteritems()))
+        return '%s{%s} %s'%(name,buf,repr(float(value)))
+    else:
+        return '%s %s'%(name,repr(float(value)))
+
+def escape(value):
+    value=value.encode('utf-8') if isinstance(value,unicode) else str(value) # labels values retrieved from the database are unicode
+    return value.replace('\\','\\\\').replace('"','\\"').replace('\n','\\n')
+
+def unescape(value):
+    return re.sub(r'\\(.)',lambda m: '\n' if m.group(1)=='n' else m.group(1),value)
+
+def remove_stats_file():
+    if os.path.isfile(stats_file):
+        os.remove(stats_file)
+
+def is_enabled():
+    return interval>0
+
+def get_sample_interval():
+    return interval if is_enabled() else default_sample_interval
+
+def load(path=None):
+    """Parse stats file.
+
+    Returns
+        list of (name,labels,value) tuples, or None if the stats file doesn't exist
+    """
+    samples=[]
+
+    try:
+        with open(path or stats_file,'r') as fh:
+            for line in fh:
+                line=line.strip()
+                if len(line)==0 or line.startswith('#'):
+                    continue
+
+                m=sample_regex.match(line)
+                if m is None:
+                    continue
+
+                (name,buf,value)=m.groups()
+                labels=dict((k,unescape(v)) for (k,v) in label_regex.findall(buf or ''))
+                samples.append((name,labels,float(value)))
+    except IOError:
+        return None
+
+    return samples
+
+# init.
+
+stats_file=sdconfig.stats_file
+interval=sdconfig.config.getint('daemon','stats_interval') # seconds (0 disables the stats file)
+throughput_window=60                                       # seconds
+default_sample_interval=5                                  # seconds (used when the stats file is disabled)
+
+transfers={}            # file_id => RunningTransfer
+datanode_bytes={}       # data_node => bytes received since daemon startup
+throughput_samples={}   # data_node => deque of (date,bytes_total) tuples
+loop_durations=Summary()
+commit_durations=Summary() # fed by 'sddb.LazyConnection'
+last_update=None
+
+sample_regex=re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+label_regex=re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f','--file',help='Stats file (default: daemon stats file)')
+    args = parser.parse_args()
+
+    samples=load(args.file)
+    if samples is None:
+        print 'Stats file not found'
+    else:
+        for (name,labels,value) in samples:
+            print name,labels,value
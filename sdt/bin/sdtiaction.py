@@ -121,6 +121,27 @@ def check(args):
     elif args.action=="dataset_version":
         status=sdcheckdatasetversion.run(args)
 
+    elif args.action=="status_counters":
+        import sddb,sddbobj
+
+        def get_counters():
+            counters={}
+            for rs in sddb.conn.execute("select dataset_id,status,count from dataset_status_count where count<>0"):
+                counters[('dataset',rs[0],rs[1])]=rs[2]
+            for rs in sddb.conn.execute("select dataset_id,variable,status,count from variable_status_count where count<>0"):
+                counters[('variable',rs[0],rs[1],rs[2])]=rs[3]
+            return counters
+
+        old_counters=get_counters()
+        sddbobj.rebuild_status_counters(sddb.conn)
+        new_counters=get_counters()
+
+        errors=len([k for k in set(old_counters.keys()+new_counters.keys()) if old_counters.get(k)!=new_counters.get(k)])
+        if errors==0:
+            print 'No inconsistency detected'
+        else:
+            print '%d inconsistencies detected and fixed'%errors
+
     else:
         print_stderr('Invalid check "%s"'%args.action)
         status=1
@@ -766,7 +787,8 @@ def watch(args):
     import sdreport, sddaemon
 
     if sddaemon.is_running():
-        sdreport.print_running_transfers()
+        if not sdreport.print_running_transfers_from_stats():
+            sdreport.print_running_transfers() # fallback (stats file disabled)
     else:
         print_stderr('Daemon not running')
 
@@ -302,11 +302,19 @@ class Request():
         return ",".join(['%s=%s'%(k,str(v)) for (k,v) in self.__dict__.iteritems()])
 
 class CommonIO(object):
-    """Abstract."""
+    """Abstract.
+
+    Note
+        Chunk-local processing stages can be deferred (see 'defer'). Deferred
+        stages are executed all together, in one pass over the store, when the
+        files are next accessed (see 'materialize').
+    """
 
     def __init__(self,*args,**kwargs):
         lowmem=kwargs.get('lowmem',sdconfig.lowmem)            # note that if store is not None, lowmem have no effect
 
+        self.pending=[]                                        # deferred processing stages (ProcessingObject list)
+
         files=kwargs.get("files",None)
         store=kwargs.get('store',None)
 
@@ -335,29 +343,79 @@ class CommonIO(object):
 
         self.delete()
 
+    @property
+    def size(self):
+        self.materialize()
+        return self._size
+
+    @size.setter
+    def size(self,value):
+        self._size=value
+
+    def defer(self,po):
+        """Add a chunk-local processing stage, to be executed with the other deferred stages."""
+        self.pending.append(po)
+
+    def materialize(self):
+        """Execute deferred stages in one pass over the store."""
+        if len(self.pending)==0:
+            return
+
+        pending=self.pending
+        self.pending=[]
+
+        import sdpipelineprocessing # do not move at the top (this module is used by sdpipelineprocessing module)
+
+        store=self.store.new()
+        size=0
+        for chunk in sdpipelineprocessing.process_chunks(self.store.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR),pending):
+            store.append_files(chunk)
+            size+=compute_total_size(chunk)
+
+        self.store.delete()
+        self.store=store
+        self._size=size
+
     def count(self):
+        self.materialize()
         return self.store.count()
 
     def set_files(self,files):
+        self.pending=[] # files are replaced, so stages do not apply anymore
         self.store.set_files(files)
         self.size=compute_total_size(files)
 
     def add_files(self,files):
         assert isinstance(files, list)
+        self.materialize() # deferred stages only apply to files already there
         self.store.append_files(files)
-        self.size+=compute_total_size(files)
+        self._size+=compute_total_size(files)
 
     def get_files(self): # warning: load list in memory
+        self.materialize()
         return self.store.get_files()
 
-    def get_chunks(self,io_mode=sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+    def get_chunks(self,io_mode=sdconst.PROCESSING_FETCH_MODE_GENERATOR,columns=None):
         assert not isinstance(self.store,list)
-        return self.store.get_chunks(io_mode)
+        self.materialize()
+        return self.store.get_chunks(io_mode,columns)
+
+    def iter_columns(self,columns):
+        """Returns files iterator, each file containing only the given attributes.
+
+        Note
+            The store is not copied, and only one chunk is loaded in memory at a time.
+        """
+        for chunk in self.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR,columns):
+            for f in chunk:
+                yield f
 
     def delete(self):
+        self.pending=[]
         self.store.delete()
 
     def get_one_file(self):
+        self.materialize()
         return self.store.get_one_file()
 
     def connect(self):
@@ -408,6 +466,7 @@ class MetaResponse(CommonIO,ResponseIngester):
         self.call_duration=0
 
     def to_metadata(self):
+        self.materialize()
         metadata=Metadata(store=self.store.copy(),size=self.size)
         return metadata
 
@@ -416,10 +475,13 @@ class Metadata(CommonIO):
 
     def slurp(self,metadata):
         assert isinstance(metadata, Metadata)
+        self.materialize()
+        metadata.materialize()
         self.store.merge(metadata.store)
-        self.size+=metadata.size
+        self._size+=metadata.size
 
     def copy(self):
+        self.materialize()
         cpy=Metadata(store=self.store.copy(),size=self.size)
         return cpy
 
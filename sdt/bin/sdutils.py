@@ -20,6 +20,7 @@ import os
 import datetime
 import json
 import hashlib
+import signal
 from functools import partial
 import subprocess
 import argparse
@@ -27,6 +28,35 @@ import sdconfig
 import sdconst
 from sdexception import SDException,FileNotFoundException
 
+def notify_daemon(resync=False):
+    """Wake up the daemon scheduler (e.g. after new transfers have been enqueued).
+
+    Args
+        resync: if True, the daemon also rebuilds its waiting transfers index
+                (needed when existing transfers have been modified, e.g.
+                status or priority change; new transfers are found without
+                it)
+
+    Notes
+        - this is a best effort notification: if the daemon is not running,
+          or if we are not allowed to send it a signal, nothing is done (the
+          scheduler will notice the change at its next periodic wake up).
+        - process command line is checked before sending the signal, so not to
+          kill an unrelated process if the pid file is stale (SIGUSR1/SIGUSR2
+          default action is to terminate the process).
+    """
+    import psutil
+
+    try:
+        with open(sdconfig.daemon_pid_file) as fh:
+            pid=int(fh.read().strip())
+
+        cmdline=' '.join(psutil.Process(pid).cmdline())
+        if 'synda' in cmdline or 'sddaemon' in cmdline or 'sdtaskscheduler' in cmdline:
+            os.kill(pid,signal.SIGUSR2 if resync else signal.SIGUSR1)
+    except (IOError,OSError,ValueError,psutil.Error):
+        pass
+
 def get_transfer_protocol(url):
     if url.startswith('http://'):
         return sdconst.TRANSFER_PROTOCOL_HTTP
@@ -72,10 +102,11 @@ def query_yes_no(question, default="yes"):
             sys.stderr.write("Please respond with 'yes' or 'no' "
                              "(or 'y' or 'n').\n")
 
-def get_status(args, **kwargs):
+def get_status(args, started=None, **kwargs):
     """
     Args:
         args (list): command + arguments
+        started (callable): called with the Popen object once the child is started
 
     Notes
         - handle exit status conversion and raise exception if child didn't complete normally
@@ -87,14 +118,18 @@ def get_status(args, **kwargs):
 
     p = subprocess.Popen(args, **kwargs)
 
+    if started is not None:
+        started(p)
+
     p.wait()
 
     return p.returncode
 
-def get_status_output(args, **kwargs):
+def get_status_output(args, started=None, **kwargs):
     """
     Args:
         args (list): command + arguments
+        started (callable): called with the Popen object once the child is started
 
     Notes
         - handle exit status conversion and raise exception if child didn't complete normally
@@ -111,6 +146,9 @@ def get_status_output(args, **kwargs):
 
     p = subprocess.Popen(args, **kwargs)
 
+    if started is not None:
+        started(p)
+
     stdout, stderr = p.communicate()
 
     return p.returncode, stdout, stderr
@@ -155,6 +193,16 @@ def parameter_to_query(parameter):
 
     return query
 
+def get_checksum_object(checksum_type):
+    """Return a new hashlib object for the given checksum type."""
+
+    if checksum_type==sdconst.CHECKSUM_TYPE_MD5:
+        return hashlib.md5()
+    elif checksum_type==sdconst.CHECKSUM_TYPE_SHA256:
+        return hashlib.sha256()
+    else:
+        raise SDException("SYDUTILS-423","incorrect checksum_type (%s)"%checksum_type)
+
 def compute_checksum(file_fullpath,checksum_type=sdconst.CHECKSUM_TYPE_MD5,blocksize=(1024*64)):
 
     if checksum_type not in sdconst.CHECKSUM_TYPES:
@@ -162,13 +210,7 @@ def compute_checksum(file_fullpath,checksum_type=sdconst.CHECKSUM_TYPE_MD5,block
 
     with open(file_fullpath, mode='rb') as f:
 
-        d=None
-        if checksum_type==sdconst.CHECKSUM_TYPE_MD5:
-            d = hashlib.md5()
-        elif checksum_type==sdconst.CHECKSUM_TYPE_SHA256:
-            d = hashlib.sha256()
-        else:
-            assert False
+        d=get_checksum_object(checksum_type)
 
         for buf in iter(partial(f.read, blocksize), b''):
             d.update(buf)
@@ -65,10 +65,11 @@ def get_variables_files_count_by_status(dataset_id,variable=None):
 
     c = sddb.conn.cursor()
 
+    # counters are used instead of a "group by" on the 'file' table (see 'variable_status_count' table in 'sddbobj')
     if variable is None:
-        c.execute("select variable,status,count(*) from file where dataset_id=? group by variable,status",(dataset_id,))
+        c.execute("select nullif(variable,''),status,count from variable_status_count where dataset_id=? and count>0",(dataset_id,))
     else:
-        c.execute("select variable,status,count(*) from file where dataset_id=? and variable=? group by variable,status",(dataset_id,variable))
+        c.execute("select nullif(variable,''),status,count from variable_status_count where dataset_id=? and variable=? and count>0",(dataset_id,variable))
 
     """
     The query returns something like:
@@ -110,7 +111,7 @@ def get_variables_files_count(d):
 
 
     c = sddb.conn.cursor()
-    c.execute("select variable,count(*) from file where dataset_id=? group by variable",(d.dataset_id,))
+    c.execute("select nullif(variable,''),sum(count) from variable_status_count where dataset_id=? group by variable having sum(count)>0",(d.dataset_id,))
 
 
     """
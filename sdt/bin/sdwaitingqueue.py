@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright "(c)2009 Centre National de la Recherche Scientifique CNRS.
+#                             All Rights Reserved"
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the daemon in-memory 'waiting' transfers index.
+
+Notes
+    - there is one heap per data node, ordered as the 'ORDER BY priority DESC, checksum' SQL clause.
+    - removal is lazy: an heap item is only valid if it matches the
+      'entries' dict (stale items are dropped when they reach the top of the heap).
+    - the index is loaded at daemon startup, then kept in sync with the 'file' table this way
+        - transfers which are put back in 'waiting' status by the daemon itself
+          (e.g. retry, next url) are re-added when their transfer ends (see 'sdtask.transfers_end')
+        - transfers enqueued by another process (e.g. 'synda install') wake
+          up the scheduler (see 'sdutils.notify_daemon'), and are added
+          incrementally, using their file_id, when the database has been
+          modified by another connection ('PRAGMA data_version'). As 'file_id'
+          is not AUTOINCREMENT, file_id of deleted rows may be reused: in this
+          case ('file_id_generation' changed, see 'sddbobj.create_triggers'),
+          the index is rebuilt.
+        - transfers modified by another process (e.g. 'synda retry', priority
+          change) trigger a full reload (see 'sdutils.notify_daemon'), and a full
+          reload is also done periodically in case a notification was lost.
+"""
+
+import time
+import heapq
+import sdapp
+import sdlog
+import sddb
+import sdfiledao
+
+class WaitingQueue():
+
+    def __init__(self):
+        self.heaps={}           # data_node => heap of (-priority,checksum,file_id) tuples
+        self.entries={}         # file_id => (data_node,priority) (for each transfer currently in the index)
+        self.last_file_id=0     # greatest file_id known when the index was last synced
+        self.file_id_generation=None
+        self.data_version=None
+        self.last_reload=None
+        self.reload_requested=False
+
+    def add(self,file_id,data_node,priority,checksum):
+        if self.entries.get(file_id)==(data_node,priority):
+            return # already indexed
+
+        self.entries[file_id]=(data_node,priority)
+        heapq.heappush(self.heaps.setdefault(data_node,[]),(-priority,checksum,file_id))
+
+    def pop(self,data_node):
+        """Remove and return the file_id of the next transfer to start for this data node.
+
+        Returns
+            file_id or None if no more transfer is waiting for this data node
+        """
+        heap=self.heaps.get(data_node)
+
+        while heap:
+            (neg_priority,checksum,file_id)=heapq.heappop(heap)
+
+            if self.entries.get(file_id)==(data_node,-neg_priority):
+                del self.entries[file_id]
+                return file_id
+
+        self.heaps.pop(data_node,None)
+
+        return None
+
+    def datanodes(self):
+        """Returns the list of data nodes having at least one 'waiting' transfer (may also include data nodes with only stale items)."""
+        return self.heaps.keys()
+
+    def count(self):
+        return len(self.entries)
+
+    def count_by_priority(self):
+        counts={}
+        for (data_node,priority) in self.entries.itervalues():
+            counts[priority]=counts.get(priority,0)+1
+        return counts
+
+    def compact(self):
+        """Drop stale items if they use too much memory."""
+        if sum(len(heap) for heap in self.heaps.values()) < 2*len(self.entries)+1000:
+            return
+
+        for data_node in self.heaps.keys():
+            heap=[item for item in self.heaps[data_node] if self.entries.get(item[2])==(data_node,-item[0])]
+            if len(heap)>0:
+                heapq.heapify(heap)
+                self.heaps[data_node]=heap
+            else:
+                del self.heaps[data_node]
+
+    def load(self,conn=sddb.conn):
+        """Build the index from scratch."""
+        start=time.time()
+
+        self.data_version=get_data_version(conn)
+        self.file_id_generation=sdfiledao.get_file_id_generation(conn=conn)
+        self.last_file_id=sdfiledao.get_max_file_id(conn=conn)
+
+        heaps={}
+        entries={}
+        for (file_id,data_node,priority,checksum) in sdfiledao.get_waiting_files_index(conn=conn):
+            entries[file_id]=(data_node,priority)
+            heaps.setdefault(data_node,[]).append((-priority,checksum,file_id))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+
+        self.heaps=heaps
+        self.entries=entries
+        self.last_reload=time.time()
+        self.reload_requested=False
+
+        sdlog.info("SDWAITQU-001","Waiting transfers index loaded (%i transfer(s),%i data node(s),%.2f sec)"%(len(entries),len(heaps),time.time()-start))
+
+    def load_new(self,conn=sddb.conn):
+        """Add transfers enqueued since the last sync."""
+        self.data_version=get_data_version(conn)
+
+        if sdfiledao.get_file_id_generation(conn=conn)!=self.file_id_generation:
+            # new rows may have reused file_id of deleted rows
+            self.load(conn)
+            return
+
+        last_file_id=sdfiledao.get_max_file_id(conn=conn)
+
+        if last_file_id>self.last_file_id:
+            li=sdfiledao.get_waiting_files_index(min_file_id=self.last_file_id,conn=conn)
+            for (file_id,data_node,priority,checksum) in li:
+                self.add(file_id,data_node,priority,checksum)
+
+            sdlog.debug("SDWAITQU-002","%i new transfer(s) added to the waiting transfers index"%len(li))
+
+        self.last_file_id=last_file_id
+
+    def sync(self,conn=sddb.conn):
+        """Make sure the index reflects modifications done by other processes."""
+        if self.reload_requested or self.last_reload is None or (time.time()-self.last_reload)>reload_interval:
+            self.load(conn)
+        else:
+            data_version=get_data_version(conn)
+            if data_version is None or data_version!=self.data_version:
+                self.load_new(conn)
+
+        self.compact()
+
+def get_data_version(conn):
+    """Returns a value which changes each time another connection commits a modification in the database.
+
+    Note
+        Returns None if not supported (SQLite < 3.8.2).
+    """
+    rs=conn.execute("PRAGMA data_version").fetchone()
+    return rs[0] if rs is not None else None
+
+# init.
+
+reload_interval=3600 # full reload period, in seconds (only used to recover from lost notifications)
@@ -9,17 +9,56 @@
 # @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
  
-"""This module detect frozen wget."""
+"""This module detects stalled transfers.
+
+Notes
+    - transfers are registered when they start (local file and cancel
+      callback), so there is no need to scan all system processes
+        - 'sdget' registers the transfer script child process (cancel kills it)
+        - 'sddmhttp' registers in-process transfers (cancel aborts the
+          download, see 'sdget_httplib.Cancellation')
+    - each registered transfer is checked every few seconds: a transfer is
+      stalled if its local file grew less than 'download.stall_min_rate' bytes
+      per second during the last 'download.stall_timeout' seconds
+    - stalled transfers are cancelled, then put back in 'waiting' status
+      (at most 'max_stall_retries' times per file since the daemon start),
+      then handled as any other killed transfer (i.e. set to 'error', see
+      TAG4JK4JJJ4454)
+"""
 
 import os
 import psutil # http://code.google.com/p/psutil/wiki/Documentation
 import threading
 import time
 import argparse
-import re
+import collections
 import sdapp
+import sdconfig
 import sdlog
 
+class Transfer():
+
+    def __init__(self,key,local_path,cancel):
+        self.key=key                     # identifies the transfer (e.g. child process pid)
+        self.local_path=local_path
+        self.cancel=cancel               # func called (without argument) to abort the transfer
+        self.samples=collections.deque() # (date,size) tuples
+        self.rate=None                   # bytes per second (None until 'stall_timeout' seconds of samples are available)
+
+    def add_sample(self,date,size):
+        self.samples.append((date,size))
+
+        # only keep samples needed to cover the 'stall_timeout' window
+        while len(self.samples)>1 and self.samples[1][0]<=date-stall_timeout:
+            self.samples.popleft()
+
+        (first_date,first_size)=self.samples[0]
+        if date-first_date>=stall_timeout:
+            self.rate=(size-first_size)/(date-first_date)
+
+    def is_stalled(self):
+        return self.rate is not None and self.rate<stall_min_rate
+
 class FrozenDownloadCheckerThread(threading.Thread):
     def __init__(self):
         threading.Thread.__init__(self)
@@ -27,99 +66,117 @@ class FrozenDownloadCheckerThread(threading.Thread):
     def run(self):
         watch()
 
-def watch():
-    previous_processes={}
+def register(key,local_path,cancel):
+    with lock:
+        transfers[key]=Transfer(key,local_path,cancel)
+
+def unregister(key):
+    with lock:
+        transfers.pop(key,None)
 
-    while True:
-        new_processes={}
+def watch():
+    while quit==0:
 
-        # 10 mn sleep (exit event aware)
-        for i in range(10):
-            if quit==1:
-                break
-            for i in range(6):
-                if quit==1:
-                    break
-                time.sleep(10)
+        # exit event aware sleep
+        time.sleep(check_interval)
 
-        # exit event
         if quit==1:
             break
 
-        scan_processes(previous_processes,new_processes)
+        try:
+            check_transfers()
+        except Exception,e:
+            sdlog.error("SDWATCHD-001","Error occured during stalled transfers check (%s)"%str(e))
 
-        previous_processes=new_processes
+def check_transfers():
+    with lock:
+        li=transfers.values()
 
-def scan_processes(previous_processes,new_processes,debug=False):
-    for pid in psutil.pids(): # retrieve wget pids
-        try:
-            p=psutil.Process(pid)
-            if len(p.cmdline())>0:
-                cmd=p.cmdline()[0]
-
-                if cmd=="wget":
-
-                    # second check to be sure not to take other wget process not related to our application
-                    parent=psutil.Process(p.ppid())
-                    if len(parent.cmdline())>1: # check array size not to raise exception in next line if wget is not related to our application
-                        m=re.search("sdget.sh", parent.cmdline()[1])
-                        if(m!=None):
-
-                            # retrieve wget args
-                            local_path=p.cmdline()[2] # this is a huge hack for the checksum/FIFO case !!!! (this class need to know the local file associated with the process, but because of the FIFO, this dest file do not show in "ps fax" output, so we put the dest file in unused " -D domain-list" option (this option is used only in recursive mode, which we do not use))
-                            #local_path=p.cmdline()[4] # to be used without checksum
-                            #url=p.cmdline()[-1] # retrieve url (not used for now)
-
-                            if debug:
-                                if os.path.isfile(local_path):
-                                    print '%i %s'%(os.path.getsize(local_path),local_path)
-                                else:
-                                    print 'File not found: %s'%(local_path,)
-                            else:
-                                if os.path.isfile(local_path):
-                                    check_if_frozen(p,pid,local_path,previous_processes,new_processes)
-                                else:
-                                    sdlog.info("SDWATCHD-274","file not found (%s%s)"%(local_path,pid)) # this can occur if wget already started, but didn't create the output file yet
-
-        except Exception, e:
-            if debug:
-                raise
-            else:
-                # we silently trap exception during normal operation, because
-                # some are raised during normal operation when a process
-                # returned by psutil.pids() finished just before execution of
-                # psutil.Process()
-                pass
-
-def check_if_frozen(p,pid,local_path,previous_processes,new_processes):
-    key="%s%s"%(pid,local_path)
-    fsize=os.path.getsize(local_path)
-
-    if key in previous_processes:
-        previous_size=previous_processes[key]
-
-        # is size the same ? (means wget stalled)
-        if fsize==previous_size:
-            # not good
-
-            sdlog.error("SDWATCHD-275","wget is stalled (%s,%s)"%(local_path,pid))
-            p.terminate()
-        else:
-            # wget works perfectly, no pb
+    now=time.time()
+    for tr in li:
+        tr.add_sample(now,get_size(tr.local_path))
 
-            #sdlog.debug("SDWATCHD-276","wget is not stalled (%s,%s)"%(local_path,pid))
+        if tr.is_stalled():
+            sdlog.error("SDWATCHD-275","Transfer is stalled (local_path=%s,key=%s,rate=%.1f B/s)"%(tr.local_path,tr.key,tr.rate))
+            unregister(tr.key) # prevent cancelling it again
 
-            pass
-    else:
-        # new wget in town
-        new_processes[key]=fsize
+            with lock:
+                stall_counts[tr.local_path]=stall_counts.get(tr.local_path,0)+1
+                cancelled.add(tr.local_path)
+
+            tr.cancel()
+
+def must_retry(local_path):
+    """Returns True if the transfer has been cancelled because it was stalled, and can be retried."""
+    with lock:
+        if local_path not in cancelled:
+            return False # killed for another reason (e.g. daemon shutdown)
+
+        cancelled.remove(local_path)
+
+        if stall_counts[local_path]<=max_stall_retries:
+            return True
+        else:
+            del stall_counts[local_path]
+            return False
+
+def get_size(local_path):
+    """Returns local file size (0 if the file doesn't exist yet)."""
+    try:
+        return os.path.getsize(local_path)
+    except OSError:
+        return 0 # file not created yet (e.g. transfer script still connecting)
+
+def kill(pid):
+    """Terminate the transfer child process tree.
+
+    Note
+        Descendants (e.g. wget) are terminated first, so the transfer script
+        can still clean up and report the transfer as killed.
+    """
+    try:
+        p=psutil.Process(pid)
+
+        # see TAG54353543DFDSFD for info regarding this block.
+        if hasattr(p,'get_children'):
+            children=p.get_children(True)
+        else:
+            children=p.children(True)
+
+        for child in (children if len(children)>0 else [p]):
+            try:
+                child.terminate()
+            except psutil.NoSuchProcess:
+                pass # transfer ended in the meantime
+    except psutil.NoSuchProcess:
+        pass # transfer ended in the meantime
 
 # module init.
 
+check_interval=5 # seconds
+max_stall_retries=2
+
+stall_min_rate=sdconfig.config.getint('download','stall_min_rate') # bytes per second
+stall_timeout=sdconfig.config.getint('download','stall_timeout')   # seconds
+
+transfers={} # key => Transfer (registered running transfers)
+stall_counts={} # local_path => how many times the transfer has been cancelled because stalled
+cancelled=set() # local_path of transfers cancelled because stalled (and not yet processed by the download manager)
+lock=threading.Lock()
+
 quit=0
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
+    parser.add_argument('pid',type=int,help='Process to watch')
+    parser.add_argument('local_path',help='File written by the process')
     args = parser.parse_args()
 
-    scan_processes(None,None,True)
+    register(args.pid,args.local_path,lambda: kill(args.pid))
+    while args.pid in transfers and psutil.pid_exists(args.pid):
+        time.sleep(check_interval)
+        check_transfers()
+
+        tr=transfers.get(args.pid)
+        if tr is not None:
+            print '%i %s'%(get_size(tr.local_path),'%.1f B/s'%tr.rate if tr.rate is not None else '-')
@@ -11,7 +11,11 @@
 
 """This module contains worker related objects."""
 
+import os
 import sys
+import errno
+import fcntl
+import select
 import threading
 import sdapp
 import sdtrace
@@ -19,6 +23,46 @@ import sdlog
 import sdconfig
 import sdexception
 
+class Wakeup():
+    """Self-pipe used to wake up the scheduler main loop.
+
+    Notes
+        - set() can be called from any thread and from signal handlers.
+        - a pipe is used instead of threading.Event, because Event.wait() with
+          a timeout is implemented with a polling loop in Python 2.
+    """
+
+    def __init__(self):
+        (self.r,self.w)=os.pipe()
+
+        for fd in (self.r,self.w):
+            flags=fcntl.fcntl(fd,fcntl.F_GETFL)
+            fcntl.fcntl(fd,fcntl.F_SETFL,flags|os.O_NONBLOCK)
+
+    def set(self):
+        try:
+            os.write(self.w,'x')
+        except OSError,e:
+            if e.errno!=errno.EAGAIN: # EAGAIN means pipe is full, so a wake up is already pending
+                raise
+
+    def wait(self,timeout):
+        """Block until set() is called or timeout expires."""
+
+        try:
+            select.select([self.r],[],[],timeout)
+        except select.error,e:
+            if e.args[0]!=errno.EINTR: # interrupted by a signal
+                raise
+
+        # clear pending wake up
+        try:
+            while os.read(self.r,4096):
+                pass
+        except OSError,e:
+            if e.errno!=errno.EAGAIN:
+                raise
+
 class WorkerThread(threading.Thread):
     """This class is the thread that handle the file transfer."""
 
@@ -48,3 +92,10 @@ class WorkerThread(threading.Thread):
 
             if sdconfig.stop_download_if_error_occurs:
                 self._service.exception_occurs=True
+
+        finally:
+            wakeup.set() # so that the scheduler notices immediately that the thread is done
+
+# init.
+
+wakeup=Wakeup()
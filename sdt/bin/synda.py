@@ -84,6 +84,10 @@ def run():
 
     args = parser.parse_args()
 
+    if getattr(args,'search_api_cache_mode',None) is not None:
+        import sdsearchapicache
+        sdsearchapicache.set_mode(args.search_api_cache_mode)
+
 
     # check type mutex
     #